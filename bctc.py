@@ -1,12 +1,17 @@
 import os
-import time
 import sqlite3
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from vnstock import Vnstock
 import pandas as pd
 from tqdm import tqdm
 import matplotlib.pyplot as plt
+import report_renderer
+from fetch_scheduler import AsyncFetchScheduler
+from job_journal import JobJournal
+import financial_store
+import report_state
+from sqlite_writer import SQLiteWriter
+import config
+import data_source
 
 # Danh sách các loại báo cáo và chu kỳ
 REPORT_TYPES = ['balance_sheet', 'income_statement', 'cash_flow', 'ratios', 'dividends']
@@ -25,64 +30,41 @@ PERIODS_VN = {
     'Quarter': 'Quý'
 }
 
-# Hàm tải báo cáo với cơ chế retry
-def download_report(func, *args, **kwargs):
-    for attempt in range(5):
-        try:
-            df = func(*args, **kwargs)
-            return df
-        except Exception as e:
-            print(f"Thử lần {attempt+1} thất bại: {e}")
-            time.sleep(10)
-    print("Tất cả các lần thử đều thất bại.")
-    return None
+# Thư mục gốc chứa data/, stock_lists/ và last_update.txt (mục [paths] financials_dir trong config.ini;
+# mặc định là thư mục đang chạy)
+BASE_DIR = config.get_path('paths', 'financials_dir', '')
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+STOCK_LISTS_DIR = os.path.join(BASE_DIR, 'stock_lists')
+LAST_UPDATE_PATH = os.path.join(BASE_DIR, 'last_update.txt')
+# Tác vụ trong nhật ký công việc (job_journal.py): tải toàn bộ và tải riêng một số mã được theo dõi tách biệt
+FINANCIALS_TASK = 'financials'
+SELECTED_FINANCIALS_TASK = 'financials_selected'
+# Nơi ghi báo cáo: store (kho dạng dài financial_store.py, mặc định) hoặc files (cấu trúc cũ, mỗi mã hai file DB)
+LAYOUT = config.get('financials', 'layout', 'store') or 'store'
 
-# Hàm xử lý một mã cổ phiếu
-def process_stock(symbol, exchange):
-    year_db_path = f"data/{exchange}/year/{symbol}.db"
-    quarter_db_path = f"data/{exchange}/quarter/{symbol}.db"
-    
-    conn_year = sqlite3.connect(year_db_path)
-    conn_quarter = sqlite3.connect(quarter_db_path)
-    
-    stock_tcbs = Vnstock().stock(symbol=symbol, source='TCBS')
-    company = stock_tcbs.company
-    print(f"Đang tải cổ tức cho {symbol}")
-    df_dividends = download_report(company.dividends)
-    if df_dividends is not None:
-        df_dividends.to_sql('dividends', conn_year, if_exists='replace', index=False)
-        print(f"Hoàn thành cổ tức cho {symbol}")
-    else:
-        print(f"Thất bại khi tải cổ tức cho {symbol}")
-    time.sleep(30)
-    
-    stock_vci = Vnstock().stock(symbol=symbol, source='VCI')
-    reports = [
-        ('balance_sheet_year', stock_vci.finance.balance_sheet, {'period': 'year', 'lang': 'vi', 'dropna': True}, conn_year),
-        ('income_statement_year', stock_vci.finance.income_statement, {'period': 'year', 'lang': 'vi', 'dropna': True}, conn_year),
-        ('cash_flow_year', stock_vci.finance.cash_flow, {'period': 'year', 'dropna': True}, conn_year),
-        ('ratios_year', stock_vci.finance.ratio, {'period': 'year', 'lang': 'vi', 'dropna': True}, conn_year),
-        ('balance_sheet_quarter', stock_vci.finance.balance_sheet, {'period': 'quarter', 'lang': 'vi', 'dropna': True}, conn_quarter),
-        ('income_statement_quarter', stock_vci.finance.income_statement, {'period': 'quarter', 'lang': 'vi', 'dropna': True}, conn_quarter),
-        ('cash_flow_quarter', stock_vci.finance.cash_flow, {'period': 'quarter', 'dropna': True}, conn_quarter),
-        ('ratios_quarter', stock_vci.finance.ratio, {'period': 'quarter', 'lang': 'vi', 'dropna': True}, conn_quarter),
+def get_report_db_path(exchange, period, symbol):
+    return os.path.join(DATA_DIR, exchange, period.lower(), f"{symbol}.db")
+
+# Các báo cáo tải cho một mã: (bảng, nguồn, hàm của nguồn dữ liệu, tham số, DB đích)
+# Cổ tức lấy từ TCBS, các báo cáo tài chính lấy từ VCI
+def report_jobs(symbol, exchange):
+    year_db_path = get_report_db_path(exchange, 'year', symbol)
+    quarter_db_path = get_report_db_path(exchange, 'quarter', symbol)
+    return [
+        ('dividends', 'TCBS', 'dividends', {}, year_db_path),
+        ('balance_sheet_year', 'VCI', 'finance', {'report': 'balance_sheet', 'period': 'year', 'lang': 'vi', 'dropna': True}, year_db_path),
+        ('income_statement_year', 'VCI', 'finance', {'report': 'income_statement', 'period': 'year', 'lang': 'vi', 'dropna': True}, year_db_path),
+        ('cash_flow_year', 'VCI', 'finance', {'report': 'cash_flow', 'period': 'year', 'dropna': True}, year_db_path),
+        ('ratios_year', 'VCI', 'finance', {'report': 'ratio', 'period': 'year', 'lang': 'vi', 'dropna': True}, year_db_path),
+        ('balance_sheet_quarter', 'VCI', 'finance', {'report': 'balance_sheet', 'period': 'quarter', 'lang': 'vi', 'dropna': True}, quarter_db_path),
+        ('income_statement_quarter', 'VCI', 'finance', {'report': 'income_statement', 'period': 'quarter', 'lang': 'vi', 'dropna': True}, quarter_db_path),
+        ('cash_flow_quarter', 'VCI', 'finance', {'report': 'cash_flow', 'period': 'quarter', 'dropna': True}, quarter_db_path),
+        ('ratios_quarter', 'VCI', 'finance', {'report': 'ratio', 'period': 'quarter', 'lang': 'vi', 'dropna': True}, quarter_db_path),
     ]
-    
-    for table_name, func, kwargs, conn in tqdm(reports, desc=f"Báo cáo cho {symbol}", leave=False):
-        print(f"Đang tải {table_name} cho {symbol}")
-        df = download_report(func, **kwargs)
-        if df is not None:
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
-            print(f"Hoàn thành {table_name} cho {symbol}")
-        else:
-            print(f"Thất bại khi tải {table_name} cho {symbol}")
-        time.sleep(30)
-    
-    conn_year.close()
-    conn_quarter.close()
 
-# Hàm vẽ biểu đồ
-def plot_indicator(symbol, report_type, period, num_years, conn, table_name):
+# Hàm vẽ biểu đồ từ bảng trong file DB của một mã
+# indicator=None: hỏi người dùng chọn chỉ tiêu; truyền sẵn tên chỉ tiêu để vẽ không cần tương tác
+def plot_indicator(symbol, report_type, period, num_years, conn, table_name, indicator=None):
     cursor = conn.cursor()
     cursor.execute(f"PRAGMA table_info({table_name})")
     columns = cursor.fetchall()
@@ -90,28 +72,30 @@ def plot_indicator(symbol, report_type, period, num_years, conn, table_name):
         print(f"Bảng {table_name} không tồn tại hoặc không có cột nào.")
         return
     
-    print("\nDanh sách các chỉ tiêu có thể chọn:")
-    for idx, col in enumerate(columns, 1):
-        print(f"{idx}. {col[1]}")
-    
-    while True:
+    try:
+        query = f"SELECT * FROM {table_name}"
+        df = pd.read_sql_query(query, conn)
+    except Exception as e:
+        print(f"Lỗi khi truy xuất bảng {table_name}: {e}")
+        return
+    plot_report(symbol, period, num_years, df, table_name, indicator)
+
+# Hàm vẽ một chỉ tiêu từ bảng báo cáo dạng rộng (mỗi dòng một kỳ), dùng cho cả file cũ và kho financial_store
+def plot_report(symbol, period, num_years, df, table_name, indicator=None):
+    columns = list(df.columns)
+    while indicator is None:
+        print("\nDanh sách các chỉ tiêu có thể chọn:")
+        for idx, col in enumerate(columns, 1):
+            print(f"{idx}. {col}")
         try:
             choice = int(input("Nhập số tương ứng với chỉ tiêu muốn xem: "))
             if 1 <= choice <= len(columns):
-                indicator = columns[choice - 1][1]
-                break
+                indicator = columns[choice - 1]
             else:
                 print(f"Vui lòng nhập số từ 1 đến {len(columns)}.")
         except ValueError:
             print("Vui lòng nhập một số hợp lệ.")
     
-    try:
-        query = f"SELECT * FROM {table_name}"
-        df = pd.read_sql_query(query, conn)
-    except Exception as e:
-        print(f"Lỗi khi truy xuất bảng {table_name}: {e}")
-        return
-    
     # Xử lý cột thời gian linh hoạt
     if period.lower() == 'year':
         year_cols = [col for col in df.columns if 'năm' in col.lower() or 'year' in col.lower()]
@@ -155,54 +139,174 @@ def plot_indicator(symbol, report_type, period, num_years, conn, table_name):
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    report_renderer.emit(plt.gcf(), f"{symbol}_{table_name}_{indicator}")
+
+# Hàm đọc một bảng báo cáo của một mã: từ nơi lần tải gần nhất đã ghi báo cáo này (report_state), mặc định
+# theo mục [financials] layout; kho financial_store hoặc file DB của mã. Trả về None nếu không có dữ liệu.
+def load_report(symbol, period, table_name, layout=None):
+    if layout is None:
+        with report_state.ReportState() as state:
+            layout = state.layout(symbol, table_name) or LAYOUT
+    if layout == 'store' and financial_store.has_store():
+        conn = financial_store.connect()
+        try:
+            if table_name == 'dividends':
+                df = financial_store.read_dividends(conn, symbol)
+            else:
+                df = financial_store.read_statement(conn, symbol, table_name.rpartition('_')[0], period.lower())
+        finally:
+            conn.close()
+        return df if not df.empty else None
+    hose_symbols = open(os.path.join(STOCK_LISTS_DIR, 'hose_symbols.txt')).read().splitlines()
+    exchange = 'HOSE' if symbol in hose_symbols else 'HNX'
+    db_path = get_report_db_path(exchange, period, symbol)
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+    except Exception as e:
+        print(f"Lỗi khi truy xuất bảng {table_name}: {e}")
+        return None
+    finally:
+        conn.close()
+
+# Hàm vẽ một chỉ tiêu từ file DB (dùng cho report_renderer.render_parallel, mỗi tiến trình tự mở kết nối)
+def plot_indicator_from_db(symbol, report_type, period, num_years, db_path, table_name, indicator):
+    conn = sqlite3.connect(db_path)
+    try:
+        plot_indicator(symbol, report_type, period, num_years, conn, table_name, indicator)
+    finally:
+        conn.close()
+
+# Hàm tạo kho báo cáo dạng dài lần đầu: dữ liệu trong các file DB của từng mã (nếu có) được chuyển sang kho,
+# các báo cáo đã chuyển được ghi nhận là đã lưu trong kho để không phải tải lại
+def prepare_store():
+    if os.path.isdir(DATA_DIR) and financial_store.import_from_files(DATA_DIR) > 0:
+        with report_state.ReportState() as state:
+            state.relabel('files', 'store')
+    financial_store.connect().close()
+
+# Hàm tải lại báo cáo tài chính của mọi mã HOSE và HNX (symbols: chỉ tải các mã này)
+# mode: resume (làm tiếp lần chạy bị gián đoạn, chỉ các báo cáo chưa xong), restart hoặc retry_failed
+# (chỉ các báo cáo lỗi của lần chạy trước). Mỗi báo cáo chỉ được ghi nhận là xong sau khi đã commit.
+# Báo cáo chưa thể có kỳ mới được bỏ qua và phản hồi giống hệt lần trước không được ghi lại
+# (xem report_state.py); force=True: tải lại mọi báo cáo.
+# layout: 'store' ghi vào kho dạng dài (mặc định: mục [financials] layout), 'files' ghi file DB của từng mã như cũ.
+def update_financials(symbols=None, mode='resume', force=False, layout=None):
+    layout = layout or LAYOUT
+    use_store = layout == 'store'
+    if use_store:
+        if not financial_store.has_store():
+            prepare_store()
+    else:
+        for exchange in ['HOSE', 'HNX']:
+            for period in ['year', 'quarter']:
+                os.makedirs(os.path.join(DATA_DIR, exchange, period), exist_ok=True)
+    os.makedirs(STOCK_LISTS_DIR, exist_ok=True)
+    
+    # Danh sách mã cũng được tải qua scheduler để có retry khi nguồn báo lỗi
+    scheduler = AsyncFetchScheduler()
+    source = data_source.get_source()
+    hose_symbols = scheduler.call_sync('VCI', source.symbols_by_group, 'HOSE')
+    hnx_symbols = scheduler.call_sync('VCI', source.symbols_by_group, 'HNX')
+    
+    with open(os.path.join(STOCK_LISTS_DIR, 'hose_symbols.txt'), 'w') as f:
+        for symbol in hose_symbols:
+            f.write(symbol + '\n')
+    with open(os.path.join(STOCK_LISTS_DIR, 'hnx_symbols.txt'), 'w') as f:
+        for symbol in hnx_symbols:
+            f.write(symbol + '\n')
+    
+    # Mọi báo cáo của mọi mã HOSE và HNX là các coroutine chạy cùng lúc: cổ tức chỉ chờ hạn mức TCBS,
+    # báo cáo tài chính chỉ chờ hạn mức VCI, nên tổng thời gian do nguồn chậm hơn quyết định.
+    # Mọi báo cáo được ghi bởi một luồng ghi duy nhất, commit theo lô
+    all_calls = {}
+    for exchange, exchange_symbols in [('HOSE', hose_symbols), ('HNX', hnx_symbols)]:
+        for symbol in exchange_symbols:
+            if len(symbol) > 3 or (symbols is not None and symbol not in symbols):
+                continue
+            for table_name, report_source, method, kwargs, db_path in report_jobs(symbol, exchange):
+                all_calls[(symbol, table_name)] = ((symbol, table_name, exchange, db_path), report_source,
+                                                   getattr(source, method), (symbol,), kwargs)
+    
+    task = FINANCIALS_TASK if symbols is None else SELECTED_FINANCIALS_TASK
+    with JobJournal() as journal, report_state.ReportState() as state:
+        # Báo cáo của mã đã bị hủy niêm yết kể từ lần chạy dở không còn trong all_calls và được bỏ qua
+        keys = [key for key in journal.start(task, all_calls, mode) if key in all_calls]
+        states = state.load()
+        if not force:
+            now = datetime.now()
+            skipped = [key for key in keys if not report_state.needs_fetch(states.get(key), key[1], layout, now)]
+            journal.skip(task, skipped)
+            skipped = set(skipped)
+            keys = [key for key in keys if key not in skipped]
+            print(f"Bỏ qua {len(skipped)} báo cáo chưa thể có kỳ mới, cần tải {len(keys)} báo cáo.")
+        calls = [all_calls[key] for key in keys]
+        unchanged = 0
+        
+        def record(symbol, table_name, df, digest):
+            def on_commit(error):
+                journal.record(task, (symbol, table_name), error)
+                if error is None:
+                    state.record(symbol, table_name, layout, df, digest)
+            return on_commit
+        
+        with SQLiteWriter() as writer:
+            for (symbol, table_name, exchange, db_path), df, error in tqdm(scheduler.run(calls), total=len(calls), desc="Tải báo cáo"):
+                if error is None and df is not None:
+                    digest = report_state.content_hash(df)
+                    previous = states.get((symbol, table_name))
+                    if previous is not None and previous['content_hash'] == digest and previous['layout'] == layout:
+                        # Nội dung giống hệt lần trước: không ghi lại
+                        state.touch(symbol, table_name)
+                        journal.record(task, (symbol, table_name))
+                        unchanged += 1
+                        continue
+                    record_write = record(symbol, table_name, df, digest)
+                    if use_store:
+                        writer.submit(financial_store.FINANCIALS_DB_PATH, financial_store.write_report,
+                                      symbol, table_name, df, exchange, callback=record_write)
+                    else:
+                        writer.replace_table(db_path, table_name, df, callback=record_write)
+                    print(f"Hoàn thành {table_name} cho {symbol}")
+                else:
+                    print(f"Thất bại khi tải {table_name} cho {symbol}: {error}")
+                    journal.record(task, (symbol, table_name), error or "Không có dữ liệu")
+        counts = journal.finish(task)
+        failures = journal.failures(task)
+    print(f"{unchanged}/{len(calls)} báo cáo tải về không đổi nên không ghi lại.")
+    
+    if failures:
+        print(f"{len(failures)}/{sum(counts.values())} báo cáo tải thất bại (chạy lại riêng các báo cáo này: python cli.py update-financials --retry-failed):")
+        for symbol, table_name, attempts, last_error, _ in failures:
+            print(f"- {symbol} {table_name} (đã thử {attempts} lần): {last_error}")
+    
+    with open(LAST_UPDATE_PATH, 'w') as f:
+        f.write(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
 
 # Hàm chính
 def main():
-    if os.path.exists('last_update.txt'):
-        with open('last_update.txt', 'r') as f:
+    if os.path.exists(LAST_UPDATE_PATH):
+        with open(LAST_UPDATE_PATH, 'r') as f:
             last_update = f.read()
         print(f"Thời gian cập nhật cuối cùng: {last_update}")
     else:
         print("Chưa từng cập nhật dữ liệu.")
     
-    update = input("Bạn có muốn cập nhật lại dữ liệu không? (Y/N): ").strip().upper()
+    with JobJournal() as journal:
+        run = journal.run_info(FINANCIALS_TASK)
+        failed = journal.counts(FINANCIALS_TASK).get('failed', 0)
+    if run is not None and run[1] is None:
+        print(f"Lần cập nhật bắt đầu lúc {run[0]} chưa hoàn tất, chọn Y để tải tiếp các báo cáo còn lại.")
+    if failed:
+        print(f"Lần cập nhật gần nhất có {failed} báo cáo lỗi, chọn R để chỉ tải lại các báo cáo này.")
+    
+    update = input("Bạn có muốn cập nhật lại dữ liệu không? (Y/N/R): ").strip().upper()
     if update == 'Y':
-        os.makedirs('data/HOSE/year', exist_ok=True)
-        os.makedirs('data/HOSE/quarter', exist_ok=True)
-        os.makedirs('data/HNX/year', exist_ok=True)
-        os.makedirs('data/HNX/quarter', exist_ok=True)
-        os.makedirs('stock_lists', exist_ok=True)
-        
-        stock = Vnstock().stock(symbol='ACB', source='VCI')
-        hose_symbols = stock.listing.symbols_by_group('HOSE')
-        hnx_symbols = stock.listing.symbols_by_group('HNX')
-        
-        with open('stock_lists/hose_symbols.txt', 'w') as f:
-            for symbol in hose_symbols:
-                f.write(symbol + '\n')
-        with open('stock_lists/hnx_symbols.txt', 'w') as f:
-            for symbol in hnx_symbols:
-                f.write(symbol + '\n')
-        
-        for exchange, symbols in [('HOSE', hose_symbols), ('HNX', hnx_symbols)]:
-            filtered_symbols = [s for s in symbols if len(s) <= 3]
-            batches = [filtered_symbols[i:i+40] for i in range(0, len(filtered_symbols), 40)]
-            
-            for batch_idx, batch in enumerate(tqdm(batches, desc=f"Xử lý batch cho {exchange}")):
-                print(f"Đang xử lý batch {batch_idx+1}/{len(batches)} cho {exchange}")
-                with ThreadPoolExecutor(max_workers=12) as executor:
-                    futures = {executor.submit(process_stock, symbol, exchange): symbol for symbol in batch}
-                    for future in as_completed(futures):
-                        symbol = futures[future]
-                        try:
-                            future.result()
-                        except Exception as e:
-                            print(f"Lỗi khi xử lý {symbol}: {e}")
-                time.sleep(65)
-        
-        with open('last_update.txt', 'w') as f:
-            f.write(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        update_financials()
+    elif update == 'R':
+        update_financials(mode='retry_failed')
     else:
         print("Bỏ qua cập nhật dữ liệu.")
     
@@ -256,25 +360,20 @@ def main():
             except ValueError:
                 print("Vui lòng nhập một số hợp lệ!")
         
-        # Xác định đường dẫn cơ sở dữ liệu
-        hose_symbols = open('stock_lists/hose_symbols.txt').read().splitlines()
-        exchange = 'HOSE' if symbol in hose_symbols else 'HNX'
-        db_path = f"data/{exchange}/{period.lower()}/{symbol}.db"
-        
-        if not os.path.exists(db_path):
-            print(f"Không tìm thấy dữ liệu cho mã {symbol} trong chu kỳ {PERIODS_VN[period]}.")
-            continue
-        
-        conn = sqlite3.connect(db_path)
-        
         if period.lower() == 'year':
             table_name = f"{report_type}_year" if report_type != 'dividends' else 'dividends'
         else:
             table_name = f"{report_type}_quarter"
         
+        # Đọc bảng báo cáo một lần (từ kho dạng dài hoặc file DB của mã) rồi vẽ các chỉ tiêu
+        df = load_report(symbol, period, table_name)
+        if df is None:
+            print(f"Không tìm thấy dữ liệu cho mã {symbol} trong chu kỳ {PERIODS_VN[period]}.")
+            continue
+        
         # Vòng lặp để chọn và vẽ chỉ tiêu
         while True:
-            plot_indicator(symbol, report_type, period, num_years, conn, table_name)
+            plot_report(symbol, period, num_years, df, table_name)
             
             # Hiển thị menu tùy chọn
             print("\nSau khi xem biểu đồ, bạn muốn:")
@@ -288,12 +387,9 @@ def main():
             elif choice == '2':
                 break  # Quay lại menu chính
             elif choice == '3':
-                conn.close()
                 exit()  # Thoát chương trình
             else:
                 print("Lựa chọn không hợp lệ, vui lòng nhập lại.")
-        
-        conn.close()
 
 if __name__ == "__main__":
     main()
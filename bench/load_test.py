@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Thử tải toàn bộ quy trình tải dữ liệu với nguồn phát lại (data_source.ReplaySource), không cần mạng:
+#   python bench/load_test.py --symbols 400 --latency 0.05 --error-rate 0.02
+# Dữ liệu giả lập và các DB kết quả nằm trong một thư mục tạm; cấu hình (đường dẫn, hạn mức) được ghi vào
+# config.ini của thư mục đó và nạp trước khi import các script.
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import config
+
+def write_config(work_dir, args):
+    path = os.path.join(work_dir, 'config.ini')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[paths]\nlist_dir = lists\ndata_dir = eod\noutstanding_db = lists/outstanding_share.db\n"
+                "financials_dir = financials\njournal_db = journal.db\n")
+        f.write(f"[concurrency]\nin_flight = {args.in_flight}\n")
+        f.write(f"[rate_limits]\nVCI = {args.rate}, {args.in_flight}\nTCBS = {args.rate}, {args.in_flight}\n")
+        f.write(f"[data_source]\nkind = replay\nreplay_dir = replay\nlatency = {args.latency}\n"
+                f"jitter = {args.jitter}\nerror_rate = {args.error_rate}\nseed = {args.seed}\n")
+    return path
+
+def timed(label, items, func, *args, **kwargs):
+    import data_source
+    source = data_source.get_source()
+    calls, errors = source.calls, source.errors
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"==> {label}: {items} mã trong {elapsed:.1f} giây ({items / elapsed:,.1f} mã/giây), "
+          f"{source.calls - calls} lần gọi nguồn, {source.errors - errors} lỗi giả lập")
+    return elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thử tải quy trình tải dữ liệu với nguồn phát lại")
+    parser.add_argument('--symbols', type=int, default=400)
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help="Độ trễ mỗi lần gọi nguồn (giây)")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Tỷ lệ lần gọi bị lỗi giả lập")
+    parser.add_argument('--rate', type=int, default=100_000, help="Hạn mức mỗi phút cho VCI/TCBS trong lần thử")
+    parser.add_argument('--in-flight', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', choices=['eod', 'financials', 'intraday'],
+                        default=['eod', 'financials', 'intraday'])
+    parser.add_argument('--financial-symbols', type=int, default=50, help="Số mã tải báo cáo tài chính")
+    parser.add_argument('--ticks', type=int, default=10_000, help="Số lệnh khớp trong phiên của mỗi mã")
+    parser.add_argument('--work-dir', help="Thư mục làm việc (mặc định: thư mục tạm, xóa khi xong)")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='load_test_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        config.load(write_config(work_dir, args))
+        import synthetic
+        start = time.perf_counter()
+        symbols = synthetic.make_replay_dir(os.path.join(work_dir, 'replay'), args.symbols, args.sessions,
+                                            seed=args.seed, n_ticks=args.ticks if 'intraday' in args.only else 0)
+        print(f"Đã tạo phản hồi ghi sẵn cho {len(symbols)} mã trong {time.perf_counter() - start:.1f} giây")
+
+        # ds.py tạo các file danh sách mà eod300 đọc, nên luôn chạy trước
+        import ds
+        timed("ds.py (danh sách + số cổ phiếu lưu hành)", len(symbols), ds.main, force=True)
+        if 'eod' in args.only:
+            import eod300
+            os.makedirs(eod300.DATA_DIR, exist_ok=True)
+            timed("eod300.load_hose_data (lần đầu)", len(symbols), eod300.load_hose_data)
+            timed("eod300.load_hose_data (nối tiếp)", len(symbols), eod300.load_hose_data)
+        if 'financials' in args.only:
+            import bctc
+            subset = set(symbols[:args.financial_symbols])
+            timed("bctc.update_financials", len(subset), bctc.update_financials, symbols=subset)
+        if 'intraday' in args.only:
+            import flow_scanner
+            timed("flow_scanner.scan_group (HOSE)", len(symbols), flow_scanner.scan_group, 'HOSE', limit=10)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+import sqlite3
+import pandas as pd
+
+# Đo thời gian và bộ nhớ đỉnh của các hàm tính toán chính trên dữ liệu giả lập (không cần mạng), ví dụ:
+#   python bench/run_bench.py --scale small
+#   python bench/run_bench.py --scale medium --layouts store cache --save bench/baseline.json
+#   python bench/run_bench.py --scale medium --compare bench/baseline.json --tolerance 1.3
+# Khi --compare, chương trình trả về mã lỗi 1 nếu có phép đo chậm hơn baseline quá tolerance lần.
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import synthetic
+import eod300
+import vh
+import orderflow
+import tick_archive
+import bctc
+import financial_store
+import columnar_cache
+import report_renderer
+
+SCALES = {
+    # số mã x số phiên, số lệnh khớp trong phiên, số mã có báo cáo tài chính
+    'small': {'symbols': 400, 'sessions': 1000, 'ticks': [10_000, 100_000], 'financial_symbols': 20},
+    'medium': {'symbols': 1600, 'sessions': 1000, 'ticks': [10_000, 100_000, 1_000_000], 'financial_symbols': 50},
+    'large': {'symbols': 5000, 'sessions': 1000, 'ticks': [10_000, 100_000, 1_000_000], 'financial_symbols': 100},
+}
+# Một tháng (22 phiên x 30.000 lệnh) của một mã trong kho lệnh khớp
+ARCHIVE_SESSIONS = 22
+ARCHIVE_TICKS = 30_000
+LAYOUTS = ['legacy', 'store', 'cache', 'indicators']
+
+def quiet(func, *args, **kwargs):
+    # Các hàm của dự án in nhiều thông báo và thanh tiến trình (tqdm ghi ra stderr); bỏ qua khi đo
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        return func(*args, **kwargs)
+
+def measure(name, items, func, *args, repeat=3):
+    # Thời gian tốt nhất sau repeat lần chạy và bộ nhớ đỉnh (tracemalloc, chạy riêng một lần vì tracemalloc làm chậm)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        quiet(func, *args)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    quiet(func, *args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = min(timings)
+    result = {'name': name, 'items': items, 'seconds': best, 'throughput': items / best if best else float('inf'),
+              'peak_mb': peak / 2 ** 20}
+    print(f"{name:<55} {best * 1000:>10.1f} ms {result['throughput']:>14,.0f} /s {result['peak_mb']:>9.1f} MB")
+    return result
+
+def prepare_eod(work_dir, layout, n_symbols, n_sessions, seed):
+    # DB dữ liệu EOD cho một cách lưu: legacy (mỗi mã một bảng), store (kho ohlcv),
+    # cache (kho ohlcv + bộ đệm Arrow), indicators (kho ohlcv + bảng chỉ báo tính sẵn)
+    db_path = os.path.join(work_dir, f"eod_{layout}.db")
+    shutil.rmtree(columnar_cache.get_cache_dir(db_path), ignore_errors=True)
+    symbols = synthetic.make_ohlcv_db(db_path, n_symbols, n_sessions, seed=seed,
+                                      layout='legacy' if layout == 'legacy' else 'store')
+    if layout == 'cache':
+        if not columnar_cache.available():
+            return None, symbols
+        columnar_cache.refresh(db_path)
+    elif layout == 'indicators':
+        quiet(eod300.materialize_indicators, db_path)
+    return db_path, symbols
+
+def bench_eod(work_dir, scale, layouts, seed, repeat):
+    results = []
+    n_symbols, n_sessions = scale['symbols'], scale['sessions']
+    outstanding_db_path = os.path.join(work_dir, 'outstanding_share.db')
+    for layout in layouts:
+        start = time.perf_counter()
+        db_path, symbols = prepare_eod(work_dir, layout, n_symbols, n_sessions, seed)
+        if db_path is None:
+            print(f"Bỏ qua {layout}: cần pyarrow cho bộ đệm dạng cột")
+            continue
+        synthetic.make_outstanding_db(outstanding_db_path, symbols, seed=seed)
+        print(f"\n[{layout}] {n_symbols} mã x {n_sessions} phiên (tạo dữ liệu {time.perf_counter() - start:.1f} giây)")
+        prefix = f"{layout}/{n_symbols}x{n_sessions}"
+        cases = [
+            ('calculate_ma_statistics', eod300.calculate_ma_statistics, (symbols, db_path)),
+            ('calculate_ma_ratio_over_time', eod300.calculate_ma_ratio_over_time, (symbols, db_path)),
+            ('calculate_roc_data', eod300.calculate_roc_data, (symbols, db_path)),
+            ('calculate_average_volumes', eod300.calculate_average_volumes, (symbols, db_path)),
+            ('calculate_changes', eod300.calculate_changes, (symbols, db_path)),
+            ('vh.calculate_market_cap', vh.calculate_market_cap, (db_path, outstanding_db_path)),
+        ]
+        for name, func, args in cases:
+            results.append(measure(f"{prefix} {name}", n_symbols, func, *args, repeat=repeat))
+    return results
+
+def replay_archive(symbol, archive_dir):
+    # Đọc lại cả tháng từ kho và tính bảng theo phút của từng phiên
+    for _, arrays in tick_archive.iter_days(symbol, archive_dir=archive_dir):
+        orderflow.minute_kernel(*arrays)
+
+def bench_intraday(work_dir, scale, seed, repeat):
+    results = []
+    print()
+    archive_dir = os.path.join(work_dir, 'tick_archive')
+    shutil.rmtree(archive_dir, ignore_errors=True)
+    for i, day in enumerate(pd.bdate_range(end=synthetic.END_DATE, periods=ARCHIVE_SESSIONS)):
+        tick_archive.save('AAA', synthetic.make_ticks(ARCHIVE_TICKS, seed=seed + i, date=day.date()), archive_dir)
+    size = sum(os.path.getsize(tick_archive.day_path('AAA', day, archive_dir))
+               for day in tick_archive.days('AAA', archive_dir=archive_dir))
+    print(f"Kho lệnh khớp: {ARCHIVE_SESSIONS} phiên x {ARCHIVE_TICKS} lệnh, "
+          f"{size / ARCHIVE_SESSIONS / 1024:.0f} KB mỗi mã mỗi phiên")
+    n_archived = ARCHIVE_SESSIONS * ARCHIVE_TICKS
+    results.append(measure(f"archive/{ARCHIVE_SESSIONS}x{ARCHIVE_TICKS} tick_archive.load", n_archived,
+                           tick_archive.load, 'AAA', None, None, archive_dir, repeat=repeat))
+    results.append(measure(f"archive/{ARCHIVE_SESSIONS}x{ARCHIVE_TICKS} replay minute_kernel", n_archived,
+                           replay_archive, 'AAA', archive_dir, repeat=repeat))
+    for n_ticks in scale['ticks']:
+        ticks = synthetic.make_ticks(n_ticks, seed=seed)
+        results.append(measure(f"ticks/{n_ticks} orderflow.aggregate_intraday", n_ticks, orderflow.aggregate_intraday,
+                               ticks, repeat=repeat))
+        results.append(measure(f"ticks/{n_ticks} orderflow.compute", n_ticks, orderflow.compute, ticks, repeat=repeat))
+        results.append(measure(f"ticks/{n_ticks} orderflow.scan_metrics", n_ticks,
+                               lambda ticks: orderflow.scan_metrics(*orderflow.tick_arrays(ticks)), ticks, repeat=repeat))
+    return results
+
+def bench_financials(work_dir, scale, seed, repeat):
+    # Vẽ một chỉ tiêu (không hiển thị) cho mọi mã có báo cáo: đọc bảng báo cáo + dựng biểu đồ
+    symbols = synthetic.make_symbols(scale['financial_symbols'])
+    synthetic.make_financial_dbs(work_dir, symbols, seed=seed)
+    report_renderer.configure(os.path.join(work_dir, 'charts'))
+
+    def plot_all(period, table_name):
+        for symbol in symbols:
+            db_path = os.path.join(work_dir, 'data', 'HOSE', period.lower(), f"{symbol}.db")
+            bctc.plot_indicator_from_db(symbol, 'income_statement', period, 10, db_path, table_name, 'Chỉ tiêu 1')
+
+    # Lát cắt ngang một chỉ tiêu của mọi mã: mở từng file DB của mã so với một truy vấn trên kho dạng dài
+    def cross_section_files():
+        for symbol in symbols:
+            conn = sqlite3.connect(os.path.join(work_dir, 'data', 'HOSE', 'year', f"{symbol}.db"))
+            conn.execute('SELECT "Chỉ tiêu 1" FROM income_statement_year WHERE "Năm" = 2020').fetchone()
+            conn.close()
+
+    store_path = os.path.join(work_dir, 'financials.db')
+    quiet(financial_store.import_from_files, os.path.join(work_dir, 'data'), store_path)
+    store = financial_store.connect(store_path)
+
+    print(f"\n[financials] {len(symbols)} mã x 8 bảng báo cáo")
+    results = [measure(f"financials/{len(symbols)} bctc.plot_indicator ({period})", len(symbols), plot_all, period,
+                       f"income_statement_{period.lower()}", repeat=repeat)
+               for period in ['Year', 'Quarter']]
+    results.append(measure(f"financials/{len(symbols)} một chỉ tiêu mọi mã (file)", len(symbols),
+                           cross_section_files, repeat=repeat))
+    results.append(measure(f"financials/{len(symbols)} financial_store.read_item", len(symbols),
+                           financial_store.read_item, store, 'Chỉ tiêu 1', 'income_statement', 'year', 2020,
+                           repeat=repeat))
+    store.close()
+    return results
+
+def compare(results, baseline_path, tolerance):
+    # So với baseline: trả về danh sách các phép đo chậm hơn tolerance lần
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {item['name']: item for item in json.load(f)['results']}
+    regressions = []
+    print(f"\nSo sánh với {baseline_path} (ngưỡng x{tolerance}):")
+    for result in results:
+        base = baseline.get(result['name'])
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        flag = "CHẬM HƠN" if ratio > tolerance else ""
+        print(f"{result['name']:<55} x{ratio:>6.2f} {flag}")
+        if ratio > tolerance:
+            regressions.append(result['name'])
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng trên dữ liệu giả lập")
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--symbols', type=int, help="Ghi đè số mã của scale")
+    parser.add_argument('--sessions', type=int, help="Ghi đè số phiên của scale")
+    parser.add_argument('--ticks', type=int, nargs='+', help="Ghi đè số lệnh khớp của scale")
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=LAYOUTS)
+    parser.add_argument('--only', nargs='+', choices=['eod', 'intraday', 'financials'],
+                        default=['eod', 'intraday', 'financials'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', help="Thư mục dữ liệu giả lập (mặc định: thư mục tạm, xóa khi xong)")
+    parser.add_argument('--save', help="Ghi kết quả ra file JSON (làm baseline)")
+    parser.add_argument('--compare', help="File JSON baseline để so sánh")
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    scale = dict(SCALES[args.scale])
+    for key in ['symbols', 'sessions', 'ticks']:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    print(f"{'Phép đo':<55} {'Thời gian':>13} {'Thông lượng':>16} {'Bộ nhớ đỉnh':>12}")
+    results = []
+    try:
+        if 'eod' in args.only:
+            results += bench_eod(work_dir, scale, args.layouts, args.seed, args.repeat)
+        if 'intraday' in args.only:
+            results += bench_intraday(work_dir, scale, args.seed, args.repeat)
+        if 'financials' in args.only:
+            results += bench_financials(work_dir, scale, args.seed, args.repeat)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'scale': scale, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi kết quả vào {args.save}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"Có {len(regressions)} phép đo chậm hơn baseline.")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import os
+import sys
+import sqlite3
+import itertools
+import numpy as np
+import pandas as pd
+
+# Dữ liệu giả lập có tính tất định (cùng seed cho cùng dữ liệu) để đo hiệu năng không cần mạng:
+# DB EOD (cấu trúc cũ mỗi mã một bảng hoặc kho ohlcv), danh sách nhóm, số cổ phiếu lưu hành,
+# dữ liệu khớp lệnh trong phiên và các bảng báo cáo tài chính theo cấu trúc của bctc.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ohlcv_store
+import data_source
+from sqlite_writer import write_table
+
+END_DATE = '2024-06-28'
+FINANCIAL_TABLES = ['balance_sheet', 'income_statement', 'cash_flow', 'ratios']
+
+def make_symbols(n_symbols):
+    # n_symbols mã 3 chữ cái khác nhau (AAA, AAB, ...), trải đều trên bảng chữ cái
+    combos = [''.join(c) for c in itertools.product('ABCDEFGHIJKLMNOPQRSTUVWXYZ', repeat=3)]
+    step = max(1, len(combos) // n_symbols)
+    return combos[::step][:n_symbols]
+
+def make_bars(rng, n_sessions, end_date=END_DATE, missing=0.02):
+    # Chuỗi OHLCV ngày của một mã: giá theo bước ngẫu nhiên log, làm tròn 0.05; thiếu ngẫu nhiên ~2% phiên
+    days = pd.bdate_range(end=end_date, periods=int(n_sessions * (1 + missing)) + 1)
+    days = days[rng.random(len(days)) > missing][-n_sessions:]
+    n = len(days)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, n)) + rng.normal(0, 0.5))
+    close = np.maximum(np.round(close / 0.05) * 0.05, 0.05)
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    return pd.DataFrame({
+        'time': days,
+        'open': np.round(close + rng.normal(0, 0.3, n) * spread, 2),
+        'high': np.round(close + spread, 2),
+        'low': np.round(np.maximum(close - spread, 0.05), 2),
+        'close': np.round(close, 2),
+        'volume': rng.integers(1_000, 2_000_000, n),
+    })
+
+def make_ohlcv_db(path, n_symbols, n_sessions, seed=0, layout='store'):
+    # layout='store': kho ohlcv (một bảng); layout='legacy': mỗi mã một bảng với time dạng chuỗi.
+    # Trả về danh sách mã.
+    if os.path.exists(path):
+        os.remove(path)
+    rng = np.random.default_rng(seed)
+    symbols = make_symbols(n_symbols)
+    conn = ohlcv_store.connect(path) if layout == 'store' else sqlite3.connect(path)
+    with conn:
+        for symbol in symbols:
+            df = make_bars(rng, n_sessions)
+            if layout == 'store':
+                ohlcv_store.write_bars(conn, symbol, df)
+            else:
+                write_table(conn, symbol, df)
+        ohlcv_store.rebuild_freshness(conn)
+    conn.close()
+    return symbols
+
+def make_list_db(path, symbols, table='stocks'):
+    # File danh sách nhóm giống stock_group_<nhóm>.db
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        write_table(conn, table, pd.DataFrame({'symbol': symbols, 'exchange': 'HOSE'}))
+    conn.close()
+
+def make_outstanding_db(path, symbols, seed=0):
+    rng = np.random.default_rng(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        write_table(conn, 'outstanding_shares', pd.DataFrame({
+            'symbol': symbols, 'outstanding_share': rng.integers(10_000_000, 5_000_000_000, len(symbols))}))
+    conn.close()
+
+def make_ticks(n_ticks, seed=0, date=END_DATE):
+    # Dữ liệu khớp lệnh trong phiên giống quote.intraday của TCBS: time (có múi giờ), price, volume, match_type
+    rng = np.random.default_rng(seed)
+    open_time = pd.Timestamp(f"{date} 09:15", tz='Asia/Ho_Chi_Minh')
+    seconds = np.sort(rng.integers(0, 5 * 3600, n_ticks))
+    # Bỏ giờ nghỉ trưa 11:30-13:00
+    seconds = np.where(seconds >= 2 * 3600 + 15 * 60, seconds + 90 * 60, seconds)
+    price = np.round(np.maximum(25 + np.cumsum(rng.normal(0, 0.01, n_ticks)), 1) / 0.05) * 0.05 * 1000
+    return pd.DataFrame({
+        'time': open_time + pd.to_timedelta(seconds, unit='s'),
+        'price': price,
+        'volume': rng.integers(1, 500, n_ticks) * 100,
+        'match_type': np.where(rng.random(n_ticks) < 0.5, 'Buy', 'Sell'),
+        'id': np.arange(n_ticks),
+    })
+
+def make_statement(rng, n_periods, n_items, period, start_year=2010):
+    # Một bảng báo cáo: mỗi dòng một kỳ, các cột chỉ tiêu dạng số
+    if period == 'year':
+        index = pd.DataFrame({'Năm': np.arange(start_year, start_year + n_periods)})
+    else:
+        index = pd.DataFrame({'Năm': start_year + np.arange(n_periods) // 4, 'Kỳ': np.arange(n_periods) % 4 + 1})
+    values = pd.DataFrame(rng.normal(1e11, 3e10, (n_periods, n_items)).round(0),
+                          columns=[f'Chỉ tiêu {i + 1}' for i in range(n_items)])
+    return pd.concat([index, values], axis=1)
+
+def make_financial_dbs(base_dir, symbols, seed=0, exchange='HOSE', years=14, items=40):
+    # 8 bảng báo cáo cho mỗi mã (4 loại x năm/quý) cùng bảng cổ tức, theo cấu trúc
+    # <base_dir>/data/<sàn>/year|quarter/<mã>.db của bctc.py. Trả về danh sách đường dẫn DB.
+    rng = np.random.default_rng(seed)
+    paths = []
+    for period in ['year', 'quarter']:
+        os.makedirs(os.path.join(base_dir, 'data', exchange, period), exist_ok=True)
+    for symbol in symbols:
+        for period, n_periods in [('year', years), ('quarter', years * 4)]:
+            path = os.path.join(base_dir, 'data', exchange, period, f"{symbol}.db")
+            conn = sqlite3.connect(path)
+            with conn:
+                for report in FINANCIAL_TABLES:
+                    write_table(conn, f"{report}_{period}", make_statement(rng, n_periods, items, period))
+                if period == 'year':
+                    write_table(conn, 'dividends', pd.DataFrame({
+                        'exercise_date': pd.date_range(end=END_DATE, periods=years, freq='YS').strftime('%d/%m/%y'),
+                        'cash_year': 2024 - np.arange(years)[::-1],
+                        'cash_dividend_percentage': rng.uniform(0, 0.3, years).round(3),
+                        'issue_method': 'cash',
+                    }))
+            conn.close()
+            paths.append(path)
+    return paths
+
+def make_replay_dir(directory, n_symbols, n_sessions=1000, seed=0, n_ticks=10_000, years=14, items=40):
+    # Thư mục phản hồi ghi sẵn cho data_source.ReplaySource: danh sách nhóm/sàn/ngành, lịch sử giá (VCI),
+    # khớp lệnh trong phiên, số cổ phiếu lưu hành, cổ tức (TCBS) và 8 báo cáo tài chính (VCI) cho mỗi mã.
+    # Trả về danh sách mã.
+    rng = np.random.default_rng(seed)
+    symbols = make_symbols(n_symbols)
+    save = lambda method, source, parts, response: data_source.save_response(directory, method, source, parts, response)
+    for group in ['HOSE', 'VN30', 'VNMidCap', 'VNSmallCap', 'VNAllShare', 'VN100', 'ETF', 'HNX', 'HNX30', 'HNXCon',
+                  'HNXFin', 'HNXLCap', 'HNXMSCap', 'HNXMan', 'UPCOM', 'FU_INDEX', 'CW']:
+        if group in ('HOSE', 'VNAllShare'):
+            members = symbols
+        elif group.startswith('VN'):
+            members = sorted(rng.choice(symbols, min(len(symbols), 100), replace=False).tolist())
+        else:
+            members = []
+        save('symbols_by_group', 'VCI', (group,), pd.Series(members, name='symbol'))
+    save('symbols_by_exchange', 'VCI', (), pd.DataFrame({'symbol': symbols, 'exchange': 'HOSE'}))
+    save('symbols_by_industries', 'VCI', (), pd.DataFrame({
+        'symbol': symbols, 'industry': rng.choice(['Ngân hàng', 'Bất động sản', 'Thép'], len(symbols)),
+        'sub_industry': ''}))
+    for symbol in symbols:
+        save('history', 'VCI', (symbol, '1D'), make_bars(rng, n_sessions))
+        save('overview', 'TCBS', (symbol,), pd.DataFrame({
+            'symbol': [symbol], 'outstanding_share': [int(rng.integers(10_000_000, 5_000_000_000))]}))
+        save('dividends', 'TCBS', (symbol,), pd.DataFrame({
+            'cash_year': 2024 - np.arange(years)[::-1], 'cash_dividend_percentage': rng.uniform(0, 0.3, years).round(3)}))
+        for period, n_periods in [('year', years), ('quarter', years * 4)]:
+            for report in ['balance_sheet', 'income_statement', 'cash_flow', 'ratio']:
+                save('finance', 'VCI', (symbol, report, period), make_statement(rng, n_periods, items, period))
+    if n_ticks:
+        for i, symbol in enumerate(symbols):
+            save('intraday', 'TCBS', (symbol,), make_ticks(n_ticks, seed=seed + i))
+    return symbols
@@ -0,0 +1,201 @@
+import argparse
+import sys
+import time
+import config
+import data_source
+
+# Chạy từng bước của hệ thống không cần tương tác (dùng cho cron / Task Scheduler), ví dụ:
+#   python cli.py update-lists
+#   python cli.py --config /etc/stock/config.ini update-eod
+#   python cli.py breadth --output reports/hom_nay
+#   python cli.py intraday ACB FPT VNM --output intraday
+#   python cli.py scan-flow --group VN30
+#   python cli.py watch ACB FPT --interval 10
+#   python cli.py archive-ticks --group VN30
+#   python cli.py intraday ACB --date 2024-06-28
+# Các module được import trong từng lệnh, sau khi đã nạp file cấu hình.
+
+def cmd_update_eod(args):
+    import eod300
+    eod300.update_eod(interactive=False, mode=args.mode)
+    eod300.describe_data_dbs()
+
+def cmd_update_lists(args):
+    import ds
+    ds.main(force=args.force)
+
+def cmd_update_financials(args):
+    import bctc
+    bctc.update_financials(symbols=set(args.symbols) if args.symbols else None, mode=args.mode, force=args.force,
+                           layout='files' if args.legacy_files else None)
+
+def cmd_screen(args):
+    import screener
+    return screener.main(args.extra)
+
+def cmd_jobs(args):
+    # Trạng thái các tác vụ tải trong nhật ký công việc và danh sách việc lỗi
+    from job_journal import JobJournal
+    with JobJournal() as journal:
+        tasks = args.tasks or journal.tasks()
+        if not tasks:
+            print(f"Chưa có tác vụ nào trong {journal.db_path}")
+        for task in tasks:
+            run = journal.run_info(task)
+            if run is None:
+                print(f"{task}: chưa từng chạy")
+                continue
+            counts = journal.counts(task)
+            state = f"xong lúc {run[1]}" if run[1] else "chưa hoàn tất"
+            print(f"{task}: bắt đầu {run[0]}, {state}; "
+                  + ", ".join(f"{status} {count}" for status, count in sorted(counts.items())))
+            for symbol, report, attempts, last_error, updated_at in journal.failures(task)[:args.limit]:
+                print(f"  - {symbol} {report} ({attempts} lần, {updated_at}): {last_error}")
+
+def cmd_breadth(args):
+    import eod300
+    if args.output:
+        output_dir = eod300.render_chart_pack(args.output, max_workers=args.workers)
+        print(f"Đã lưu biểu đồ tại {output_dir}")
+        return
+    for selected_list, result in eod300.analyze_all_groups(max_workers=args.workers).items():
+        eod300.print_ma_statistics(result['counts'], result['total_stocks'], selected_list)
+
+def cmd_intraday(args):
+    import bsgit
+    symbols = [symbol.upper() for symbol in args.symbols]
+    if args.output:
+        bsgit.analyze_stocks_to_files(symbols, args.output, max_workers=args.workers, day=args.date)
+        return
+    for symbol in symbols:
+        bsgit.analyze_stock(symbol, args.date)
+
+def cmd_scan_flow(args):
+    import flow_scanner
+    flow_scanner.scan_group(args.group, [symbol.upper() for symbol in args.symbols], args.sort, args.ascending,
+                            args.limit, args.workers, args.output)
+
+def cmd_watch(args):
+    import intraday_poller
+    intraday_poller.watch([symbol.upper() for symbol in args.symbols], args.interval, args.rounds,
+                          archive=args.archive)
+
+def cmd_archive_ticks(args):
+    import tick_archive
+    if args.describe:
+        tick_archive.describe()
+        return
+    tick_archive.archive_group(args.group, [symbol.upper() for symbol in args.symbols])
+
+def cmd_market_cap(args):
+    import vh
+    if args.update:
+        # Cập nhật EOD ngay trong tiến trình này (chỉ các mã đã cũ được tải lại) thay vì chạy script tương tác
+        import eod300
+        eod300.update_eod(interactive=False)
+    vh.main(update=False)
+
+def add_mode_arguments(parser):
+    # Mặc định làm tiếp lần chạy bị gián đoạn (nếu có) theo nhật ký công việc
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--retry-failed', dest='mode', action='store_const', const='retry_failed',
+                       help="Chỉ chạy lại các việc lỗi của lần chạy gần nhất")
+    group.add_argument('--restart', dest='mode', action='store_const', const='restart',
+                       help="Bỏ qua lần chạy dở và bắt đầu lại từ đầu")
+    parser.set_defaults(mode='resume')
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Cập nhật và phân tích dữ liệu cổ phiếu không cần tương tác")
+    parser.add_argument('--config', help="File cấu hình (mặc định: config.ini cạnh mã nguồn hoặc biến môi trường STOCK_CONFIG)")
+    parser.add_argument('--replay', help="Dùng các phản hồi đã ghi trong thư mục này thay cho vnstock (không cần mạng)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('update-eod', help="Tải dữ liệu EOD HOSE, cập nhật thành viên nhóm và chỉ báo")
+    add_mode_arguments(p)
+    p.set_defaults(func=cmd_update_eod)
+
+    p = subparsers.add_parser('update-lists', help="Tải lại danh sách chỉ số, phân ngành, sàn và số cổ phiếu lưu hành")
+    p.add_argument('--force', action='store_true', help="Tải lại kể cả khi lần cập nhật gần nhất chưa quá 30 ngày")
+    p.set_defaults(func=cmd_update_lists)
+
+    p = subparsers.add_parser('update-financials', help="Tải lại báo cáo tài chính HOSE và HNX")
+    p.add_argument('symbols', nargs='*', help="Chỉ tải các mã này (mặc định: tất cả)")
+    p.add_argument('--force', action='store_true', help="Tải lại mọi báo cáo kể cả khi chưa thể có kỳ mới")
+    p.add_argument('--legacy-files', action='store_true',
+                   help="Ghi vào file DB của từng mã (cấu trúc cũ) thay vì kho báo cáo dạng dài")
+    add_mode_arguments(p)
+    p.set_defaults(func=cmd_update_financials)
+
+    p = subparsers.add_parser('screen', help="Lọc cổ phiếu theo chỉ tiêu tài chính (xem: cli.py screen --help)",
+                              add_help=False)
+    # Các tham số còn lại được chuyển nguyên cho screener.py
+    p.set_defaults(func=cmd_screen, passthrough=True)
+
+    p = subparsers.add_parser('jobs', help="Trạng thái các lần tải trong nhật ký công việc và các việc lỗi")
+    p.add_argument('tasks', nargs='*', help="Các tác vụ (mặc định: tất cả), ví dụ eod_HOSE, financials")
+    p.add_argument('--limit', type=int, default=50, help="Số việc lỗi hiển thị tối đa mỗi tác vụ")
+    p.set_defaults(func=cmd_jobs)
+
+    p = subparsers.add_parser('breadth', help="Thống kê MA của mọi danh sách; --output để ghi toàn bộ biểu đồ ra file")
+    p.add_argument('--output', help="Thư mục ghi biểu đồ")
+    p.add_argument('--workers', type=int, help="Số tiến trình (mặc định: mục [concurrency] process_workers)")
+    p.set_defaults(func=cmd_breadth)
+
+    p = subparsers.add_parser('intraday', help="Phân tích dòng tiền trong phiên của các mã")
+    p.add_argument('symbols', nargs='+', help="Các mã cổ phiếu")
+    p.add_argument('--output', help="Thư mục ghi biểu đồ (không có: hiển thị)")
+    p.add_argument('--workers', type=int, help="Số tiến trình khi ghi ra file")
+    p.add_argument('--date', help="Phân tích phiên đã lưu trong kho lệnh khớp (YYYY-MM-DD) thay vì tải phiên hiện tại")
+    p.set_defaults(func=cmd_intraday)
+
+    p = subparsers.add_parser('scan-flow', help="Quét và xếp hạng dòng tiền trong phiên của cả một danh sách mã")
+    p.add_argument('symbols', nargs='*', help="Chỉ quét các mã này (mặc định: mọi mã của --group)")
+    p.add_argument('--group', default='HOSE', choices=['HOSE', 'VN30', 'VN100', 'VNAllShare', 'VNMidCap', 'VNSmallCap'])
+    p.add_argument('--sort', default='net_flow',
+                   choices=['net_flow', 'net_flow_share', 'imbalance_ratio', 'order_to_volume_ratio', 'outlier_minutes',
+                            'in_flow', 'out_flow', 'volume'])
+    p.add_argument('--ascending', action='store_true', help="Xếp tăng dần (ví dụ: bán ròng mạnh nhất trước)")
+    p.add_argument('--limit', type=int, default=30, help="Số mã hiển thị")
+    p.add_argument('--workers', type=int, help="Số tiến trình tính toán")
+    p.add_argument('--output', help="Ghi toàn bộ bảng xếp hạng ra file CSV")
+    p.set_defaults(func=cmd_scan_flow)
+
+    p = subparsers.add_parser('watch', help="Theo dõi dòng tiền trong phiên, mỗi lần làm mới chỉ tải các lệnh mới")
+    p.add_argument('symbols', nargs='+', help="Các mã cổ phiếu")
+    p.add_argument('--interval', type=float, default=15, help="Số giây giữa hai lần làm mới")
+    p.add_argument('--rounds', type=int, help="Số lần làm mới (mặc định: đến khi Ctrl+C)")
+    p.add_argument('--archive', action='store_true', help="Ghi các lệnh mới vào kho lệnh khớp ([paths] tick_archive)")
+    p.set_defaults(func=cmd_watch)
+
+    p = subparsers.add_parser('archive-ticks', help="Lưu lệnh khớp cả phiên của một danh sách mã vào kho lệnh khớp")
+    p.add_argument('symbols', nargs='*', help="Chỉ lưu các mã này (mặc định: mọi mã của --group)")
+    p.add_argument('--group', default='HOSE', choices=['HOSE', 'VN30', 'VN100', 'VNAllShare', 'VNMidCap', 'VNSmallCap'])
+    p.add_argument('--describe', action='store_true', help="Chỉ liệt kê các phiên đã lưu")
+    p.set_defaults(func=cmd_archive_ticks)
+
+    p = subparsers.add_parser('market-cap', help="Tính vốn hóa thực tế của các danh sách")
+    p.add_argument('--update', action='store_true', help="Cập nhật dữ liệu EOD trước khi tính")
+    p.set_defaults(func=cmd_market_cap)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and not getattr(args, 'passthrough', False):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.extra = extra
+    if args.config:
+        try:
+            config.load(args.config)
+        except FileNotFoundError as e:
+            print(e)
+            return 2
+    if args.replay:
+        data_source.use_replay(args.replay)
+    start = time.perf_counter()
+    args.func(args)
+    print(f"Hoàn tất {args.command} sau {time.perf_counter() - start:.1f} giây")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
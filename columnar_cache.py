@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+import ohlcv_store
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow là tùy chọn: không có thì các phân tích đọc trực tiếp từ SQLite
+    pa = None
+
+# Bộ đệm dạng cột của DB dữ liệu EOD: mỗi mã một file Arrow IPC (time, open, high, low, close, volume)
+# trong thư mục <tên DB>_cache bên cạnh file DB. Các file được memory-map khi đọc nên các cột số được
+# dùng trực tiếp dưới dạng mảng NumPy, không phải phân tích chuỗi thời gian hay dựng đối tượng theo từng dòng.
+# manifest.json ghi (phiên gần nhất, số phiên, thời điểm tải) của từng mã tại thời điểm ghi bộ đệm; mã nào khác
+# với chỉ mục độ mới trong DB thì coi như chưa có trong bộ đệm. Thời điểm tải thay đổi cả khi một lần tải lại chỉ
+# thay thế phiên cuối (chưa đóng cửa) mà không thêm phiên mới.
+MANIFEST_NAME = "manifest.json"
+
+def available():
+    return pa is not None
+
+def get_cache_dir(db_path):
+    return os.path.splitext(db_path)[0] + "_cache"
+
+def _symbol_path(cache_dir, symbol):
+    return os.path.join(cache_dir, f"{symbol}.arrow")
+
+def _read_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def _read_symbol_data(conn, symbols, use_store):
+    # Đọc dữ liệu đầy đủ của các mã cần ghi lại vào bộ đệm: {symbol: DataFrame}
+    if use_store:
+        panel = ohlcv_store.read_panel(conn, symbols)
+        return {symbol: df.drop(columns='symbol') for symbol, df in panel.groupby('symbol', sort=False)}
+    frames = {}
+    for symbol in symbols:
+        try:
+            df = pd.read_sql_query(
+                f'SELECT time, {", ".join(ohlcv_store.OHLCV_COLUMNS)} FROM "{symbol}" ORDER BY time ASC', conn)
+            df['time'] = pd.to_datetime(df['time'])
+            frames[symbol] = df
+        except Exception as e:
+            print(f"Bỏ qua {symbol} khi ghi bộ đệm: {e}")
+    return frames
+
+def _write_symbol_file(cache_dir, symbol, df):
+    table = pa.table({
+        'time': pa.array(df['time'].values.astype('datetime64[s]'), type=pa.timestamp('s')),
+        **{col: pa.array(df[col], from_pandas=True) for col in ohlcv_store.OHLCV_COLUMNS},
+    })
+    path = _symbol_path(cache_dir, symbol)
+    with pa.OSFile(path + ".tmp", 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+def refresh(db_path, symbols=None, cache_dir=None):
+    # Ghi lại vào bộ đệm các mã đã thay đổi kể từ lần ghi trước (so theo chỉ mục độ mới).
+    # Trả về số mã đã ghi lại.
+    if pa is None or not os.path.exists(db_path):
+        return 0
+    cache_dir = cache_dir or get_cache_dir(db_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        ohlcv_store.ensure_freshness(conn)
+        current = ohlcv_store.freshness_state(conn, symbols)
+        manifest = _read_manifest(cache_dir)
+        changed = [symbol for symbol, state in current.items()
+                   if manifest.get(symbol) != state or not os.path.exists(_symbol_path(cache_dir, symbol))]
+        frames = _read_symbol_data(conn, changed, ohlcv_store.has_table(conn, 'ohlcv')) if changed else {}
+    finally:
+        conn.close()
+
+    for symbol, df in frames.items():
+        _write_symbol_file(cache_dir, symbol, df)
+        manifest[symbol] = current[symbol]
+    if symbols is None:
+        # Bỏ các mã không còn trong DB
+        for symbol in set(manifest) - set(current):
+            del manifest[symbol]
+            if os.path.exists(_symbol_path(cache_dir, symbol)):
+                os.remove(_symbol_path(cache_dir, symbol))
+    _write_manifest(cache_dir, manifest)
+    return len(frames)
+
+def _load_symbol_file(path, columns, since, last_n):
+    # Memory-map file Arrow và lấy các cột dưới dạng mảng NumPy (không sao chép với cột số không có null)
+    table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    times = table.column('time').to_numpy()
+    start = 0
+    if since is not None:
+        start = int(np.searchsorted(times, np.datetime64(pd.Timestamp(since), 's'), side='left'))
+    if last_n is not None:
+        start = max(start, len(times) - int(last_n))
+    data = {'time': times[start:]}
+    for col in columns:
+        data[col] = table.column(col).to_numpy()[start:]
+    return pd.DataFrame(data, copy=False)
+
+def load_frames(db_path, symbols, columns=('close',), since=None, last_n=None, cache_dir=None):
+    # Đọc từ bộ đệm các mã còn khớp với DB: ({symbol: DataFrame(time, columns...)}, [các mã phải đọc từ DB])
+    symbols = list(symbols)
+    if pa is None or not os.path.exists(db_path):
+        return {}, symbols
+    cache_dir = cache_dir or get_cache_dir(db_path)
+    manifest = _read_manifest(cache_dir)
+    if not manifest:
+        return {}, symbols
+    conn = sqlite3.connect(db_path)
+    try:
+        if not ohlcv_store.has_table(conn, ohlcv_store.FRESHNESS_TABLE):
+            return {}, symbols
+        current = ohlcv_store.freshness_state(conn, symbols)
+    finally:
+        conn.close()
+
+    frames, missing = {}, []
+    for symbol in symbols:
+        path = _symbol_path(cache_dir, symbol)
+        if symbol not in current or manifest.get(symbol) != current[symbol] or not os.path.exists(path):
+            missing.append(symbol)
+            continue
+        try:
+            frames[symbol] = _load_symbol_file(path, columns, since, last_n)
+        except Exception as e:
+            print(f"Lỗi khi đọc bộ đệm cho {symbol}: {e}")
+            missing.append(symbol)
+    return frames, missing
+
+if __name__ == "__main__":
+    # python columnar_cache.py [DB_dữ_liệu]: dựng/cập nhật bộ đệm dạng cột cho DB
+    if pa is None:
+        print("Cần cài đặt pyarrow để dùng bộ đệm dạng cột (pip install pyarrow).")
+        sys.exit(1)
+    target = sys.argv[1] if len(sys.argv) > 1 else (
+        ohlcv_store.OHLCV_DB_PATH if ohlcv_store.has_store(ohlcv_store.OHLCV_DB_PATH) else ohlcv_store.LEGACY_DB_PATH)
+    print(f"Đã ghi {refresh(target)} mã vào bộ đệm {get_cache_dir(target)}")
@@ -0,0 +1,66 @@
+import os
+import configparser
+
+# Cấu hình dùng chung cho các script (đường dẫn DB, số luồng/tiến trình, hạn mức nguồn dữ liệu).
+# Đọc từ config.ini cạnh mã nguồn, hoặc file chỉ định bằng biến môi trường STOCK_CONFIG / cli.py --config.
+# Mục nào không có trong file thì script dùng giá trị mặc định của nó (giống khi chưa có file cấu hình).
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_ENV = 'STOCK_CONFIG'
+DEFAULT_CONFIG_PATH = os.path.join(SCRIPT_DIR, 'config.ini')
+
+_parser = configparser.ConfigParser()
+_state = {'path': None}
+
+def load(path=None):
+    # Nạp (lại) file cấu hình; trả về đường dẫn đã đọc hoặc None nếu không có file
+    global _parser
+    explicit = path is not None
+    path = path or os.environ.get(CONFIG_ENV) or DEFAULT_CONFIG_PATH
+    if explicit and not os.path.exists(path):
+        raise FileNotFoundError(f"Không tìm thấy file cấu hình: {path}")
+    _parser = configparser.ConfigParser()
+    _state['path'] = os.path.abspath(path) if _parser.read(path, encoding='utf-8') else None
+    if explicit:
+        # Tiến trình con (ProcessPoolExecutor trên Windows nạp lại module) đọc cùng file cấu hình
+        os.environ[CONFIG_ENV] = os.path.abspath(path)
+    return _state['path']
+
+def loaded_path():
+    return _state['path']
+
+def get(section, key, default=None):
+    value = _parser.get(section, key, fallback=None)
+    return default if value is None or value.strip() == '' else value.strip()
+
+def get_int(section, key, default=None):
+    value = get(section, key)
+    return default if value is None else int(value)
+
+def get_float(section, key, default=None):
+    value = get(section, key)
+    return default if value is None else float(value)
+
+def get_bool(section, key, default=False):
+    value = get(section, key)
+    return default if value is None else _parser.BOOLEAN_STATES.get(value.lower(), default)
+
+def get_path(section, key, default=None):
+    # Đường dẫn tương đối được tính từ thư mục chứa file cấu hình
+    value = get(section, key)
+    if value is None:
+        return default
+    value = os.path.expanduser(value)
+    if not os.path.isabs(value) and _state['path'] is not None:
+        value = os.path.join(os.path.dirname(_state['path']), value)
+    return os.path.normpath(value)
+
+def get_rate_limits(default):
+    # Mục [rate_limits]: NGUỒN = số yêu cầu mỗi phút, số yêu cầu gửi dồn (ví dụ: VCI = 35, 5)
+    limits = dict(default)
+    if _parser.has_section('rate_limits'):
+        for source, value in _parser.items('rate_limits'):
+            rate, _, burst = value.partition(',')
+            limits[source.upper()] = (int(rate), int(burst) if burst.strip() else 1)
+    return limits
+
+load()
@@ -0,0 +1,270 @@
+import os
+import re
+import time
+import random
+import threading
+from collections import OrderedDict
+import pandas as pd
+import config
+
+# Lớp nguồn dữ liệu dùng chung cho mọi script tải dữ liệu. Các script gọi get_source() rồi dùng các hàm
+# history / intraday / finance / dividends / overview / symbols_by_* thay vì tự tạo Vnstock() cho mỗi mã.
+#   VnstockSource:   gọi vnstock, dùng chung một client cho mỗi nguồn (VCI/TCBS) và giữ lại đối tượng của các mã
+#                    vừa dùng (lần thử lại không phải dựng lại client)
+#   ReplaySource:    trả về các phản hồi đã ghi sẵn trên đĩa, có độ trễ và tỷ lệ lỗi giả lập (không cần mạng)
+#   RecordingSource: bọc một nguồn khác và ghi mọi phản hồi ra thư mục theo định dạng của ReplaySource
+# Chọn nguồn trong mục [data_source] của config.ini hoặc bằng set_source().
+
+# ### Vnstock
+class VnstockSource:
+    """Nguồn vnstock với một client cho mỗi nguồn và bộ nhớ đệm LRU các đối tượng stock theo (mã, nguồn)"""
+
+    def __init__(self, max_cached=256):
+        self.max_cached = max_cached
+        self.clients = {}
+        self.stocks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def stock(self, symbol, source):
+        key = (symbol, source)
+        with self.lock:
+            stock = self.stocks.get(key)
+            if stock is not None:
+                self.stocks.move_to_end(key)
+                return stock
+            client = self.clients.get(source)
+            if client is None:
+                from vnstock import Vnstock
+                client = self.clients[source] = Vnstock()
+        # Dựng đối tượng stock ngoài khóa (có thể gọi mạng); hai luồng cùng dựng một mã thì giữ bản sau
+        stock = client.stock(symbol=symbol, source=source)
+        with self.lock:
+            self.stocks[key] = stock
+            if len(self.stocks) > self.max_cached:
+                self.stocks.popitem(last=False)
+        return stock
+
+    def history(self, symbol, start, interval='1D', source='VCI'):
+        return self.stock(symbol, source).quote.history(start=start, interval=interval)
+
+    def intraday(self, symbol, page_size=10_000, source='TCBS', page=0):
+        # page 0: các lệnh mới nhất; page 1, 2, ...: các lệnh cũ hơn (chỉ truyền khi khác 0 vì không phải nguồn nào cũng có)
+        kwargs = {'page': page} if page else {}
+        return self.stock(symbol, source).quote.intraday(symbol=symbol, page_size=page_size, show_log=False, **kwargs)
+
+    def finance(self, symbol, report, period, source='VCI', **kwargs):
+        # report: balance_sheet, income_statement, cash_flow, ratio
+        return getattr(self.stock(symbol, source).finance, report)(period=period, **kwargs)
+
+    def dividends(self, symbol, source='TCBS'):
+        return self.stock(symbol, source).company.dividends()
+
+    def overview(self, symbol, source='TCBS'):
+        return self.stock(symbol, source).company.overview()
+
+    def symbols_by_group(self, group, source='VCI'):
+        return self.stock('ACB', source).listing.symbols_by_group(group)
+
+    def symbols_by_industries(self, source='VCI'):
+        return self.stock('ACB', source).listing.symbols_by_industries()
+
+    def symbols_by_exchange(self, source='VCI'):
+        return self.stock('ACB', source).listing.symbols_by_exchange()
+
+# ### Ghi và phát lại phản hồi
+# Mỗi phản hồi là một file pickle: <thư mục>/<hàm>/<nguồn>/<khóa>.pkl. Khóa gồm mã và các tham số xác định
+# nội dung (báo cáo, kỳ, nhóm); ngày bắt đầu của history không nằm trong khóa mà được lọc khi phát lại.
+def _response_path(directory, method, source, *parts):
+    name = '_'.join(re.sub(r'[^\w.-]+', '_', str(part)) for part in parts if part is not None) or '_'
+    return os.path.join(directory, method, source, f"{name}.pkl")
+
+def save_response(directory, method, source, parts, response):
+    path = _response_path(directory, method, source, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.to_pickle(response, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def merge_session(previous, latest):
+    # Ghép phần đầu phiên đã ghi (previous) với các lệnh mới nhất vừa tải (latest), cả hai theo thứ tự thời gian.
+    # latest bắt đầu từ ngày sau phần đã ghi là một phiên mới và thay thế phiên cũ. Phần trùng nhau được bỏ theo id
+    # nếu có, ngược lại theo thời gian: các lệnh cùng thời điểm với lệnh cũ nhất của latest chỉ được giữ lại
+    # trong previous phần latest không có.
+    if previous is None or previous.empty:
+        return latest
+    if latest.empty:
+        return previous
+    previous_times = pd.to_datetime(previous['time'])
+    times = pd.to_datetime(latest['time'])
+    start = times.min()
+    if start.normalize() > previous_times.max().normalize():
+        # Phiên mới
+        return latest
+    if 'id' in latest and 'id' in previous:
+        return pd.concat([previous[previous['id'] < latest['id'].min()], latest], ignore_index=True)
+    at_start = previous_times == start
+    keep = (previous_times < start) | (at_start & (at_start.cumsum() <= at_start.sum() - (times == start).sum()))
+    return pd.concat([previous[keep.to_numpy()], latest], ignore_index=True)
+
+class ReplayError(ConnectionError):
+    """Lỗi giả lập của ReplaySource (thay cho lỗi mạng / vượt hạn mức của nguồn thật)"""
+
+class ReplaySource:
+    """Nguồn phát lại các phản hồi đã ghi trong directory.
+
+    latency: thời gian chờ mỗi lần gọi (giây), cộng thêm ngẫu nhiên đến jitter giây.
+    error_rate: xác suất một lần gọi ném ReplayError, để thử cơ chế retry và giới hạn tốc độ.
+    """
+
+    def __init__(self, directory, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _load(self, method, source, *parts):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self.error_rate and self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ReplayError(f"Lỗi giả lập khi gọi {method} ({source}) cho {parts}")
+        path = _response_path(self.directory, method, source, *parts)
+        if not os.path.exists(path):
+            raise ValueError(f"Không có phản hồi ghi sẵn cho {method} ({source}) {parts}: {path}")
+        return pd.read_pickle(path)
+
+    def history(self, symbol, start, interval='1D', source='VCI'):
+        df = self._load('history', source, symbol, interval)
+        if start is not None and not df.empty:
+            df = df[pd.to_datetime(df['time']) >= pd.Timestamp(start)].reset_index(drop=True)
+        return df
+
+    def intraday(self, symbol, page_size=10_000, source='TCBS', page=0):
+        # Phản hồi ghi sẵn là cả phiên (theo thứ tự thời gian); trang page tính từ lệnh mới nhất
+        df = self._load('intraday', source, symbol)
+        end = max(0, len(df) - page * page_size)
+        return df.iloc[max(0, end - page_size):end].reset_index(drop=True)
+
+    def finance(self, symbol, report, period, source='VCI', **kwargs):
+        return self._load('finance', source, symbol, report, period)
+
+    def dividends(self, symbol, source='TCBS'):
+        return self._load('dividends', source, symbol)
+
+    def overview(self, symbol, source='TCBS'):
+        return self._load('overview', source, symbol)
+
+    def symbols_by_group(self, group, source='VCI'):
+        return self._load('symbols_by_group', source, group)
+
+    def symbols_by_industries(self, source='VCI'):
+        return self._load('symbols_by_industries', source)
+
+    def symbols_by_exchange(self, source='VCI'):
+        return self._load('symbols_by_exchange', source)
+
+class RecordingSource:
+    """Bọc một nguồn khác và ghi mọi phản hồi vào directory để ReplaySource phát lại sau này"""
+
+    def __init__(self, inner, directory):
+        self.inner = inner
+        self.directory = directory
+        self.lock = threading.Lock()
+        # Lần tải intraday đang diễn ra của từng (nguồn, mã): phiên đã ghi trước đó và các trang đã nhận
+        self._intraday = {}
+
+    def _record(self, method, source, parts, response):
+        save_response(self.directory, method, source, parts, response)
+        return response
+
+    def history(self, symbol, start, interval='1D', source='VCI'):
+        return self._record('history', source, (symbol, interval), self.inner.history(symbol, start, interval, source))
+
+    def intraday(self, symbol, page_size=10_000, source='TCBS', page=0):
+        # Ghi cả phiên (khóa theo mã) như ReplaySource phát lại: các trang liên tiếp 0, 1, ... của một lần tải
+        # được ghép theo thứ tự thời gian rồi nối vào phần cũ hơn của phiên đã ghi trước đó (mỗi lần làm mới
+        # của intraday_poller chỉ tải các trang mới nhất)
+        response = self.inner.intraday(symbol, page_size, source, page)
+        key = (source, symbol)
+        with self.lock:
+            if page == 0:
+                path = _response_path(self.directory, 'intraday', source, symbol)
+                self._intraday[key] = (pd.read_pickle(path) if os.path.exists(path) else None, [])
+            elif key not in self._intraday or len(self._intraday[key][1]) != page:
+                return response
+            previous, pages = self._intraday[key]
+            pages.append(response)
+            latest = pd.concat(pages[::-1], ignore_index=True)
+            if 'id' in latest:
+                latest = latest.drop_duplicates('id').sort_values('id', kind='stable', ignore_index=True)
+            elif not latest.empty:
+                latest = latest.sort_values('time', kind='stable', ignore_index=True)
+            save_response(self.directory, 'intraday', source, (symbol,), merge_session(previous, latest))
+        return response
+
+    def finance(self, symbol, report, period, source='VCI', **kwargs):
+        return self._record('finance', source, (symbol, report, period),
+                            self.inner.finance(symbol, report, period, source, **kwargs))
+
+    def dividends(self, symbol, source='TCBS'):
+        return self._record('dividends', source, (symbol,), self.inner.dividends(symbol, source))
+
+    def overview(self, symbol, source='TCBS'):
+        return self._record('overview', source, (symbol,), self.inner.overview(symbol, source))
+
+    def symbols_by_group(self, group, source='VCI'):
+        return self._record('symbols_by_group', source, (group,), self.inner.symbols_by_group(group, source))
+
+    def symbols_by_industries(self, source='VCI'):
+        return self._record('symbols_by_industries', source, (), self.inner.symbols_by_industries(source))
+
+    def symbols_by_exchange(self, source='VCI'):
+        return self._record('symbols_by_exchange', source, (), self.inner.symbols_by_exchange(source))
+
+# ### Nguồn dùng chung của tiến trình
+_state = {'source': None}
+_state_lock = threading.Lock()
+# Thư mục phát lại chọn bằng cli.py --replay, ghi đè mục [data_source] (tiến trình con đọc cùng biến môi trường)
+REPLAY_ENV = 'STOCK_REPLAY_DIR'
+
+def create_source():
+    # Nguồn theo mục [data_source] của config.ini: kind = vnstock | replay, record_dir để ghi lại phản hồi
+    replay_dir = os.environ.get(REPLAY_ENV)
+    kind = 'replay' if replay_dir else config.get('data_source', 'kind', 'vnstock')
+    if kind == 'replay':
+        source = ReplaySource(replay_dir or config.get_path('data_source', 'replay_dir', 'replay'),
+                              latency=config.get_float('data_source', 'latency', 0.0),
+                              jitter=config.get_float('data_source', 'jitter', 0.0),
+                              error_rate=config.get_float('data_source', 'error_rate', 0.0),
+                              seed=config.get_int('data_source', 'seed', None))
+    elif kind == 'vnstock':
+        source = VnstockSource()
+    else:
+        raise ValueError(f"Nguồn dữ liệu không hợp lệ trong config: {kind}")
+    record_dir = config.get_path('data_source', 'record_dir', None)
+    return RecordingSource(source, record_dir) if record_dir else source
+
+def get_source():
+    with _state_lock:
+        if _state['source'] is None:
+            _state['source'] = create_source()
+        return _state['source']
+
+def use_replay(directory):
+    # Phát lại các phản hồi trong directory ở tiến trình này và mọi tiến trình con (ProcessPoolExecutor trên
+    # Windows nạp lại module và dựng lại nguồn từ cấu hình), giống cách config.load truyền file cấu hình
+    os.environ[REPLAY_ENV] = os.path.abspath(directory)
+    set_source(None)
+
+def set_source(source):
+    # Thay nguồn dùng chung (ví dụ ReplaySource khi thử tải); None: dựng lại từ config ở lần gọi sau
+    with _state_lock:
+        _state['source'] = source
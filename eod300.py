@@ -1,33 +1,66 @@
 import sqlite3
+import numpy as np
 import pandas as pd
-from vnstock import Vnstock
-from concurrent.futures import ThreadPoolExecutor
 import datetime
 import time
 import os
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
+import config
+import data_source
+import ohlcv_store
+import columnar_cache
+import indicator_store
+import report_renderer
+from fetch_scheduler import AsyncFetchScheduler
+from job_journal import JobJournal
+from sqlite_writer import SQLiteWriter, write_table, dataframe_rows
 
 # ### Định nghĩa các hằng số và đường dẫn
-HOSE_DB_PATH = r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\stock_group_HOSE.db"
+# Các đường dẫn và số luồng có thể đặt trong config.ini (xem config.example.ini), mặc định như dưới đây
+LIST_DIR = config.get_path('paths', 'list_dir', r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu")
+LIST_SCRIPT_PATH = config.get_path('paths', 'list_script', os.path.join(LIST_DIR, "khoitaodanhsach.py"))
+HOSE_DB_PATH = os.path.join(LIST_DIR, "stock_group_HOSE.db")
 GROUP_DB_PATHS = {
-    'VN30': r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\stock_group_VN30.db",
-    'VN100': r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\stock_group_VN100.db",
-    'VNAllShare': r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\stock_group_VNAllShare.db",
-    'VNMidCap': r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\stock_group_VNMidCap.db",
-    'VNSmallCap': r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\stock_group_VNSmallCap.db"
+    'VN30': os.path.join(LIST_DIR, "stock_group_VN30.db"),
+    'VN100': os.path.join(LIST_DIR, "stock_group_VN100.db"),
+    'VNAllShare': os.path.join(LIST_DIR, "stock_group_VNAllShare.db"),
+    'VNMidCap': os.path.join(LIST_DIR, "stock_group_VNMidCap.db"),
+    'VNSmallCap': os.path.join(LIST_DIR, "stock_group_VNSmallCap.db")
 }
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-HOSE_DATA_DB_PATH = os.path.join(SCRIPT_DIR, "stock_data_HOSE.db")
-TXT_PATH = os.path.join(SCRIPT_DIR, "db_description.txt")
-LOG_PATH = os.path.join(SCRIPT_DIR, "data_issues.log")
+DATA_DIR = config.get_path('paths', 'data_dir', SCRIPT_DIR)
+HOSE_DATA_DB_PATH = os.path.join(DATA_DIR, "stock_data_HOSE.db")
+# Kho dữ liệu dạng dài (một bảng ohlcv cho mọi mã), tạo bằng: python ohlcv_store.py
+OHLCV_DB_PATH = os.path.join(DATA_DIR, "ohlcv_HOSE.db")
+TXT_PATH = os.path.join(DATA_DIR, "db_description.txt")
+LOG_PATH = os.path.join(DATA_DIR, "data_issues.log")
+# Thư mục gốc của bộ biểu đồ xuất ra file (mỗi ngày một thư mục con)
+REPORT_DIR = config.get_path('paths', 'report_dir', os.path.join(SCRIPT_DIR, "reports"))
+
+# Các danh sách VN30, VN100, ... được phân tích trực tiếp trên DB dữ liệu HOSE theo bảng thành viên.
+# Đặt True nếu vẫn cần các file stock_data_<nhóm>.db (hoặc ohlcv_<nhóm>.db) độc lập.
+EXPORT_GROUP_DBS = config.get_bool('eod', 'export_group_dbs', False)
+
+# Số tiến trình tính toán/vẽ biểu đồ (None: theo số CPU); số yêu cầu tải song song theo [concurrency] in_flight
+PROCESS_WORKERS = config.get_int('concurrency', 'process_workers', None)
 
 PERIODS = [5, 10, 20, 50, 100, 200]
 
+# Số ngày lịch sử tải khi một mã chưa có dữ liệu và số phiên giữ lại cho mỗi mã
+HISTORY_DAYS = 1200
+RETENTION_SESSIONS = 1000
+
+# Sai số tương đối khi so sánh giá đóng cửa với MA tính bằng tổng lũy kế. Các điểm
+# có giá gần bằng MA trong phạm vi này được tính lại bằng rolling().mean() của pandas
+# để kết quả trùng khớp hoàn toàn với cách tính từng ngày trước đây.
+MA_EPSILON = 1e-9
+
 # ### Các hàm hỗ trợ
 def is_file_older_than(db_path, days=30):
     if not os.path.exists(db_path):
@@ -36,15 +69,18 @@ def is_file_older_than(db_path, days=30):
     current_time = datetime.datetime.now()
     return (current_time - file_mod_time).days > days
 
-def check_and_update_stock_lists():
+# interactive=False: chỉ báo các file cũ, không hỏi (cập nhật danh sách bằng lệnh cli.py update-lists)
+def check_and_update_stock_lists(interactive=True):
     db_paths = [HOSE_DB_PATH] + list(GROUP_DB_PATHS.values())
     for db_path in db_paths:
         if is_file_older_than(db_path, days=30):
             print(f"File {db_path} đã cũ hơn 30 ngày.")
+            if not interactive:
+                continue
             user_input = input("Bạn có muốn tải lại danh sách cổ phiếu không? (Y/N): ").strip().upper()
             if user_input == 'Y':
                 print("Đang khởi động script để cập nhật danh sách...")
-                subprocess.run(["python", r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\khoitaodanhsach.py"])
+                subprocess.run(["python", LIST_SCRIPT_PATH])
                 print(f"Đã cập nhật danh sách từ {db_path}")
             else:
                 print(f"Bỏ qua cập nhật cho {db_path}")
@@ -61,16 +97,21 @@ def get_stocks_from_db(db_path):
     conn.close()
     return df['symbol'].tolist()
 
-def fetch_stock_data_with_retry(symbol, max_retries=5, delay=5):
+def fetch_stock_history(symbol, start_date=None):
+    # Một lần gọi API (không retry). start_date=None: tải toàn bộ HISTORY_DAYS ngày;
+    # ngược lại chỉ tải từ start_date (cập nhật nối tiếp)
+    if start_date is None:
+        start_date = (datetime.datetime.now() - datetime.timedelta(days=HISTORY_DAYS)).strftime('%Y-%m-%d')
+    df = data_source.get_source().history(symbol, start=start_date, interval='1D', source='VCI')
+    return df.tail(RETENTION_SESSIONS)
+
+def fetch_stock_data_with_retry(symbol, max_retries=5, delay=5, start_date=None):
     for attempt in range(1, max_retries + 1):
         try:
-            stock = Vnstock().stock(symbol=symbol, source='VCI')
-            start_date = (datetime.datetime.now() - datetime.timedelta(days=1200)).strftime('%Y-%m-%d')
-            df = stock.quote.history(start=start_date, interval='1D')
+            df = fetch_stock_history(symbol, start_date=start_date)
             if df.empty:
                 print(f"Không có dữ liệu cho {symbol} trong khoảng thời gian đã cho.")
                 return pd.DataFrame(), False
-            df = df.tail(1000)
             return df, True
         except Exception as e:
             print(f"Lỗi khi tải dữ liệu cho {symbol} (lần thử {attempt}/{max_retries}): {str(e)}")
@@ -80,93 +121,248 @@ def fetch_stock_data_with_retry(symbol, max_retries=5, delay=5):
                 print(f"Không thể tải dữ liệu cho {symbol} sau {max_retries} lần thử.")
                 return pd.DataFrame(), False
 
-def save_to_db(df, db_path, table_name):
-    if not df.empty:
-        conn = sqlite3.connect(db_path)
-        df.to_sql(table_name, conn, if_exists='replace', index=False)
-        conn.close()
+def upsert_table(conn, table_name, df, retention=RETENTION_SESSIONS):
+    # Ghi nối các phiên mới vào bảng của một mã (không commit): thay các phiên trùng,
+    # thêm phiên mới và chỉ giữ lại retention phiên gần nhất
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone()
+    if not exists:
+        write_table(conn, table_name, df)
+        return
+    first_time = pd.to_datetime(df['time']).min().strftime('%Y-%m-%d %H:%M:%S')
+    columns = ', '.join(df.columns)
+    placeholders = ', '.join(['?'] * len(df.columns))
+    conn.execute(f"DELETE FROM {table_name} WHERE time >= ?", (first_time,))
+    conn.executemany(f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})", dataframe_rows(df))
+    conn.execute(f"DELETE FROM {table_name} WHERE time < "
+                 f"(SELECT time FROM {table_name} ORDER BY time DESC LIMIT 1 OFFSET ?)", (retention - 1,))
 
-def is_data_up_to_date(db_path, table_name):
+def upsert_to_db(df, db_path, table_name, retention=RETENTION_SESSIONS):
+    if df.empty:
+        return
     conn = sqlite3.connect(db_path)
-    query = f"SELECT MAX(time) FROM {table_name}"
-    try:
-        latest_date = pd.read_sql_query(query, conn).iloc[0, 0]
-        if latest_date:
-            latest_date = datetime.datetime.strptime(latest_date, '%Y-%m-%d %H:%M:%S')
-            if (datetime.datetime.now() - latest_date).days < 1:
-                conn.close()
-                return True
-    except Exception as e:
-        print(f"Lỗi khi kiểm tra ngày cập nhật cho {table_name}: {e}")
+    with conn:
+        upsert_table(conn, table_name, df, retention)
+        ohlcv_store.update_freshness(conn, table_name, table=table_name)
     conn.close()
-    return False
-
-def fetch_batch_data(batch, failed_symbols):
-    data = {}
-    for symbol in tqdm(batch, desc="Tải batch", leave=False):
-        df, success = fetch_stock_data_with_retry(symbol)
-        if success:
-            data[symbol] = df
+
+def write_symbol_data(conn, symbol, df, use_ohlcv_store, incremental=True):
+    # Công việc ghi dữ liệu một mã, chạy trong luồng ghi của SQLiteWriter; chỉ mục độ mới được
+    # cập nhật trong cùng giao dịch
+    if use_ohlcv_store:
+        if incremental:
+            ohlcv_store.upsert_bars(conn, symbol, df, retention=RETENTION_SESSIONS)
+        else:
+            ohlcv_store.write_bars(conn, symbol, df, replace=True)
+            ohlcv_store.update_freshness(conn, symbol)
+        return
+    if incremental:
+        upsert_table(conn, symbol, df)
+    else:
+        write_table(conn, symbol, df)
+    ohlcv_store.update_freshness(conn, symbol, table=symbol)
+
+def get_freshness(db_path, symbols):
+    # Đọc chỉ mục độ mới một lần cho cả danh sách: (các mã cần tải lại, {symbol: datetime phiên gần nhất})
+    if not os.path.exists(db_path):
+        return list(symbols), {}
+    conn = sqlite3.connect(db_path)
+    try:
+        ohlcv_store.ensure_freshness(conn)
+        stale_symbols = ohlcv_store.stale_symbols(conn, symbols)
+        last_times = ohlcv_store.freshness_times(conn, symbols)
+    finally:
+        conn.close()
+    return stale_symbols, {symbol: t.to_pydatetime() for symbol, t in last_times.items()}
+
+# Tác vụ của các mã HOSE trong nhật ký công việc (job_journal.py)
+EOD_TASK = 'eod_HOSE'
+
+def select_journal_symbols(journal, stale_symbols, mode):
+    # Các mã cần tải theo nhật ký công việc; mã của lần chạy dở nay đã mới (dữ liệu đã commit
+    # ngay trước khi bị gián đoạn) được đánh dấu xong mà không tải lại
+    stale = set(stale_symbols)
+    symbols = []
+    for symbol, report in journal.start(EOD_TASK, [(symbol, 'history') for symbol in stale_symbols], mode):
+        if symbol in stale:
+            symbols.append(symbol)
         else:
-            failed_symbols.append(symbol)
-    return data
+            journal.record(EOD_TASK, (symbol, report))
+    return symbols
 
-def load_hose_data():
+def load_hose_data(incremental=True, mode='resume'):
+    # incremental=True: mỗi mã chỉ tải các phiên kể từ phiên đã lưu gần nhất rồi ghi nối;
+    # incremental=False: tải lại toàn bộ HISTORY_DAYS ngày và ghi đè
+    # mode: resume (làm tiếp lần chạy bị gián đoạn), restart hoặc retry_failed (chỉ các mã lỗi lần trước),
+    # xem job_journal.py. Mỗi mã chỉ được ghi nhận là xong sau khi dữ liệu của nó đã commit.
+    # Mỗi mã là một coroutine của AsyncFetchScheduler; tốc độ chỉ bị giới hạn bởi hạn mức của nguồn VCI.
+    # Dữ liệu tải về được đẩy cho một luồng ghi duy nhất (SQLiteWriter) commit theo lô.
     hose_stocks = get_stocks_from_db(HOSE_DB_PATH)
     if not hose_stocks:
         print("Không có cổ phiếu nào để tải dữ liệu.")
         return
-    batch_size = 40
-    batches = [hose_stocks[i:i + batch_size] for i in range(0, len(hose_stocks), batch_size)]
     failed_symbols = []
+    use_ohlcv_store = ohlcv_store.has_store(OHLCV_DB_PATH)
+    db_path = OHLCV_DB_PATH if use_ohlcv_store else HOSE_DATA_DB_PATH
+    stale_symbols, last_times = get_freshness(db_path, hose_stocks)
+    journal = JobJournal()
+    try:
+        stale_symbols = select_journal_symbols(journal, stale_symbols, mode)
+        if not stale_symbols:
+            journal.finish(EOD_TASK)
+            print(f"Dữ liệu của {len(hose_stocks)} cổ phiếu đã mới, không cần tải lại.")
+            if columnar_cache.available():
+                columnar_cache.refresh(db_path)
+            return
+        print(f"Cần cập nhật {len(stale_symbols)}/{len(hose_stocks)} cổ phiếu.")
 
-    with ThreadPoolExecutor(max_workers=12) as executor:
-        for batch in batches:
-            need_update = False
-            for symbol in batch:
-                if not os.path.exists(HOSE_DATA_DB_PATH) or not is_data_up_to_date(HOSE_DATA_DB_PATH, symbol):
-                    need_update = True
-                    break
-            
-            if need_update:
-                future = executor.submit(fetch_batch_data, batch, failed_symbols)
-                batch_data = future.result()
-                for symbol, df in batch_data.items():
-                    save_to_db(df, HOSE_DATA_DB_PATH, symbol)
-                print(f"Đã tải và lưu batch chứa {len(batch)} cổ phiếu.")
-                time.sleep(65)
-            else:
-                print(f"Dữ liệu batch chứa {len(batch)} cổ phiếu đã mới, không cần tải lại.")
+        start_dates = {}
+        if incremental:
+            # Tải lại cả phiên gần nhất đã lưu để thay thế nếu phiên đó được lưu khi chưa đóng cửa
+            start_dates = {symbol: last_times[symbol].strftime('%Y-%m-%d')
+                           for symbol in stale_symbols if symbol in last_times}
+
+        def record(symbol):
+            return lambda error: journal.record(EOD_TASK, (symbol, 'history'), error)
+
+        scheduler = AsyncFetchScheduler()
+        with SQLiteWriter() as writer:
+            calls = ((symbol, 'VCI', fetch_stock_history, (symbol, start_dates.get(symbol)), {})
+                     for symbol in stale_symbols)
+            for symbol, df, error in tqdm(scheduler.run(calls), total=len(stale_symbols), desc="Tải dữ liệu HOSE"):
+                if error is not None:
+                    print(f"Không thể tải dữ liệu cho {symbol}: {error}")
+                    failed_symbols.append(symbol)
+                    journal.record(EOD_TASK, (symbol, 'history'), error)
+                elif df.empty:
+                    print(f"Không có dữ liệu cho {symbol} trong khoảng thời gian đã cho.")
+                    failed_symbols.append(symbol)
+                    journal.record(EOD_TASK, (symbol, 'history'), "Không có dữ liệu")
+                else:
+                    writer.submit(db_path, write_symbol_data, symbol, df, use_ohlcv_store, incremental,
+                                  callback=record(symbol))
+        failed_symbols.extend(symbol for _, symbol, _ in writer.errors)
+        journal.finish(EOD_TASK)
+    finally:
+        journal.close()
+
+    if columnar_cache.available():
+        print(f"Đã cập nhật bộ đệm dạng cột cho {columnar_cache.refresh(db_path)} mã.")
 
     if failed_symbols:
-        print("Các mã cổ phiếu không tải được dữ liệu sau khi retry:")
+        print("Các mã cổ phiếu không tải được dữ liệu sau khi retry (chạy lại riêng các mã này: python cli.py update-eod --retry-failed):")
         for symbol in failed_symbols:
             print(f"- {symbol}")
     else:
         print("Tất cả mã cổ phiếu đã được tải thành công.")
 
+def sync_group_members(db_path=None):
+    # Ghi thành viên của các danh sách vào DB dữ liệu HOSE (ánh xạ symbol -> nhóm, không sao chép dữ liệu)
+    db_path = db_path or get_data_db_path()
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for group_name, group_db_path in GROUP_DB_PATHS.items():
+            group_stocks = get_stocks_from_db(group_db_path)
+            if group_stocks:
+                ohlcv_store.write_group_members(conn, group_name, group_stocks)
+                print(f"Đã cập nhật {len(group_stocks)} mã thành viên cho {group_name}")
+    conn.close()
+
+def get_group_export_path(group_name):
+    prefix = "ohlcv" if ohlcv_store.has_store(OHLCV_DB_PATH) else "stock_data"
+    return os.path.join(DATA_DIR, f"{prefix}_{group_name}.db")
+
 def extract_data_for_groups():
-    for group_name, group_db_path in GROUP_DB_PATHS.items():
-        group_stocks = get_stocks_from_db(group_db_path)
-        group_data_db_path = os.path.join(SCRIPT_DIR, f"stock_data_{group_name}.db")
-        
-        conn = sqlite3.connect(HOSE_DATA_DB_PATH)
-        for symbol in group_stocks:
-            try:
-                query = f"SELECT * FROM {symbol}"
-                df = pd.read_sql_query(query, conn)
-                save_to_db(df, group_data_db_path, symbol)
-            except:
-                print(f"Không tìm thấy dữ liệu cho {symbol} trong HOSE DB.")
+    # Chế độ xuất tùy chọn (EXPORT_GROUP_DBS): tạo file dữ liệu độc lập cho từng danh sách
+    db_path = get_data_db_path()
+    for group_name in GROUP_DB_PATHS:
+        group_stocks = get_stock_list(group_name)
+        group_data_db_path = get_group_export_path(group_name)
+        ohlcv_store.export_symbols(db_path, group_data_db_path, group_stocks)
+        print(f"Đã xuất dữ liệu cho {group_name} vào {group_data_db_path}")
+
+def materialize_indicators(db_path=None):
+    # Tính MA/ROC/khối lượng trung bình cho các mã vừa được tải và ghi vào bảng chỉ báo.
+    # Mã có checkpoint RollingState chỉ đọc các phiên từ phiên cuối đã tính (phiên đó có thể đã được tải lại)
+    # và đưa từng phiên vào trạng thái với chi phí O(1); mã chưa có checkpoint thì tính trên toàn bộ lịch sử.
+    db_path = db_path or get_data_db_path()
+    if not os.path.exists(db_path):
+        return 0
+    conn = sqlite3.connect(db_path)
+    ohlcv_store.ensure_freshness(conn)
+    pending = indicator_store.pending_symbols(conn)
+    if not pending:
+        conn.close()
+        return 0
+    states = indicator_store.read_states(conn, [symbol for symbol, last_time in pending.items() if last_time is not None])
+    incremental = {}
+    for symbol, state in states.items():
+        if state.last_time == pending[symbol]:
+            incremental.setdefault(state.last_time, []).append(symbol)
+
+    new_bars = {}
+    for last_time, symbols in incremental.items():
+        frames = load_symbol_frames(symbols, db_path, columns=('close', 'volume'),
+                                    since=ohlcv_store.from_epoch([last_time])[0])
+        for symbol, df in frames.items():
+            # Phiên cuối đã tính phải còn trong DB thì mới tiếp tục được từ checkpoint
+            if not df.empty and ohlcv_store.to_epoch(df['time'][:1])[0] == last_time:
+                new_bars[symbol] = df
+    full = [symbol for symbol in pending if symbol not in new_bars]
+    full_frames = load_symbol_frames(full, db_path, columns=('close', 'volume'))
+
+    written = 0
+    with conn:
+        for symbol, df in tqdm(new_bars.items(), desc="Cập nhật chỉ báo"):
+            state = states[symbol]
+            since = state.last_time
+            indicators = indicator_store.advance_state(state, df)
+            written += indicator_store.write_indicators(conn, symbol, indicators, since=since,
+                                                        retention=RETENTION_SESSIONS, state=state)
+        for symbol, df in tqdm(full_frames.items(), desc="Tính chỉ báo"):
+            if df.empty:
+                continue
+            indicators = indicator_store.compute_indicators(df)
+            written += indicator_store.write_indicators(conn, symbol, indicators, retention=RETENTION_SESSIONS,
+                                                        state=indicator_store.new_state(df))
+    conn.close()
+    print(f"Đã cập nhật {written} dòng chỉ báo cho {len(new_bars) + len(full_frames)} mã.")
+    return written
+
+def load_latest_indicators(stock_list, db_path):
+    # Chỉ báo phiên gần nhất của danh sách mã từ bảng chỉ báo, hoặc None nếu bảng chưa cập nhật
+    # (khi đó các hàm tính toán bên dưới tự tính lại từ dữ liệu giá)
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        return indicator_store.latest_indicators(conn, stock_list)
+    except sqlite3.Error as e:
+        print(f"Không đọc được bảng chỉ báo: {e}")
+        return None
+    finally:
         conn.close()
-        print(f"Đã tái phân bổ dữ liệu cho {group_name} vào {group_data_db_path}")
+
+# ### Thống kê từ bảng chỉ báo phiên gần nhất (DataFrame theo symbol: close, ma<p>, roc<p>, avgvol<p>)
+def ma_counts_from_latest(latest, periods=PERIODS):
+    counts = {period: int((latest['close'] > latest[f'ma{period}']).sum()) for period in periods}
+    return counts, len(latest)
+
+def roc_from_latest(latest, periods=PERIODS):
+    return {period: latest[f'roc{period}'].dropna().tolist() for period in periods}
+
+def avg_volumes_from_latest(latest, periods=[5, 10, 20, 50, 100]):
+    # Chỉ các mã có đủ max(periods) phiên (chỉ báo của chu kỳ dài nhất không rỗng)
+    latest = latest[latest[f'avgvol{max(periods)}'].notna()]
+    return {period: latest[f'avgvol{period}'].to_dict() for period in periods}
 
 def describe_db(db_path, txt_path, append=False):
     mode = 'a' if append else 'w'
+    if ohlcv_store.has_store(db_path):
+        describe_ohlcv_store(db_path, txt_path, append=append)
+        return
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
+    tables = [(name,) for name in ohlcv_store.symbol_tables(conn)]
     
     with open(txt_path, mode, encoding='utf-8') as f:
         f.write(f"\n**Mô tả**: Chứa dữ liệu giao dịch 1000 phiên gần nhất của cổ phiếu.\n")
@@ -190,122 +386,326 @@ def describe_db(db_path, txt_path, append=False):
         f.write("\n")
     conn.close()
 
+def describe_ohlcv_store(db_path, txt_path, append=False):
+    mode = 'a' if append else 'w'
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(ohlcv);")
+    columns = cursor.fetchall()
+    cursor.execute("SELECT COUNT(DISTINCT symbol), MAX(time) FROM ohlcv")
+    num_symbols, latest_time = cursor.fetchone()
+    conn.close()
+    with open(txt_path, mode, encoding='utf-8') as f:
+        f.write(f"\n**Mô tả**: Chứa dữ liệu giao dịch 1000 phiên gần nhất của {num_symbols} cổ phiếu trong một bảng.\n")
+        f.write(f"- **File**: {os.path.basename(db_path)}\n")
+        f.write("- **Bảng**: `ohlcv`, khóa chính (symbol, time); time là epoch giây (INTEGER)\n")
+        f.write("- **Cấu trúc bảng**:\n")
+        for col in columns:
+            f.write(f"  - Cột {col[0]}: `{col[1]}` ({col[2]}) - {col[1]}\n")
+        if latest_time is not None:
+            f.write(f"- **Ngày cập nhật mới nhất**: {ohlcv_store.from_epoch([latest_time])[0]}\n")
+        else:
+            f.write("- **Ngày cập nhật mới nhất**: Không xác định\n")
+        f.write("\n")
+
 def is_valid_stock_symbol(symbol):
     return len(symbol) == 3 and symbol.isalnum()
 
 def check_data_availability(db_path, stock_list, required_days, min_period=200):
-    conn = sqlite3.connect(db_path)
     earliest_date = datetime.datetime.now()
     min_sessions = min_period
-    for symbol in stock_list:
-        try:
-            df = pd.read_sql_query(f"SELECT time FROM {symbol}", conn)
-            if len(df) < min_sessions:
-                continue
-            min_date = pd.to_datetime(df['time'].min())
-            if min_date and min_date < earliest_date:
-                earliest_date = min_date
-        except:
+    for symbol, df in load_symbol_frames(stock_list, db_path, columns=()).items():
+        if len(df) < min_sessions:
             continue
-    conn.close()
+        min_date = df['time'].min()
+        if min_date and min_date < earliest_date:
+            earliest_date = min_date
     days_available = (datetime.datetime.now() - earliest_date).days
     return days_available >= required_days
 
 def get_stock_list(selected_list):
     if selected_list == 'HOSE':
         return get_stocks_from_db(HOSE_DB_PATH)
-    else:
-        return get_stocks_from_db(GROUP_DB_PATHS[selected_list])
+    # Ưu tiên bảng thành viên trong DB dữ liệu; chưa có thì đọc file danh sách của nhóm
+    db_path = get_data_db_path()
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        members = ohlcv_store.read_group_members(conn, selected_list)
+        conn.close()
+        if members:
+            return members
+    return get_stocks_from_db(GROUP_DB_PATHS[selected_list])
+
+def get_data_db_path():
+    # DB dữ liệu HOSE chứa mọi mã nên dùng chung cho mọi danh sách (lọc theo danh sách mã)
+    if ohlcv_store.has_store(OHLCV_DB_PATH):
+        return OHLCV_DB_PATH
+    return HOSE_DATA_DB_PATH
+
+def load_symbol_frames(stock_list, db_path, columns=('close',), since=None, last_n=None):
+    # Đọc dữ liệu của nhiều mã: {symbol: DataFrame(time, columns...)} tăng dần theo time.
+    # Các mã có trong bộ đệm dạng cột (nếu có pyarrow) được memory-map từ file Arrow; các mã còn lại
+    # đọc từ DB: kho ohlcv chỉ cần một truy vấn cho cả danh sách, cấu trúc cũ đọc từng bảng.
+    columns = list(columns)
+    frames, stock_list = columnar_cache.load_frames(db_path, stock_list, columns, since=since, last_n=last_n)
+    if not stock_list:
+        return frames
+    if ohlcv_store.has_store(db_path):
+        conn = sqlite3.connect(db_path)
+        panel = ohlcv_store.read_panel(conn, stock_list, columns, since=since, last_n=last_n)
+        conn.close()
+        for symbol, df in panel.groupby('symbol', sort=False):
+            frames[symbol] = df.drop(columns='symbol').reset_index(drop=True)
+        return frames
+
+    conn = sqlite3.connect(db_path)
+    for symbol in stock_list:
+        try:
+            query = f"SELECT {', '.join(['time'] + columns)} FROM {symbol}"
+            if since:
+                query += f" WHERE time >= '{since}'"
+            if last_n is None:
+                df = pd.read_sql_query(query + " ORDER BY time ASC", conn)
+            else:
+                df = pd.read_sql_query(query + f" ORDER BY time DESC LIMIT {int(last_n)}", conn).iloc[::-1]
+            df['time'] = pd.to_datetime(df['time'])
+            frames[symbol] = df.reset_index(drop=True)
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu cho {symbol}: {e}")
+    conn.close()
+    return frames
+
+def get_latest_time(db_path, symbol):
+    # Thời điểm của phiên gần nhất của một mã (datetime) hoặc None
+    conn = sqlite3.connect(db_path)
+    try:
+        if ohlcv_store.has_store(db_path):
+            latest_time = ohlcv_store.latest_time(conn, symbol)
+            return latest_time.to_pydatetime() if latest_time is not None else None
+        latest_time = conn.execute(f"SELECT MAX(time) FROM {symbol}").fetchone()[0]
+        return datetime.datetime.strptime(latest_time, '%Y-%m-%d %H:%M:%S') if latest_time else None
+    except Exception:
+        return None
+    finally:
+        conn.close()
 
 # ### Các hàm tính toán và vẽ biểu đồ
 def calculate_ma_statistics(stock_list, db_path):
     counts = {period: 0 for period in PERIODS}
     total_stocks = 0
-    conn = sqlite3.connect(db_path)
+    valid_symbols = []
     for symbol in stock_list:
-        if not is_valid_stock_symbol(symbol):
+        if is_valid_stock_symbol(symbol):
+            valid_symbols.append(symbol)
+        else:
             print(f"Bỏ qua mã không hợp lệ: {symbol}")
+    latest = load_latest_indicators(valid_symbols, db_path)
+    if latest is not None and all(f'ma{period}' in latest for period in PERIODS):
+        return ma_counts_from_latest(latest)
+    frames = load_symbol_frames(valid_symbols, db_path)
+    for symbol, df in frames.items():
+        if df.empty:
             continue
-        try:
-            df = pd.read_sql_query(f"SELECT * FROM {symbol}", conn)
-            if df.empty:
-                continue
-            total_stocks += 1
-            df['time'] = pd.to_datetime(df['time'])
-            df = df.sort_values('time')
-            latest_close = df['close'].iloc[-1]
-            for period in PERIODS:
-                if len(df) >= period:
-                    ma = df['close'].rolling(window=period).mean().iloc[-1]
-                    if latest_close > ma:
-                        counts[period] += 1
-        except Exception as e:
-            print(f"Lỗi khi xử lý dữ liệu cho {symbol}: {e}")
-    conn.close()
+        total_stocks += 1
+        latest_close = df['close'].iloc[-1]
+        for period in PERIODS:
+            if len(df) >= period:
+                ma = df['close'].rolling(window=period).mean().iloc[-1]
+                if latest_close > ma:
+                    counts[period] += 1
     return counts, total_stocks
 
-def calculate_ma_ratio_over_time(stock_list, db_path, num_days_display=100, num_days_data=400):
-    conn = sqlite3.connect(db_path)
-    
-    latest_date_query = f"SELECT MAX(time) FROM {stock_list[0]}"
-    latest_date_str = pd.read_sql_query(latest_date_query, conn).iloc[0, 0]
-    latest_date = datetime.datetime.strptime(latest_date_str, '%Y-%m-%d %H:%M:%S')
-    
+def to_day_numbers(times):
+    # Chuyển cột time sang số ngày kể từ 1970-01-01 (int64) để so sánh nhanh bằng NumPy
+    return pd.to_datetime(times).values.astype('datetime64[D]').astype(np.int64)
+
+def load_close_series(stock_list, db_path, since=None):
+    # Đọc chuỗi giá đóng cửa của mỗi mã đúng một lần: {symbol: (days, closes)}
+    series = {}
+    frames = load_symbol_frames([s for s in stock_list if is_valid_stock_symbol(s)], db_path, since=since)
+    for symbol, df in frames.items():
+        if df.empty:
+            continue
+        series[symbol] = (to_day_numbers(df['time']), df['close'].to_numpy(dtype=np.float64))
+    return series
+
+# Tính ma trận cờ (ngày × mã) cho độ rộng thị trường theo MA trong một lượt.
+# Với mỗi ngày hiển thị D, cửa sổ dữ liệu của một mã gồm các phiên có ngày trong
+# [D - window_days, D) - time được lưu dạng 'YYYY-MM-DD HH:MM:SS' nên điều kiện
+# time <= 'YYYY-MM-DD' trước đây không bao gồm chính ngày D.
+# Trả về (symbols, valid, above): valid có dạng (ngày, mã), above có dạng (ngày, chu kỳ, mã).
+def compute_ma_breadth(series, display_days, window_days, periods=PERIODS):
+    symbols = list(series.keys())
+    valid = np.zeros((len(display_days), len(symbols)), dtype=bool)
+    above = np.zeros((len(display_days), len(periods), len(symbols)), dtype=bool)
+    for k, symbol in enumerate(symbols):
+        days, closes = series[symbol]
+        hi = np.searchsorted(days, display_days, side='left')
+        lo = np.searchsorted(days, display_days - window_days, side='left')
+        n = hi - lo
+        valid[:, k] = n >= 5
+
+        # Tổng lũy kế giá đóng cửa và số giá trị thiếu để lấy trung bình trượt trong O(1)
+        nan_mask = np.isnan(closes)
+        csum = np.concatenate(([0.0], np.cumsum(np.where(nan_mask, 0.0, closes))))
+        cnan = np.concatenate(([0], np.cumsum(nan_mask)))
+        last = np.maximum(hi - 1, 0)
+        latest_close = closes[last]
+
+        # Độ dài chuỗi giá không đổi kết thúc tại mỗi phiên: cửa sổ phẳng có MA đúng bằng giá
+        changed = np.concatenate(([True], closes[1:] != closes[:-1]))
+        positions = np.arange(len(closes))
+        flat_run = (positions - np.maximum.accumulate(np.where(changed, positions, 0)) + 1)[last]
+
+        for j, period in enumerate(periods):
+            start = np.maximum(hi - period, 0)
+            ma = (csum[hi] - csum[start]) / period
+            complete = valid[:, k] & (n >= period) & (cnan[hi] == cnan[start]) & (flat_run < period)
+            diff = latest_close - ma
+            tolerance = MA_EPSILON * np.abs(ma)
+            above[:, j, k] = complete & (diff > tolerance)
+            for d in np.flatnonzero(complete & (np.abs(diff) <= tolerance)):
+                window = pd.Series(closes[lo[d]:hi[d]])
+                above[d, j, k] = window.iloc[-1] > window.rolling(window=period).mean().iloc[-1]
+    return symbols, valid, above
+
+def get_display_dates(latest_date, num_days_display):
+    # Lấy num_days_display ngày làm việc (thứ 2 - thứ 6) gần nhất tính từ latest_date
     display_dates = []
     current_date = latest_date
     while len(display_dates) < num_days_display:
         if current_date.weekday() < 5:
             display_dates.append(current_date.strftime('%Y-%m-%d'))
         current_date -= datetime.timedelta(days=1)
-    display_dates = sorted(display_dates)
-    
-    ratio_data = {period: [] for period in PERIODS}
-    
-    for date in display_dates:
-        above_ma_count = {period: 0 for period in PERIODS}
-        total_stocks = 0
-        
-        start_date = (datetime.datetime.strptime(date, '%Y-%m-%d') - 
-                     datetime.timedelta(days=num_days_data - 1)).strftime('%Y-%m-%d')
-        
-        for symbol in stock_list:
-            if not is_valid_stock_symbol(symbol):
-                continue
-            try:
-                query = f"SELECT * FROM {symbol} WHERE time >= '{start_date}' AND time <= '{date}' ORDER BY time ASC"
-                df = pd.read_sql_query(query, conn)
-                
-                if len(df) < 5:
-                    continue
-                
-                total_stocks += 1
-                df['time'] = pd.to_datetime(df['time'])
-                df = df.sort_values('time')
-                latest_close = df['close'].iloc[-1]
-                
-                for period in PERIODS:
-                    if len(df) >= period:
-                        ma = df['close'].rolling(window=period).mean().iloc[-1]
-                        if latest_close > ma:
-                            above_ma_count[period] += 1
-            except Exception as e:
-                print(f"Lỗi xử lý {symbol} ngày {date}: {e}")
-                continue
-        
-        if total_stocks == 0:
-            print(f"Không có mã hợp lệ cho ngày {date}")
-            for period in PERIODS:
-                ratio_data[period].append(float('nan'))
-        else:
-            for period in PERIODS:
-                ratio = (above_ma_count[period] / total_stocks) * 100
-                ratio_data[period].append(ratio)
-            print(f"Ngày {date}: Đã xử lý {total_stocks} mã")
-    
-    conn.close()
-    df_ratio = pd.DataFrame(ratio_data, index=display_dates)
+    return sorted(display_dates)
+
+def calculate_ma_ratio_over_time(stock_list, db_path, num_days_display=100, num_days_data=400):
+    latest_date = get_latest_time(db_path, stock_list[0])
+
+    display_dates = get_display_dates(latest_date, num_days_display)
+    display_days = np.array(display_dates, dtype='datetime64[D]').astype(np.int64)
+    window_days = num_days_data - 1
+    since = (datetime.datetime.strptime(display_dates[0], '%Y-%m-%d') -
+             datetime.timedelta(days=window_days)).strftime('%Y-%m-%d')
+
+    # Nạp dữ liệu một lần rồi tính toàn bộ chuỗi tỷ lệ trong một lượt vector hóa
+    series = load_close_series(stock_list, db_path, since=since)
+    _, valid, above = compute_ma_breadth(series, display_days, window_days)
+
+    total_stocks = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratios = above.sum(axis=2) / total_stocks[:, None] * 100
+    ratios[total_stocks == 0] = np.nan
+    for date in np.array(display_dates)[total_stocks == 0]:
+        print(f"Không có mã hợp lệ cho ngày {date}")
+    print(f"Đã tính tỷ lệ MA cho {len(display_dates)} ngày từ {len(series)} mã")
+
+    df_ratio = pd.DataFrame(ratios, index=display_dates, columns=PERIODS)
     return df_ratio
 
+# ### Chế độ phân tích mọi danh sách trong một lần nạp dữ liệu
+ALL_LISTS = ['HOSE'] + list(GROUP_DB_PATHS.keys())
+
+def _latest_features_chunk(frames):
+    # Chỉ báo phiên gần nhất của một nhóm mã (chạy trong tiến trình con)
+    rows = {symbol: indicator_store.compute_indicators(df).iloc[-1] for symbol, df in frames.items() if not df.empty}
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+def _breadth_chunk(args):
+    series, display_days, window_days = args
+    return compute_ma_breadth(series, display_days, window_days)
+
+def _chunks(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def compute_latest_features(stock_list, db_path, executor, chunk_size=50):
+    # Chỉ báo phiên gần nhất của mọi mã: đọc từ bảng chỉ báo nếu đã cập nhật, nếu không thì tính song song
+    latest = load_latest_indicators(stock_list, db_path)
+    if latest is not None:
+        return latest
+    frames = load_symbol_frames(stock_list, db_path, columns=('close', 'volume'))
+    parts = executor.map(_latest_features_chunk,
+                         [{symbol: frames[symbol] for symbol in chunk} for chunk in _chunks(frames, chunk_size)])
+    parts = [part for part in parts if not part.empty]
+    return pd.concat(parts) if parts else pd.DataFrame()
+
+def compute_ma_breadth_parallel(series, display_days, window_days, executor, chunk_size=50):
+    # compute_ma_breadth trên từng nhóm mã trong tiến trình con rồi ghép lại theo trục mã
+    chunks = _chunks(series, chunk_size)
+    if not chunks:
+        return [], np.zeros((len(display_days), 0), dtype=bool), np.zeros((len(display_days), len(PERIODS), 0), dtype=bool)
+    results = list(executor.map(_breadth_chunk, [({symbol: series[symbol] for symbol in chunk}, display_days, window_days)
+                                                 for chunk in chunks]))
+    symbols = [symbol for chunk_symbols, _, _ in results for symbol in chunk_symbols]
+    valid = np.concatenate([chunk_valid for _, chunk_valid, _ in results], axis=1)
+    above = np.concatenate([chunk_above for _, _, chunk_above in results], axis=2)
+    return symbols, valid, above
+
+def analyze_all_groups(db_path=None, num_days_display=100, num_days_data=400, max_workers=None):
+    # Nạp dữ liệu HOSE một lần, tính đặc trưng của từng mã một lần (song song theo nhóm mã) rồi tổng hợp
+    # cho từng danh sách bằng mặt nạ thành viên. Trả về {danh sách: {counts, total_stocks, df_ratio, roc_data, avg_volumes}}
+    db_path = db_path or get_data_db_path()
+    stock_lists = {name: get_stock_list(name) for name in ALL_LISTS}
+    stock_lists = {name: stocks for name, stocks in stock_lists.items() if stocks}
+    members = {name: [s for s in stocks if is_valid_stock_symbol(s)] for name, stocks in stock_lists.items()}
+    universe = sorted(set().union(*members.values())) if members else []
+    if not universe:
+        print("Không có cổ phiếu nào để phân tích.")
+        return {}
+
+    # Ngày hiển thị của mỗi danh sách tính từ phiên gần nhất của mã đầu tiên (giống calculate_ma_ratio_over_time)
+    window_days = num_days_data - 1
+    display_dates = {}
+    for name, stocks in stock_lists.items():
+        latest_date = get_latest_time(db_path, stocks[0])
+        if latest_date is not None:
+            display_dates[name] = tuple(get_display_dates(latest_date, num_days_display))
+    since = None
+    if display_dates:
+        first_date = min(dates[0] for dates in display_dates.values())
+        since = (datetime.datetime.strptime(first_date, '%Y-%m-%d') -
+                 datetime.timedelta(days=window_days)).strftime('%Y-%m-%d')
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers or PROCESS_WORKERS) as executor:
+        latest = compute_latest_features(universe, db_path, executor)
+        series = load_close_series(universe, db_path, since=since)
+        breadth = {}
+        for dates in set(display_dates.values()):
+            display_days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+            breadth[dates] = compute_ma_breadth_parallel(series, display_days, window_days, executor)
+
+    for name, symbols in members.items():
+        group_latest = latest.loc[latest.index.intersection(symbols)] if not latest.empty else latest
+        counts, total_stocks = ma_counts_from_latest(group_latest) if not group_latest.empty else (
+            {period: 0 for period in PERIODS}, 0)
+        df_ratio = None
+        if name in display_dates:
+            breadth_symbols, valid, above = breadth[display_dates[name]]
+            mask = np.isin(breadth_symbols, symbols)
+            group_total = valid[:, mask].sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ratios = above[:, :, mask].sum(axis=2) / group_total[:, None] * 100
+            ratios[group_total == 0] = np.nan
+            df_ratio = pd.DataFrame(ratios, index=list(display_dates[name]), columns=PERIODS)
+        results[name] = {
+            'counts': counts,
+            'total_stocks': total_stocks,
+            'df_ratio': df_ratio,
+            'roc_data': roc_from_latest(group_latest) if not group_latest.empty else {period: [] for period in PERIODS},
+            'avg_volumes': avg_volumes_from_latest(group_latest) if not group_latest.empty else {},
+        }
+    print(f"Đã phân tích {len(results)} danh sách từ {len(universe)} mã trong một lần nạp dữ liệu.")
+    return results
+
+def print_ma_statistics(counts, total_stocks, selected_list):
+    print(f"\nThống kê cho danh sách {selected_list}:")
+    print(f"Số mã đã khảo sát: {total_stocks}")
+    for period in PERIODS:
+        percentage = (counts[period] / total_stocks) * 100 if total_stocks > 0 else 0
+        print(f"Số mã đóng cửa trên MA{period}: {counts[period]} ({percentage:.2f}%)")
+
 def plot_ma_combined(counts, total_stocks, df_ratio, selected_list):
     # Tạo subplot mà không có subplot_titles
     fig = make_subplots(
@@ -393,26 +793,20 @@ def plot_ma_combined(counts, total_stocks, df_ratio, selected_list):
     fig.update_xaxes(title_text="Ngày", row=3, col=1)
     fig.update_yaxes(title_text="Tỷ lệ (%)", range=[0, 100], row=3, col=1)
     
-    fig.show()
+    report_renderer.emit(fig, f"ma_combined_{selected_list}")
 
 def calculate_changes(stock_list, db_path):
     data = []
-    conn = sqlite3.connect(db_path)
-    for symbol in stock_list:
-        if not is_valid_stock_symbol(symbol):
+    frames = load_symbol_frames([s for s in stock_list if is_valid_stock_symbol(s)], db_path,
+                                columns=('close', 'volume'), last_n=2)
+    for symbol, df in frames.items():
+        if len(df) < 2:
             continue
-        try:
-            df = pd.read_sql_query(f"SELECT * FROM {symbol} ORDER BY time DESC LIMIT 2", conn)
-            if len(df) < 2:
-                continue
-            today = df.iloc[0]
-            yesterday = df.iloc[1]
-            price_change = 'up' if today['close'] > yesterday['close'] else 'down' if today['close'] < yesterday['close'] else 'same'
-            volume_change = 'up' if today['volume'] > yesterday['volume'] else 'down' if today['volume'] < yesterday['volume'] else 'same'
-            data.append({'symbol': symbol, 'volume': today['volume'], 'price_change': price_change, 'volume_change': volume_change})
-        except Exception as e:
-            print(f"Lỗi xử lý {symbol}: {e}")
-    conn.close()
+        today = df.iloc[-1]
+        yesterday = df.iloc[-2]
+        price_change = 'up' if today['close'] > yesterday['close'] else 'down' if today['close'] < yesterday['close'] else 'same'
+        volume_change = 'up' if today['volume'] > yesterday['volume'] else 'down' if today['volume'] < yesterday['volume'] else 'same'
+        data.append({'symbol': symbol, 'volume': today['volume'], 'price_change': price_change, 'volume_change': volume_change})
     return pd.DataFrame(data)
 
 def plot_additional_ma_charts(stock_list, db_path, selected_list):
@@ -463,24 +857,21 @@ def plot_additional_ma_charts(stock_list, db_path, selected_list):
         width=1200,
         title_text=f"Biểu đồ bổ sung MA cho danh sách {selected_list}"
     )
-    fig.show()
+    report_renderer.emit(fig, f"ma_additional_{selected_list}")
 
 def calculate_average_volumes(stock_list, db_path, periods=[5, 10, 20, 50, 100]):
-    conn = sqlite3.connect(db_path)
     avg_volumes = {period: {} for period in periods}
-    for symbol in stock_list:
-        if not is_valid_stock_symbol(symbol):
+    latest = load_latest_indicators([s for s in stock_list if is_valid_stock_symbol(s)], db_path)
+    if latest is not None and all(f'avgvol{period}' in latest for period in periods):
+        return avg_volumes_from_latest(latest, periods)
+    frames = load_symbol_frames([s for s in stock_list if is_valid_stock_symbol(s)], db_path,
+                                columns=('volume',), last_n=100)
+    for symbol, df in frames.items():
+        if len(df) < max(periods):
             continue
-        try:
-            df = pd.read_sql_query(f"SELECT volume FROM {symbol} ORDER BY time DESC LIMIT 100", conn)
-            if len(df) < max(periods):
-                continue
-            for period in periods:
-                avg_vol = df['volume'].iloc[:period].mean()
-                avg_volumes[period][symbol] = avg_vol
-        except Exception as e:
-            print(f"Lỗi xử lý {symbol}: {e}")
-    conn.close()
+        for period in periods:
+            avg_vol = df['volume'].iloc[-period:].mean()
+            avg_volumes[period][symbol] = avg_vol
     return avg_volumes
 
 def plot_average_volume_treemaps(avg_volumes, selected_list):
@@ -511,33 +902,32 @@ def plot_average_volume_treemaps(avg_volumes, selected_list):
         width=1200,
         title_text=f"Khối lượng trung bình cho danh sách {selected_list}"
     )
-    fig.show()
+    report_renderer.emit(fig, f"average_volume_{selected_list}")
 
 def calculate_roc_data(stock_list, db_path):
     roc_data = {period: [] for period in PERIODS}
-    conn = sqlite3.connect(db_path)
+    valid_symbols = []
     for symbol in stock_list:
-        if not is_valid_stock_symbol(symbol):
+        if is_valid_stock_symbol(symbol):
+            valid_symbols.append(symbol)
+        else:
             print(f"Bỏ qua mã không hợp lệ: {symbol}")
+    latest = load_latest_indicators(valid_symbols, db_path)
+    if latest is not None and all(f'roc{period}' in latest for period in PERIODS):
+        return roc_from_latest(latest)
+    frames = load_symbol_frames(valid_symbols, db_path)
+    for symbol, df in frames.items():
+        if df.empty:
             continue
-        try:
-            df = pd.read_sql_query(f"SELECT * FROM {symbol}", conn)
-            if df.empty:
-                continue
-            df['time'] = pd.to_datetime(df['time'])
-            df = df.sort_values('time')
-            latest_close = df['close'].iloc[-1]
-            for period in PERIODS:
-                if len(df) >= period + 1:
-                    past_close = df['close'].iloc[-period-1]
-                    roc = (latest_close - past_close) / past_close * 100
-                    roc_data[period].append(roc)
-        except Exception as e:
-            print(f"Lỗi khi xử lý dữ liệu cho {symbol}: {e}")
-    conn.close()
+        latest_close = df['close'].iloc[-1]
+        for period in PERIODS:
+            if len(df) >= period + 1:
+                past_close = df['close'].iloc[-period-1]
+                roc = (latest_close - past_close) / past_close * 100
+                roc_data[period].append(roc)
     return roc_data
 
-def plot_roc_density(roc_data):
+def plot_roc_density(roc_data, selected_list=''):
     fig = make_subplots(rows=len(PERIODS), cols=1, subplot_titles=[f'ROC{period}' for period in PERIODS])
     for i, period in enumerate(PERIODS):
         if roc_data[period]:
@@ -550,20 +940,55 @@ def plot_roc_density(roc_data):
         else:
             print(f"Không có dữ liệu cho ROC{period}")
     fig.update_layout(height=200*len(PERIODS), title_text="Biểu đồ mật độ ROC cho các chu kỳ")
-    fig.show()
+    report_renderer.emit(fig, f"roc_density_{selected_list}")
 
 # ### Thực thi chương trình
+def render_chart_pack(output_dir=None, max_workers=None):
+    # Ghi toàn bộ biểu đồ của mọi danh sách ra file HTML (không cần màn hình), các biểu đồ được vẽ song song
+    output_dir = output_dir or os.path.join(REPORT_DIR, datetime.date.today().strftime('%Y-%m-%d'))
+    db_path = get_data_db_path()
+    jobs = []
+    for selected_list, result in analyze_all_groups(db_path, max_workers=max_workers).items():
+        if result['df_ratio'] is not None:
+            jobs.append((plot_ma_combined, (result['counts'], result['total_stocks'], result['df_ratio'], selected_list)))
+        jobs.append((plot_additional_ma_charts, (get_stock_list(selected_list), db_path, selected_list)))
+        if result['avg_volumes']:
+            jobs.append((plot_average_volume_treemaps, (result['avg_volumes'], selected_list)))
+        jobs.append((plot_roc_density, (result['roc_data'], selected_list)))
+    report_renderer.render_parallel(jobs, output_dir, max_workers=max_workers or PROCESS_WORKERS)
+    return output_dir
+
+def update_eod(interactive=True, mode='resume'):
+    # Toàn bộ bước cập nhật EOD: tải dữ liệu HOSE, cập nhật thành viên nhóm, tính chỉ báo (và xuất file nhóm nếu bật)
+    # mode: chế độ của nhật ký công việc khi tải dữ liệu HOSE (xem load_hose_data)
+    print("Kiểm tra tuổi của các file danh sách cổ phiếu...")
+    check_and_update_stock_lists(interactive)
+    
+    print("Bắt đầu tải dữ liệu cho HOSE...")
+    load_hose_data(mode=mode)
+    
+    print("Cập nhật thành viên của các danh sách khác...")
+    sync_group_members()
+    
+    print("Tính chỉ báo cho các mã vừa cập nhật...")
+    materialize_indicators()
+    
+    if EXPORT_GROUP_DBS:
+        print("Bắt đầu xuất dữ liệu cho các danh sách khác...")
+        extract_data_for_groups()
+
+def describe_data_dbs():
+    describe_db(get_data_db_path(), TXT_PATH)
+    if EXPORT_GROUP_DBS:
+        for group_name in GROUP_DB_PATHS.keys():
+            group_data_db_path = get_group_export_path(group_name)
+            if os.path.exists(group_data_db_path):
+                describe_db(group_data_db_path, TXT_PATH, append=True)
+
 if __name__ == "__main__":
     update_data = input("Bạn có muốn cập nhật dữ liệu không? (Y/N): ").strip().upper()
     if update_data == 'Y':
-        print("Kiểm tra tuổi của các file danh sách cổ phiếu...")
-        check_and_update_stock_lists()
-        
-        print("Bắt đầu tải dữ liệu cho HOSE...")
-        load_hose_data()
-        
-        print("Bắt đầu tái phân bổ dữ liệu cho các danh sách khác...")
-        extract_data_for_groups()
+        update_eod()
     else:
         print("Bỏ qua cập nhật dữ liệu.")
 
@@ -573,12 +998,26 @@ if __name__ == "__main__":
         print("2. ROC (Rate of Change)")
         print("3. Khối lượng trung bình")
         print("4. Thoát")
-        choice = input("Nhập lựa chọn của bạn (1, 2, 3 hoặc 4): ").strip()
+        print("5. Báo cáo MA cho tất cả danh sách (nạp dữ liệu một lần)")
+        print("6. Xuất toàn bộ biểu đồ ra file (không hiển thị)")
+        choice = input("Nhập lựa chọn của bạn (1-6): ").strip()
         
         if choice == '4':
             print("Thoát chương trình.")
             break
         
+        if choice == '5':
+            for selected_list, result in analyze_all_groups().items():
+                print_ma_statistics(result['counts'], result['total_stocks'], selected_list)
+                if result['df_ratio'] is not None:
+                    plot_ma_combined(result['counts'], result['total_stocks'], result['df_ratio'], selected_list)
+            continue
+        
+        if choice == '6':
+            output_dir = render_chart_pack()
+            print(f"Đã lưu biểu đồ tại {output_dir}")
+            continue
+        
         if choice in ['1', '2', '3']:
             print("\nChọn danh sách cổ phiếu để phân tích:")
             print("1. HOSE")
@@ -600,25 +1039,21 @@ if __name__ == "__main__":
             selected_list = list_mapping.get(list_choice, 'HOSE')
             
             stock_list = get_stock_list(selected_list)
-            db_path = HOSE_DATA_DB_PATH if selected_list == 'HOSE' else os.path.join(SCRIPT_DIR, f"stock_data_{selected_list}.db")
+            db_path = get_data_db_path()
             
             if not check_data_availability(db_path, stock_list, 400, min_period=200):
                 print("Cảnh báo: Cơ sở dữ liệu không đủ dữ liệu cho 400 ngày hoặc MA200. Vui lòng cập nhật dữ liệu.")
             
             if choice == '1':
                 counts, total_stocks = calculate_ma_statistics(stock_list, db_path)
-                print(f"\nThống kê cho danh sách {selected_list}:")
-                print(f"Số mã đã khảo sát: {total_stocks}")
-                for period in PERIODS:
-                    percentage = (counts[period] / total_stocks) * 100 if total_stocks > 0 else 0
-                    print(f"Số mã đóng cửa trên MA{period}: {counts[period]} ({percentage:.2f}%)")
+                print_ma_statistics(counts, total_stocks, selected_list)
                 
                 df_ratio = calculate_ma_ratio_over_time(stock_list, db_path, num_days_display=100, num_days_data=400)
                 plot_ma_combined(counts, total_stocks, df_ratio, selected_list)
                 plot_additional_ma_charts(stock_list, db_path, selected_list)
             elif choice == '2':
                 roc_data = calculate_roc_data(stock_list, db_path)
-                plot_roc_density(roc_data)
+                plot_roc_density(roc_data, selected_list)
             elif choice == '3':
                 avg_volumes = calculate_average_volumes(stock_list, db_path)
                 plot_average_volume_treemaps(avg_volumes, selected_list)
@@ -626,8 +1061,5 @@ if __name__ == "__main__":
             print("Lựa chọn không hợp lệ. Vui lòng chọn lại.")
     
     print("\nTạo file mô tả cấu trúc DB...")
-    describe_db(HOSE_DATA_DB_PATH, TXT_PATH)
-    for group_name in GROUP_DB_PATHS.keys():
-        group_data_db_path = os.path.join(SCRIPT_DIR, f"stock_data_{group_name}.db")
-        describe_db(group_data_db_path, TXT_PATH, append=True)
+    describe_data_dbs()
     print(f"Hoàn tất! File mô tả đã được lưu tại {TXT_PATH}")
\ No newline at end of file
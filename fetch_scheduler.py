@@ -0,0 +1,151 @@
+import time
+import queue
+import random
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+# Hạn mức yêu cầu mặc định cho từng nguồn dữ liệu: (số yêu cầu mỗi phút, số yêu cầu được gửi dồn).
+# Trong bất kỳ cửa sổ 60 giây nào, số yêu cầu gửi đi không vượt quá rate + burst.
+# Có thể ghi đè trong mục [rate_limits] của config.ini.
+SOURCE_LIMITS = config.get_rate_limits({
+    'VCI': (35, 5),
+    'TCBS': (55, 5),
+})
+# Số yêu cầu đang chạy tối đa của mỗi nguồn trong AsyncFetchScheduler
+IN_FLIGHT = config.get_int('concurrency', 'in_flight', 16)
+
+class TokenBucket:
+    """Token bucket an toàn luồng, tự giảm tốc khi nguồn báo lỗi và hồi phục dần khi thành công"""
+
+    def __init__(self, rate_per_minute, burst=1, min_fraction=0.1):
+        self.base_rate = rate_per_minute / 60.0
+        self.rate = self.base_rate
+        self.min_rate = self.base_rate * min_fraction
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire_async(self):
+        # Chờ đến khi có token bằng asyncio.sleep: coroutine chờ token không giữ luồng nào
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def penalize(self):
+        # Lỗi từ nguồn (thường do vượt hạn mức): giảm một nửa tốc độ và bỏ các token đang tích lũy
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+
+    def reward(self):
+        # Thành công: tăng dần tốc độ về lại hạn mức cấu hình
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+class AsyncFetchScheduler:
+    """Bộ lập lịch tải dữ liệu bằng asyncio: mỗi yêu cầu là một coroutine, chờ token và chờ retry không giữ luồng"""
+
+    def __init__(self, in_flight=None, limits=None, max_retries=5, base_delay=5, max_delay=120):
+        limits = limits or SOURCE_LIMITS
+        self.buckets = {source: TokenBucket(rate, burst) for source, (rate, burst) in limits.items()}
+        self.in_flight = in_flight or IN_FLIGHT
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphores = {}
+        self._executor = None
+
+    async def call(self, source, func, *args, **kwargs):
+        # Gọi func trong giới hạn tốc độ và số yêu cầu đang chạy của source, thử lại với thời gian chờ tăng dần.
+        # Hàm của vnstock là hàm đồng bộ nên chỉ phần gọi mạng chạy trong nhóm luồng; source=None: không giới hạn.
+        bucket = self.buckets.get(source)
+        semaphore = self._semaphores.get(source)
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if semaphore is None:
+                    result = await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+                else:
+                    # Lấy chỗ trước rồi mới lấy token: chỉ tối đa in_flight coroutine mỗi nguồn cùng chờ token
+                    async with semaphore:
+                        await bucket.acquire_async()
+                        result = await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+            except Exception as e:
+                if bucket is not None:
+                    bucket.penalize()
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                print(f"Lỗi nguồn {source} (lần thử {attempt}/{self.max_retries}): {e}. Thử lại sau {delay} giây...")
+                await asyncio.sleep(delay + random.uniform(0, 1))
+            else:
+                if bucket is not None:
+                    bucket.reward()
+                return result
+
+    async def _run(self, calls, results):
+        self._semaphores = {source: asyncio.Semaphore(self.in_flight) for source in self.buckets}
+
+        async def run_one(key, source, func, args, kwargs):
+            try:
+                results.put((key, await self.call(source, func, *args, **kwargs), None))
+            except Exception as e:
+                results.put((key, None, e))
+
+        await asyncio.gather(*(run_one(*call) for call in calls))
+
+    def run(self, calls):
+        # calls: các bộ (khóa, nguồn, func, args, kwargs), có thể trộn nhiều nguồn (mỗi nguồn chịu hạn mức riêng).
+        # Trả về (khóa, kết quả, lỗi) theo thứ tự hoàn thành. Vòng lặp sự kiện chạy trong một luồng riêng
+        # nên luồng gọi có thể xử lý kết quả (ghi DB, tqdm) trong lúc các yêu cầu khác vẫn đang chạy.
+        calls = list(calls)
+        if not calls:
+            return
+        results = queue.Queue()
+        done = object()
+
+        def loop_thread():
+            with ThreadPoolExecutor(max_workers=self.in_flight * max(1, len(self.buckets))) as executor:
+                self._executor = executor
+                try:
+                    asyncio.run(self._run(calls, results))
+                except Exception as e:
+                    print(f"Lỗi vòng lặp tải dữ liệu: {e}")
+                finally:
+                    results.put(done)
+
+        thread = threading.Thread(target=loop_thread, daemon=True)
+        thread.start()
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            yield item
+        thread.join()
+
+    def map(self, func, items, source=None):
+        # Chạy func(item) cho mọi item, trả về (item, kết quả, lỗi) theo thứ tự hoàn thành.
+        # Nếu có source, mỗi lần gọi chịu giới hạn tốc độ và retry của nguồn đó.
+        return self.run((item, source, func, (item,), {}) for item in items)
+
+    def call_sync(self, source, func, *args, **kwargs):
+        # Một lần gọi từ mã đồng bộ (ví dụ tải danh sách mã trước khi chạy cả lô); ném lại lỗi cuối cùng
+        for _, result, error in self.run([(None, source, func, args, kwargs)]):
+            if error is not None:
+                raise error
+            return result
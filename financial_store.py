@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+import config
+from ohlcv_store import symbol_filter
+from sqlite_writer import dataframe_rows
+
+# Kho báo cáo tài chính dạng dài: một DB duy nhất thay cho hai file data/<sàn>/year|quarter/<mã>.db của mỗi mã.
+# Mỗi giá trị là một dòng (symbol, statement, period_type, year, quarter, item, value); tên chỉ tiêu được lưu
+# một lần trong financial_items và tham chiếu bằng item_id. Khóa chính phục vụ đọc theo mã, chỉ mục
+# (item_id, period_type, year, quarter) phục vụ lát cắt ngang một chỉ tiêu của mọi mã trong một truy vấn.
+FINANCIALS_DIR = config.get_path('paths', 'financials_dir', '')
+LEGACY_DATA_DIR = os.path.join(FINANCIALS_DIR, 'data')
+FINANCIALS_DB_PATH = config.get_path('paths', 'financial_store', os.path.join(FINANCIALS_DIR, 'financials.db'))
+
+STATEMENTS = ['balance_sheet', 'income_statement', 'cash_flow', 'ratios']
+PERIOD_TYPES = ['year', 'quarter']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS financial_items (
+    item_id INTEGER PRIMARY KEY,
+    statement TEXT NOT NULL,
+    item TEXT NOT NULL,
+    UNIQUE (statement, item)
+);
+CREATE TABLE IF NOT EXISTS financials (
+    symbol TEXT NOT NULL,
+    statement TEXT NOT NULL,
+    period_type TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    quarter INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (symbol, statement, period_type, year, quarter, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_financials_item ON financials (item_id, period_type, year, quarter, symbol, value);
+CREATE VIEW IF NOT EXISTS financials_long AS
+    SELECT f.symbol, f.statement, f.period_type, f.year, f.quarter, i.item, f.value
+    FROM financials f JOIN financial_items i USING (item_id);
+CREATE TABLE IF NOT EXISTS financial_symbols (
+    symbol TEXT PRIMARY KEY,
+    exchange TEXT
+);
+CREATE TABLE IF NOT EXISTS dividends (
+    symbol TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dividends_symbol ON dividends (symbol);
+"""
+
+# ### Kết nối
+def connect(db_path=FINANCIALS_DB_PATH):
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def has_store(db_path=FINANCIALS_DB_PATH):
+    # Kiểm tra file có phải kho báo cáo dạng dài (có bảng financials) mà không tạo file mới
+    if not os.path.exists(db_path):
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='financials'").fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+# ### Ghi dữ liệu
+def flatten_columns(df):
+    # Bảng ratio của VCI có cột nhiều tầng: đặt tên như khi to_sql ghi ra file cũ
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = [str(col) for col in df.columns]
+    return df
+
+def period_columns(columns):
+    # Cột năm và cột kỳ/quý, nhận diện theo tên như bctc.plot_indicator
+    year_col = next((col for col in columns if 'năm' in col.lower() or 'year' in col.lower()), None)
+    quarter_col = next((col for col in columns
+                        if 'kỳ' in col.lower() or 'quarter' in col.lower() or 'length' in col.lower()), None)
+    return year_col, quarter_col
+
+def item_ids(conn, statement, items):
+    # {tên chỉ tiêu: item_id}, thêm các chỉ tiêu chưa có
+    conn.executemany("INSERT OR IGNORE INTO financial_items (statement, item) VALUES (?, ?)",
+                     [(statement, item) for item in items])
+    rows = conn.execute("SELECT item, item_id FROM financial_items WHERE statement = ? "
+                        "AND item IN (SELECT value FROM json_each(?))", (statement, json.dumps(list(items))))
+    return dict(rows.fetchall())
+
+def write_statement(conn, symbol, statement, period_type, df):
+    # Thay toàn bộ một báo cáo (mã, loại, kỳ) bằng df dạng rộng (mỗi dòng một kỳ, mỗi cột số một chỉ tiêu).
+    # Không commit, người gọi quản lý giao dịch. Trả về số giá trị đã ghi.
+    df = flatten_columns(df)
+    year_col, quarter_col = period_columns(df.columns)
+    if year_col is None:
+        raise ValueError(f"Không tìm thấy cột năm trong {statement} ({period_type}) của {symbol}")
+    conn.execute("DELETE FROM financials WHERE symbol = ? AND statement = ? AND period_type = ?",
+                 (symbol, statement, period_type))
+    years = pd.to_numeric(df[year_col], errors='coerce')
+    if period_type == 'quarter' and quarter_col is not None:
+        quarters = pd.to_numeric(df[quarter_col], errors='coerce')
+    else:
+        quarters = pd.Series(0, index=df.index)
+    valid = (years.notna() & quarters.notna()).to_numpy()
+    items = [col for col in df.columns
+             if col not in (year_col, quarter_col) and pd.api.types.is_numeric_dtype(df[col])]
+    if not items or not valid.any():
+        return 0
+    ids = item_ids(conn, statement, items)
+    block = df.loc[valid, items].to_numpy(dtype='float64')
+    n_periods, n_items = block.shape
+    values = block.ravel()
+    keep = ~np.isnan(values)
+    rows = zip([symbol] * int(keep.sum()), [statement] * int(keep.sum()), [period_type] * int(keep.sum()),
+               np.repeat(years.to_numpy()[valid].astype(np.int64), n_items)[keep].tolist(),
+               np.repeat(quarters.to_numpy()[valid].astype(np.int64), n_items)[keep].tolist(),
+               np.tile(np.array([ids[item] for item in items], dtype=np.int64), n_periods)[keep].tolist(),
+               values[keep].tolist())
+    conn.executemany("INSERT OR REPLACE INTO financials (symbol, statement, period_type, year, quarter, item_id, value) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return int(keep.sum())
+
+def write_dividends(conn, symbol, df):
+    # Cổ tức là các sự kiện (ngày, tỷ lệ, hình thức) chứ không phải chỉ tiêu theo kỳ: giữ dạng bảng,
+    # thêm cột symbol; cột mới của nguồn được thêm vào bảng khi gặp
+    df = flatten_columns(df)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(dividends)")}
+    for col in df.columns:
+        if col not in existing:
+            conn.execute(f'ALTER TABLE dividends ADD COLUMN "{col}"')
+    conn.execute("DELETE FROM dividends WHERE symbol = ?", (symbol,))
+    if df.empty:
+        return 0
+    columns = ', '.join(['symbol'] + [f'"{col}"' for col in df.columns])
+    placeholders = ', '.join(['?'] * (len(df.columns) + 1))
+    conn.executemany(f"INSERT INTO dividends ({columns}) VALUES ({placeholders})",
+                     ((symbol,) + row for row in dataframe_rows(df)))
+    return len(df)
+
+def write_report(conn, symbol, table_name, df, exchange=None):
+    # Ghi một bảng theo tên bảng của file cũ (balance_sheet_year, ratios_quarter, dividends, ...)
+    if exchange is not None:
+        conn.execute("INSERT OR REPLACE INTO financial_symbols (symbol, exchange) VALUES (?, ?)", (symbol, exchange))
+    if table_name == 'dividends':
+        return write_dividends(conn, symbol, df)
+    statement, _, period_type = table_name.rpartition('_')
+    if statement not in STATEMENTS or period_type not in PERIOD_TYPES:
+        raise ValueError(f"Bảng báo cáo không hợp lệ: {table_name}")
+    return write_statement(conn, symbol, statement, period_type, df)
+
+# ### Đọc dữ liệu
+def read_statement(conn, symbol, statement, period_type):
+    # Một báo cáo của một mã ở dạng rộng như file cũ: cột Năm (và Kỳ với báo cáo quý), mỗi chỉ tiêu một cột
+    df = pd.read_sql_query(
+        "SELECT f.year, f.quarter, i.item, f.value FROM financials f JOIN financial_items i USING (item_id) "
+        "WHERE f.symbol = ? AND f.statement = ? AND f.period_type = ? ORDER BY f.item_id",
+        conn, params=(symbol, statement, period_type))
+    if df.empty:
+        return pd.DataFrame()
+    items = df['item'].unique().tolist()
+    wide = df.pivot(index=['year', 'quarter'], columns='item', values='value')[items].reset_index()
+    wide.columns.name = None
+    wide = wide.rename(columns={'year': 'Năm', 'quarter': 'Kỳ'}).sort_values(['Năm', 'Kỳ'])
+    if period_type == 'year':
+        wide = wide.drop(columns='Kỳ')
+    return wide.reset_index(drop=True)
+
+def read_dividends(conn, symbol):
+    df = pd.read_sql_query("SELECT * FROM dividends WHERE symbol = ?", conn, params=(symbol,))
+    return df.drop(columns='symbol')
+
+def read_item(conn, item, statement=None, period_type='year', year=None, quarter=None, symbols=None):
+    # Lát cắt ngang: giá trị một chỉ tiêu của mọi mã (hoặc các mã symbols) trong một truy vấn dùng chỉ mục
+    # (item_id, period_type, year, quarter). year/quarter=None: mọi kỳ.
+    query = "SELECT item_id FROM financial_items WHERE item = ?"
+    params = [item]
+    if statement is not None:
+        query += " AND statement = ?"
+        params.append(statement)
+    ids = [row[0] for row in conn.execute(query, params)]
+    condition, params = symbol_filter(symbols)
+    query = ("SELECT symbol, year, quarter, value FROM financials "
+             f"WHERE item_id IN (SELECT value FROM json_each(?)) AND period_type = ?{condition}")
+    params = [json.dumps(ids), period_type] + params
+    if year is not None:
+        query += " AND year = ?"
+        params.append(int(year))
+    if quarter is not None:
+        query += " AND quarter = ?"
+        params.append(int(quarter))
+    return pd.read_sql_query(query + " ORDER BY symbol, year, quarter", conn, params=params)
+
+def list_items(conn, statement=None):
+    query = "SELECT statement, item FROM financial_items"
+    params = []
+    if statement is not None:
+        query += " WHERE statement = ?"
+        params.append(statement)
+    return pd.read_sql_query(query + " ORDER BY statement, item_id", conn, params=params)
+
+def symbol_exchanges(conn):
+    return dict(conn.execute("SELECT symbol, exchange FROM financial_symbols").fetchall())
+
+# ### Chuyển đổi từ cấu trúc cũ (hai file DB cho mỗi mã)
+def import_from_files(data_dir=LEGACY_DATA_DIR, db_path=FINANCIALS_DB_PATH):
+    # Đọc mọi file <data_dir>/<sàn>/year|quarter/<mã>.db và ghi vào kho; mỗi file một giao dịch
+    if not os.path.isdir(data_dir):
+        print(f"Thư mục không tồn tại: {data_dir}")
+        return 0
+    conn = connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    imported = 0
+    files = 0
+    for exchange in sorted(os.listdir(data_dir)):
+        for period_type in PERIOD_TYPES:
+            folder = os.path.join(data_dir, exchange, period_type)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if not name.endswith('.db'):
+                    continue
+                path = os.path.join(folder, name)
+                symbol = name[:-3]
+                src = sqlite3.connect(path)
+                try:
+                    tables = [row[0] for row in src.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+                    with conn:
+                        for table_name in tables:
+                            if table_name != 'dividends' and not table_name.endswith('_' + period_type):
+                                continue
+                            df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', src)
+                            write_report(conn, symbol, table_name, df, exchange)
+                            imported += 1
+                    files += 1
+                except Exception as e:
+                    print(f"Bỏ qua {path}: {e}")
+                finally:
+                    src.close()
+    conn.close()
+    print(f"Đã chuyển {imported} bảng từ {files} file trong {data_dir} sang {db_path}")
+    return imported
+
+if __name__ == "__main__":
+    # python financial_store.py [thư_mục_data] [DB_đích]
+    src_dir = sys.argv[1] if len(sys.argv) > 1 else LEGACY_DATA_DIR
+    dst_path = sys.argv[2] if len(sys.argv) > 2 else FINANCIALS_DB_PATH
+    import_from_files(src_dir, dst_path)
@@ -0,0 +1,137 @@
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import config
+import orderflow
+import intraday_poller
+from fetch_scheduler import AsyncFetchScheduler
+
+# Quét dòng tiền trong phiên của cả một danh sách (HOSE, VN30, VN100, ...) và xếp hạng các mã, ví dụ:
+#   python cli.py scan-flow --group HOSE --sort net_flow_share --limit 30
+#   python flow_scanner.py --group VN30 --sort imbalance_ratio
+# Dữ liệu khớp lệnh của các mã được tải đồng thời (AsyncFetchScheduler, chịu hạn mức nguồn TCBS); mỗi
+# CHUNK_SIZE mã đã tải xong được gửi ngay (dạng mảng numpy của orderflow.tick_arrays) cho một tiến trình con
+# tính orderflow.scan_metrics trong lúc các mã khác vẫn đang tải. Tiến trình con chỉ cần import orderflow.
+PROCESS_WORKERS = config.get_int('concurrency', 'process_workers', None)
+PAGE_SIZE = 10_000
+CHUNK_SIZE = 25
+
+GROUPS = ['HOSE', 'VN30', 'VN100', 'VNAllShare', 'VNMidCap', 'VNSmallCap']
+
+# Các cột xếp hạng (giảm dần theo mặc định)
+SORT_COLUMNS = ['net_flow', 'net_flow_share', 'imbalance_ratio', 'order_to_volume_ratio', 'outlier_minutes',
+                'in_flow', 'out_flow', 'volume']
+
+def group_symbols(group):
+    # Danh sách mã của một nhóm theo các file stock_group_<nhóm>.db (import eod300 chỉ khi cần)
+    import eod300
+    return eod300.get_stock_list(group)
+
+def fetch_ticks(symbol, page_size=PAGE_SIZE):
+    # Cả phiên: các mã có hơn page_size lệnh tốn thêm một lần gọi cho mỗi trang
+    return intraday_poller.fetch_session(symbol, page_size=page_size)
+
+def _metrics_chunk(frames):
+    # Chạy trong tiến trình con: chỉ số của một nhóm mã, lỗi của từng mã được trả về dạng chuỗi
+    rows, errors = {}, {}
+    for symbol, arrays in frames.items():
+        try:
+            rows[symbol] = orderflow.scan_metrics(*arrays)
+        except Exception as e:
+            errors[symbol] = str(e)
+    return rows, errors
+
+def scan(symbols, max_workers=None, chunk_size=CHUNK_SIZE, scheduler=None, page_size=PAGE_SIZE):
+    # Trả về (DataFrame chỉ số theo mã, {mã: lỗi}); mã không có giao dịch trong phiên bị bỏ qua
+    scheduler = scheduler or AsyncFetchScheduler()
+    rows, errors, empty = {}, {}, []
+    futures, batch = [], {}
+    with ProcessPoolExecutor(max_workers=max_workers or PROCESS_WORKERS) as executor:
+        # Khởi động các tiến trình con trước khi vòng lặp sự kiện của bộ lập lịch chạy trong luồng riêng
+        # (fork một tiến trình đang có nhiều luồng có thể làm tiến trình con bị treo)
+        executor.submit(int).result()
+        for symbol, ticks, error in scheduler.map(lambda symbol: fetch_ticks(symbol, page_size), symbols, source='TCBS'):
+            if error is not None:
+                errors[symbol] = str(error)
+                continue
+            if ticks is None or ticks.empty:
+                empty.append(symbol)
+                continue
+            try:
+                batch[symbol] = orderflow.tick_arrays(ticks)
+            except Exception as e:
+                errors[symbol] = str(e)
+                continue
+            if len(batch) >= chunk_size:
+                futures.append(executor.submit(_metrics_chunk, batch))
+                batch = {}
+        if batch:
+            futures.append(executor.submit(_metrics_chunk, batch))
+        for future in futures:
+            chunk_rows, chunk_errors = future.result()
+            rows.update(chunk_rows)
+            errors.update(chunk_errors)
+    if empty:
+        print(f"{len(empty)} mã chưa có giao dịch trong phiên.")
+    result = pd.DataFrame.from_dict(rows, orient='index')
+    result.index.name = 'symbol'
+    return result, errors
+
+def rank(metrics, sort_by='net_flow', ascending=False, limit=None):
+    # Xếp hạng theo một cột, thêm cột rank (1 = đứng đầu)
+    if metrics.empty:
+        return metrics
+    ranked = metrics.sort_values(sort_by, ascending=ascending, na_position='last')
+    ranked.insert(0, 'rank', range(1, len(ranked) + 1))
+    return ranked.head(limit) if limit else ranked
+
+def print_ranking(ranked, title):
+    print(f"\n=== {title} ===")
+    if ranked.empty:
+        print("Không có dữ liệu.")
+        return
+    table = ranked.copy()
+    for column in ['net_flow', 'in_flow', 'out_flow', 'last_outlier_net_flow']:
+        table[column] = table[column].map(lambda value: '' if pd.isna(value) else orderflow.format_currency(value))
+    for column in ['last_outlier', 'last_time']:
+        table[column] = pd.to_datetime(table[column]).dt.strftime('%H:%M').fillna('')
+    print(table.to_string(float_format=lambda value: f"{value:.6g}"))
+
+def scan_group(group='HOSE', symbols=None, sort_by='net_flow', ascending=False, limit=30, max_workers=None,
+               output=None):
+    # Quét một nhóm (hoặc danh sách mã cho trước), in bảng xếp hạng và trả về toàn bộ chỉ số đã xếp hạng
+    symbols = symbols or group_symbols(group)
+    if not symbols:
+        print(f"Không có mã nào trong danh sách {group}.")
+        return pd.DataFrame()
+    start = time.perf_counter()
+    metrics, errors = scan(symbols, max_workers=max_workers)
+    elapsed = time.perf_counter() - start
+    print(f"Đã quét {len(metrics)}/{len(symbols)} mã sau {elapsed:.1f} giây.")
+    if errors:
+        print(f"{len(errors)} mã lỗi: " + ", ".join(f"{symbol} ({error})" for symbol, error in list(errors.items())[:10]))
+    ranked = rank(metrics, sort_by, ascending)
+    print_ranking(ranked.head(limit), f"XẾP HẠNG DÒNG TIỀN {group} THEO {sort_by}")
+    if output:
+        ranked.to_csv(output, encoding='utf-8-sig')
+        print(f"Đã lưu kết quả vào {output}")
+    return ranked
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quét và xếp hạng dòng tiền trong phiên của một danh sách mã")
+    parser.add_argument('symbols', nargs='*', help="Chỉ quét các mã này (mặc định: mọi mã của --group)")
+    parser.add_argument('--group', default='HOSE', choices=GROUPS)
+    parser.add_argument('--sort', choices=SORT_COLUMNS, default='net_flow')
+    parser.add_argument('--ascending', action='store_true', help="Xếp tăng dần (ví dụ: bán ròng mạnh nhất trước)")
+    parser.add_argument('--limit', type=int, default=30, help="Số mã hiển thị")
+    parser.add_argument('--workers', type=int, help="Số tiến trình tính toán (mặc định: mục [concurrency] process_workers)")
+    parser.add_argument('--output', help="Ghi toàn bộ bảng xếp hạng ra file CSV")
+    args = parser.parse_args(argv)
+    scan_group(args.group, [symbol.upper() for symbol in args.symbols], args.sort, args.ascending, args.limit,
+               args.workers, args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
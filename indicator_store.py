@@ -0,0 +1,159 @@
+import json
+import time
+import pandas as pd
+import ohlcv_store
+from rolling_state import RollingState
+
+# Bảng chỉ báo tính sẵn: mỗi (mã, phiên) một dòng gồm MA, ROC và khối lượng trung bình, được cập nhật
+# sau mỗi lần tải dữ liệu EOD. Bảng indicator_state ghi phiên cuối đã tính, thời điểm tính và checkpoint
+# RollingState của từng mã; mã nào được tải lại sau thời điểm đó (theo chỉ mục độ mới) thì cần tính tiếp
+# từ checkpoint với chi phí chỉ phụ thuộc số phiên mới.
+INDICATOR_TABLE = 'indicators'
+STATE_TABLE = 'indicator_state'
+
+MA_PERIODS = [5, 10, 20, 50, 100, 200]
+ROC_PERIODS = [5, 10, 20, 50, 100, 200]
+VOLUME_PERIODS = [5, 10, 20, 50, 100]
+
+INDICATOR_COLUMNS = ([f'ma{p}' for p in MA_PERIODS] + [f'roc{p}' for p in ROC_PERIODS]
+                     + [f'avgvol{p}' for p in VOLUME_PERIODS])
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {INDICATOR_TABLE} (
+    symbol TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    close REAL,
+    volume REAL,
+    {', '.join(f'{col} REAL' for col in INDICATOR_COLUMNS)},
+    PRIMARY KEY (symbol, time)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+    symbol TEXT PRIMARY KEY,
+    last_time INTEGER NOT NULL,
+    computed_at INTEGER NOT NULL,
+    state BLOB
+);
+"""
+
+def ensure_schema(conn):
+    # Tạo bảng bằng execute từng câu lệnh (executescript sẽ commit giao dịch đang mở)
+    for statement in filter(str.strip, SCHEMA.split(';')):
+        conn.execute(statement)
+    # Bảng indicator_state tạo trước khi có checkpoint chưa có cột state
+    if 'state' not in [row[1] for row in conn.execute(f"PRAGMA table_info({STATE_TABLE})")]:
+        conn.execute(f"ALTER TABLE {STATE_TABLE} ADD COLUMN state BLOB")
+
+# ### Tính toán
+def compute_indicators(df):
+    # df gồm time, close, volume tăng dần theo time. Trả về DataFrame cùng số dòng với các cột chỉ báo;
+    # chỉ báo thiếu dữ liệu (ít phiên hơn chu kỳ) để NaN, giống rolling().mean() trên toàn bộ chuỗi.
+    close = df['close'].astype('float64')
+    volume = df['volume'].astype('float64')
+    result = {'time': ohlcv_store.to_epoch(df['time']), 'close': close.to_numpy(), 'volume': volume.to_numpy()}
+    for period in MA_PERIODS:
+        result[f'ma{period}'] = close.rolling(window=period).mean().to_numpy()
+    for period in ROC_PERIODS:
+        past = close.shift(period)
+        result[f'roc{period}'] = ((close - past) / past * 100).to_numpy()
+    for period in VOLUME_PERIODS:
+        result[f'avgvol{period}'] = volume.rolling(window=period).mean().to_numpy()
+    return pd.DataFrame(result)
+
+def new_state(df=None):
+    # RollingState cho các chu kỳ của bảng chỉ báo, dựng từ lịch sử df (time, close, volume) nếu có
+    if df is None or df.empty:
+        return RollingState(MA_PERIODS, ROC_PERIODS, VOLUME_PERIODS)
+    return RollingState.from_history(ohlcv_store.to_epoch(df['time']), df['close'].to_numpy(dtype='float64'),
+                                     df['volume'].to_numpy(dtype='float64'), MA_PERIODS, ROC_PERIODS, VOLUME_PERIODS)
+
+def advance_state(state, df):
+    # Đưa các phiên mới của df (tăng dần theo time) vào state, O(1) mỗi phiên. Phiên trùng với phiên cuối
+    # của state thay thế phiên đó. Trả về DataFrame chỉ báo của các phiên đã đưa vào.
+    rows = []
+    for time, close, volume in zip(ohlcv_store.to_epoch(df['time']).tolist(),
+                                   df['close'].tolist(), df['volume'].tolist()):
+        if state.last_time is not None and time == state.last_time:
+            row = state.replace_last(time, close, volume)
+        elif state.last_time is not None and time < state.last_time:
+            raise ValueError(f"Phiên {time} cũ hơn phiên cuối của trạng thái ({state.last_time})")
+        else:
+            row = state.push(time, close, volume)
+        rows.append({'time': time, **row})
+    return pd.DataFrame(rows, columns=['time', 'close', 'volume'] + INDICATOR_COLUMNS)
+
+# ### Ghi
+def write_indicators(conn, symbol, indicators, since=None, retention=None, computed_at=None, state=None):
+    # Ghi các dòng chỉ báo có time >= since (epoch giây; None: toàn bộ) và cập nhật trạng thái,
+    # kèm checkpoint RollingState nếu có (không commit)
+    ensure_schema(conn)
+    if since is not None:
+        indicators = indicators[indicators['time'] >= since]
+        conn.execute(f"DELETE FROM {INDICATOR_TABLE} WHERE symbol = ? AND time >= ?", (symbol, int(since)))
+    else:
+        conn.execute(f"DELETE FROM {INDICATOR_TABLE} WHERE symbol = ?", (symbol,))
+    if indicators.empty:
+        return 0
+    columns = ['time', 'close', 'volume'] + INDICATOR_COLUMNS
+    rows = indicators[columns].astype(object).where(indicators[columns].notna(), None)
+    conn.executemany(
+        f"INSERT INTO {INDICATOR_TABLE} (symbol, {', '.join(columns)}) VALUES (?, {', '.join(['?'] * len(columns))})",
+        ((symbol, *row) for row in rows.itertuples(index=False, name=None))
+    )
+    if retention:
+        conn.execute(
+            f"DELETE FROM {INDICATOR_TABLE} WHERE symbol = ? AND time < "
+            f"(SELECT time FROM {INDICATOR_TABLE} WHERE symbol = ? ORDER BY time DESC LIMIT 1 OFFSET ?)",
+            (symbol, symbol, retention - 1)
+        )
+    conn.execute(
+        f"INSERT OR REPLACE INTO {STATE_TABLE} (symbol, last_time, computed_at, state) VALUES (?, ?, ?, ?)",
+        (symbol, int(indicators['time'].iloc[-1]), int(computed_at if computed_at is not None else time.time()),
+         state.to_bytes() if state is not None else None)
+    )
+    return len(indicators)
+
+# ### Đọc
+def pending_symbols(conn, symbols=None):
+    # Các mã có dữ liệu được tải sau lần tính chỉ báo gần nhất: {symbol: phiên cuối đã tính (epoch) hoặc None}
+    ensure_schema(conn)
+    condition, params = ohlcv_store.symbol_filter(symbols, column='f.symbol')
+    rows = conn.execute(
+        f"SELECT f.symbol, s.last_time FROM {ohlcv_store.FRESHNESS_TABLE} AS f "
+        f"LEFT JOIN {STATE_TABLE} AS s ON s.symbol = f.symbol "
+        f"WHERE f.last_time IS NOT NULL "
+        f"AND (s.symbol IS NULL OR s.computed_at < f.fetched_at OR s.last_time != f.last_time){condition}", params
+    ).fetchall()
+    return dict(rows)
+
+def read_states(conn, symbols):
+    # Checkpoint RollingState đã lưu: {symbol: RollingState}; mã chưa có checkpoint không có trong kết quả
+    ensure_schema(conn)
+    condition, params = ohlcv_store.symbol_filter(symbols)
+    rows = conn.execute(f"SELECT symbol, state FROM {STATE_TABLE} WHERE state IS NOT NULL{condition}", params)
+    return {symbol: RollingState.from_bytes(state) for symbol, state in rows}
+
+def latest_indicators(conn, symbols, columns=None):
+    # Dòng chỉ báo của phiên gần nhất cho từng mã, đánh chỉ mục theo symbol (mỗi mã một lần tìm theo khóa chính).
+    # Trả về None nếu có mã trong danh sách chưa được tính chỉ báo cho dữ liệu mới nhất.
+    if not ohlcv_store.has_table(conn, STATE_TABLE) or pending_symbols(conn, symbols):
+        return None
+    columns = columns or ['close', 'volume'] + INDICATOR_COLUMNS
+    df = pd.read_sql_query(
+        f"SELECT i.symbol, {', '.join('i.' + col for col in columns)} FROM json_each(?) AS l "
+        f"JOIN {STATE_TABLE} AS s ON s.symbol = l.value "
+        f"JOIN {INDICATOR_TABLE} AS i ON i.symbol = s.symbol AND i.time = s.last_time ORDER BY l.key",
+        conn, params=[json.dumps(list(symbols))]
+    )
+    return df.set_index('symbol')
+
+def read_indicator_history(conn, symbol, columns=None, since=None):
+    # Lịch sử chỉ báo của một mã, tăng dần theo time
+    columns = columns or ['close', 'volume'] + INDICATOR_COLUMNS
+    query = f"SELECT time, {', '.join(columns)} FROM {INDICATOR_TABLE} WHERE symbol = ?"
+    params = [symbol]
+    if since is not None:
+        query += " AND time >= ?"
+        params.append(int(ohlcv_store.to_epoch([since])[0]))
+    df = pd.read_sql_query(query + " ORDER BY time ASC", conn, params=params)
+    df['time'] = ohlcv_store.from_epoch(df['time'])
+    return df
@@ -0,0 +1,232 @@
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import data_source
+import orderflow
+import tick_archive
+from fetch_scheduler import AsyncFetchScheduler
+
+# Theo dõi khớp lệnh trong phiên theo từng đợt, ví dụ:
+#   python cli.py watch ACB FPT VNM --interval 10
+#   poller = IntradayPoller(); poller.poll('ACB'); poller.minutes('ACB')
+# Mỗi mã có một vị trí (TickCursor) của lệnh cuối cùng đã nhận. Mỗi lần làm mới chỉ tải các trang mới nhất
+# cho đến khi gặp vị trí đó (nguồn trả các lệnh mới nhất ở trang 0) và cộng các lệnh mới vào bảng theo phút
+# (orderflow.OrderFlowState), nên chi phí mỗi lần theo số lệnh mới chứ không theo độ dài phiên.
+# Lần tải đầu đọc hết các trang của phiên thay vì chỉ PAGE_SIZE lệnh mới nhất.
+# Với archive=True, các lệnh mới của mỗi đợt được ghi nối vào kho lưu trữ (tick_archive.append).
+PAGE_SIZE = 10_000
+MAX_PAGES = 50
+
+class TickCursor:
+    """Vị trí lệnh khớp cuối cùng đã nhận của một mã: theo id nếu nguồn có, ngược lại theo thời gian"""
+
+    def __init__(self):
+        self.last_id = None
+        self.last_time = None
+        # Số lệnh đã nhận có cùng thời điểm last_time (nhiều lệnh có thể khớp trong cùng một giây)
+        self.at_last_time = 0
+
+    def reached(self, ticks):
+        # Trang này đã chứa lệnh không mới hơn vị trí cuối: không cần tải các trang cũ hơn
+        if self.last_time is None:
+            return False
+        if self.last_id is not None and 'id' in ticks:
+            return ticks['id'].min() <= self.last_id
+        # Theo thời gian: phải tới lệnh cũ hơn hẳn last_time để có đủ các lệnh cùng thời điểm đã nhận
+        return orderflow.utc_times(ticks['time']).min() < self.last_time
+
+    def new_ticks(self, ticks):
+        # Các lệnh sau vị trí cuối (ticks đã sắp theo thời gian)
+        if self.last_time is None or ticks.empty:
+            return ticks
+        if self.last_id is not None and 'id' in ticks:
+            return ticks[ticks['id'].to_numpy() > self.last_id]
+        times = orderflow.utc_times(ticks['time']).to_numpy()
+        same = times == self.last_time
+        keep = (times > self.last_time) | (same & (np.cumsum(same) > self.at_last_time))
+        return ticks[keep]
+
+    def advance(self, ticks):
+        # Dời vị trí tới lệnh cuối của đợt vừa nhận
+        if ticks.empty:
+            return
+        if 'id' in ticks:
+            self.last_id = ticks['id'].max()
+        times = orderflow.utc_times(ticks['time']).to_numpy()
+        last_time = times.max()
+        count = int((times == last_time).sum())
+        self.at_last_time = count + (self.at_last_time if last_time == self.last_time else 0)
+        self.last_time = last_time
+
+def fetch_pages(symbol, cursor=None, page_size=PAGE_SIZE, max_pages=MAX_PAGES, source='TCBS'):
+    """Tải các lệnh khớp sau vị trí cursor (None: cả phiên), trả về DataFrame theo thứ tự thời gian"""
+    pages = []
+    for page in range(max_pages):
+        df = data_source.get_source().intraday(symbol, page_size=page_size, source=source, page=page)
+        if df is None or df.empty:
+            break
+        pages.append(df)
+        if len(df) < page_size or (cursor is not None and cursor.reached(df)):
+            break
+    else:
+        print(f"Mã {symbol}: đã tải {max_pages} trang mà chưa hết các lệnh mới, có thể thiếu lệnh.")
+    if not pages:
+        return pd.DataFrame()
+    ticks = pd.concat(pages[::-1], ignore_index=True)
+    # Giữa hai lần gọi trang có thể có lệnh mới làm các trang chồng lên nhau
+    if 'id' in ticks:
+        ticks = ticks.drop_duplicates('id').sort_values('id', kind='stable')
+    else:
+        ticks = ticks.sort_values('time', kind='stable')
+    ticks = ticks.reset_index(drop=True)
+    return ticks if cursor is None else cursor.new_ticks(ticks).reset_index(drop=True)
+
+def fetch_session(symbol, page_size=PAGE_SIZE, source='TCBS'):
+    # Mọi lệnh khớp của phiên (không bị cắt ở page_size lệnh)
+    return fetch_pages(symbol, None, page_size=page_size, source=source)
+
+class IntradayPoller:
+    """Theo dõi khớp lệnh trong phiên của nhiều mã: mỗi lần làm mới chỉ tải và cộng các lệnh mới"""
+
+    def __init__(self, page_size=PAGE_SIZE, max_pages=MAX_PAGES, source='TCBS', archive=False, archive_dir=None):
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.source = source
+        self.archive = archive
+        self.archive_dir = archive_dir
+        self.cursors = {}
+        self.states = {}
+        self.chunks = {}
+
+    def fetch(self, symbol):
+        # Chỉ đọc vị trí của mã nên chạy được song song cho nhiều mã; vị trí được dời trong apply
+        return fetch_pages(symbol, self.cursors.get(symbol), self.page_size, self.max_pages, self.source)
+
+    def apply(self, symbol, ticks):
+        # Cộng các lệnh mới vào bảng theo phút của mã; trả về số lệnh mới
+        if ticks is None or ticks.empty:
+            return 0
+        cursor = self.cursors.get(symbol)
+        arrays = orderflow.tick_arrays(ticks)
+        if cursor is not None and cursor.last_time is not None and \
+                arrays[0].min().astype('datetime64[D]') > cursor.last_time.astype('datetime64[D]'):
+            # Phiên mới: bắt đầu lại bảng theo phút
+            self.reset(symbol)
+            cursor = None
+        if cursor is None:
+            cursor = self.cursors[symbol] = TickCursor()
+            if self.archive:
+                # Lần nhận đầu là cả phiên: ghi đè phiên đã lưu (nếu có) để không bị trùng lệnh
+                tick_archive.save(symbol, ticks, self.archive_dir)
+        elif self.archive:
+            tick_archive.append(symbol, ticks, self.archive_dir)
+        self.states.setdefault(symbol, orderflow.OrderFlowState()).update(*arrays)
+        self.chunks.setdefault(symbol, []).append(ticks)
+        cursor.advance(ticks)
+        return len(ticks)
+
+    def poll(self, symbol):
+        return self.apply(symbol, self.fetch(symbol))
+
+    def poll_all(self, symbols, scheduler=None):
+        # Làm mới nhiều mã đồng thời (chịu hạn mức của nguồn); trả về {mã: số lệnh mới}, mã lỗi không có trong kết quả
+        scheduler = scheduler or AsyncFetchScheduler()
+        new_counts = {}
+        for symbol, ticks, error in scheduler.map(self.fetch, symbols, source=self.source):
+            if error is not None:
+                print(f"Lỗi khi tải lệnh khớp mới của mã {symbol}: {error}")
+                continue
+            new_counts[symbol] = self.apply(symbol, ticks)
+        return new_counts
+
+    def minutes(self, symbol):
+        # Bảng theo phút (như orderflow.minute_kernel) của mọi lệnh đã nhận
+        state = self.states.get(symbol)
+        return state.minutes() if state is not None else orderflow.OrderFlowState().minutes()
+
+    def ticks(self, symbol):
+        # Mọi lệnh đã nhận trong phiên của mã
+        chunks = self.chunks.get(symbol)
+        if not chunks:
+            return pd.DataFrame()
+        if len(chunks) > 1:
+            self.chunks[symbol] = chunks = [pd.concat(chunks, ignore_index=True)]
+        return chunks[0]
+
+    def result(self, symbol):
+        # Phân tích đầy đủ (orderflow.OrderFlowResult) trên các lệnh đã nhận, ví dụ để vẽ biểu đồ
+        return orderflow.compute(self.ticks(symbol), symbol)
+
+    def reset(self, symbol=None):
+        for store in (self.cursors, self.states, self.chunks):
+            if symbol is None:
+                store.clear()
+            else:
+                store.pop(symbol, None)
+
+    def snapshot(self, symbols, new_counts=None):
+        # Một dòng cho mỗi mã: số lệnh, lệnh cuối, dòng tiền ròng lũy kế và của phút gần nhất
+        rows = {}
+        for symbol in symbols:
+            state = self.states.get(symbol)
+            if state is None:
+                continue
+            minutes = state.minutes()
+            last = self.chunks[symbol][-1].iloc[-1]
+            rows[symbol] = {
+                'new': (new_counts or {}).get(symbol, 0),
+                'ticks': state.n_ticks,
+                'last_time': pd.Timestamp(self.cursors[symbol].last_time),
+                'price': last['price'],
+                'cum_net_flow': minutes['cum_net_flow'].iloc[-1],
+                'last_minute_net_flow': minutes['net_flow'].iloc[-1],
+                'cum_buy': minutes['cum_buy'].iloc[-1],
+                'cum_sell': minutes['cum_sell'].iloc[-1],
+            }
+        result = pd.DataFrame.from_dict(rows, orient='index')
+        result.index.name = 'symbol'
+        return result
+
+def print_snapshot(snapshot):
+    if snapshot.empty:
+        print("Chưa có lệnh khớp.")
+        return
+    table = snapshot.copy()
+    for column in ['cum_net_flow', 'last_minute_net_flow']:
+        table[column] = table[column].map(orderflow.format_currency)
+    table['last_time'] = table['last_time'].dt.strftime('%H:%M:%S')
+    print(table.to_string())
+
+def watch(symbols, interval=15, rounds=None, page_size=PAGE_SIZE, archive=False):
+    """Làm mới các mã mỗi interval giây (rounds lần, None: đến khi Ctrl+C) và in bảng dòng tiền"""
+    poller = IntradayPoller(page_size=page_size, archive=archive)
+    scheduler = AsyncFetchScheduler()
+    done = 0
+    try:
+        while rounds is None or done < rounds:
+            start = time.perf_counter()
+            new_counts = poller.poll_all(symbols, scheduler)
+            elapsed = time.perf_counter() - start
+            print(f"\n=== {time.strftime('%H:%M:%S')}: {sum(new_counts.values())} lệnh mới, làm mới trong {elapsed:.2f} giây ===")
+            print_snapshot(poller.snapshot(symbols, new_counts))
+            done += 1
+            if rounds is None or done < rounds:
+                time.sleep(max(0, interval - elapsed))
+    except KeyboardInterrupt:
+        print("\nDừng theo dõi.")
+    return poller
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Theo dõi dòng tiền trong phiên, mỗi lần làm mới chỉ tải các lệnh mới")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--interval', type=float, default=15, help="Số giây giữa hai lần làm mới")
+    parser.add_argument('--rounds', type=int, help="Số lần làm mới (mặc định: đến khi Ctrl+C)")
+    parser.add_argument('--archive', action='store_true', help="Ghi các lệnh mới vào kho lưu trữ (tick_archive.py)")
+    args = parser.parse_args(argv)
+    watch([symbol.upper() for symbol in args.symbols], args.interval, args.rounds, archive=args.archive)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
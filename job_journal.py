@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import config
+
+# Nhật ký công việc tải dữ liệu: mỗi việc (tác vụ, mã, báo cáo) có trạng thái pending / done / failed / skipped,
+# số lần thử, lỗi gần nhất và thời điểm. Một lần chạy bị gián đoạn (tắt máy, lỗi, Ctrl+C) để lại các việc
+# pending: lần chạy sau chỉ làm tiếp các việc đó; chế độ retry_failed chỉ chạy lại các việc bị lỗi.
+# Lần chạy dở từ một ngày trước không được làm tiếp: các việc đã xong khi đó có thể đã cũ lại (phiên mới,
+# báo cáo mới) nên bắt đầu lần chạy mới với mọi việc.
+# Việc chỉ được đánh dấu done sau khi dữ liệu của nó đã được commit (qua callback của SQLiteWriter).
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+JOURNAL_DB_PATH = config.get_path('paths', 'journal_db', os.path.join(SCRIPT_DIR, 'job_journal.db'))
+
+MODES = ('resume', 'restart', 'retry_failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_runs (
+    task TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    task TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    report TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (task, symbol, report)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (task, status);
+"""
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+class JobJournal:
+    """Nhật ký công việc lưu trong SQLite, dùng chung được giữa luồng tải và luồng ghi"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or JOURNAL_DB_PATH
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def run_info(self, task):
+        # (started_at, finished_at) của lần chạy gần nhất, None nếu tác vụ chưa từng chạy
+        with self.lock:
+            return self.conn.execute("SELECT started_at, finished_at FROM job_runs WHERE task = ?", (task,)).fetchone()
+
+    def start(self, task, keys, mode='resume'):
+        # keys: các (mã, báo cáo) của một lần chạy đầy đủ. Trả về danh sách việc cần làm theo mode:
+        #   resume:       lần chạy trước chưa xong và bắt đầu trong hôm nay thì chỉ các việc còn pending (kể cả
+        #                 việc mới có trong keys), ngược lại bắt đầu lần chạy mới
+        #   restart:      bắt đầu lần chạy mới với mọi keys
+        #   retry_failed: các việc lỗi của lần chạy gần nhất (được đặt lại thành pending)
+        if mode not in MODES:
+            raise ValueError(f"Chế độ không hợp lệ: {mode} (chọn một trong {', '.join(MODES)})")
+        run = self.run_info(task)
+        now = _now()
+        keys = list(dict.fromkeys((symbol, report) for symbol, report in keys))
+        unfinished = run is not None and run[1] is None
+        if mode == 'resume' and unfinished and run[0][:10] != now[:10]:
+            print(f"Lần chạy {task} bắt đầu lúc {run[0]} chưa hoàn tất nhưng đã quá hạn, bắt đầu lần chạy mới.")
+            unfinished = False
+        with self.lock, self.conn:
+            if mode == 'retry_failed' or (mode == 'resume' and unfinished):
+                if mode == 'resume':
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO jobs (task, symbol, report, status, created_at, updated_at) VALUES (?, ?, ?, 'pending', ?, ?)",
+                        [(task, symbol, report, now, now) for symbol, report in keys])
+                else:
+                    self.conn.execute("UPDATE jobs SET status = 'pending', updated_at = ? WHERE task = ? AND status = 'failed'",
+                                      (now, task))
+                    self.conn.execute("UPDATE job_runs SET finished_at = NULL WHERE task = ?", (task,))
+                rows = self.conn.execute("SELECT symbol, report FROM jobs WHERE task = ? AND status = 'pending' ORDER BY rowid",
+                                         (task,)).fetchall()
+                total = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE task = ?", (task,)).fetchone()[0]
+                if mode == 'resume':
+                    print(f"Tiếp tục lần chạy {task} bắt đầu lúc {run[0]}: còn {len(rows)}/{total} việc.")
+                else:
+                    print(f"Chạy lại {len(rows)} việc lỗi của {task}.")
+                return rows
+            self.conn.execute("DELETE FROM jobs WHERE task = ?", (task,))
+            self.conn.executemany(
+                "INSERT INTO jobs (task, symbol, report, status, created_at, updated_at) VALUES (?, ?, ?, 'pending', ?, ?)",
+                [(task, symbol, report, now, now) for symbol, report in keys])
+            self.conn.execute("INSERT OR REPLACE INTO job_runs (task, started_at, finished_at) VALUES (?, ?, NULL)", (task, now))
+            return keys
+
+    def record(self, task, key, error=None):
+        # Kết quả một lần thử: error=None là thành công (done), ngược lại failed kèm nội dung lỗi
+        symbol, report = key
+        status = 'done' if error is None else 'failed'
+        with self.lock, self.conn:
+            self.conn.execute("""
+                UPDATE jobs SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ?
+                WHERE task = ? AND symbol = ? AND report = ?
+            """, (status, None if error is None else str(error), _now(), task, symbol, report))
+
+    def skip(self, task, keys):
+        # Các việc không cần chạy trong lần này (ví dụ báo cáo chưa thể có kỳ mới), không tính là một lần thử
+        now = _now()
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE jobs SET status = 'skipped', updated_at = ? WHERE task = ? AND symbol = ? AND report = ?",
+                                  [(now, task, symbol, report) for symbol, report in keys])
+
+    def finish(self, task):
+        # Kết thúc lần chạy (mọi việc đã được thử); trả về số việc theo trạng thái
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE job_runs SET finished_at = ? WHERE task = ?", (_now(), task))
+        return self.counts(task)
+
+    def counts(self, task):
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs WHERE task = ? GROUP BY status", (task,)).fetchall()
+        return dict(rows)
+
+    def failures(self, task):
+        # Các việc lỗi: (mã, báo cáo, số lần thử, lỗi gần nhất, thời điểm)
+        with self.lock:
+            return self.conn.execute("""
+                SELECT symbol, report, attempts, last_error, updated_at FROM jobs
+                WHERE task = ? AND status = 'failed' ORDER BY symbol, report
+            """, (task,)).fetchall()
+
+    def tasks(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT task FROM job_runs ORDER BY task")]
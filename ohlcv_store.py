@@ -0,0 +1,361 @@
+import os
+import sys
+import json
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+import config
+
+# Kho dữ liệu EOD dạng dài: một bảng ohlcv duy nhất với khóa (symbol, time) thay cho
+# mỗi mã một bảng. Cột time lưu dạng số nguyên (epoch giây) để so sánh và lọc nhanh.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = config.get_path('paths', 'data_dir', SCRIPT_DIR)
+OHLCV_DB_PATH = os.path.join(DATA_DIR, "ohlcv_HOSE.db")
+LEGACY_DB_PATH = os.path.join(DATA_DIR, "stock_data_HOSE.db")
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ohlcv (
+    symbol TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume INTEGER,
+    PRIMARY KEY (symbol, time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ohlcv_time ON ohlcv (time, symbol, close, volume);
+"""
+
+# Chỉ mục độ mới: mỗi mã một dòng (phiên gần nhất, số phiên, thời điểm tải), được cập nhật
+# ngay trong giao dịch ghi dữ liệu. Dùng được cho cả kho ohlcv và DB cũ (mỗi mã một bảng).
+FRESHNESS_TABLE = 'freshness'
+FRESHNESS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {FRESHNESS_TABLE} (
+    symbol TEXT PRIMARY KEY,
+    last_time INTEGER,
+    row_count INTEGER NOT NULL,
+    fetched_at INTEGER NOT NULL
+);
+"""
+
+# Thành viên của các danh sách (VN30, VN100, ...): ánh xạ symbol -> nhóm lưu ngay trong DB dữ liệu HOSE,
+# các phân tích theo nhóm đọc trực tiếp từ DB HOSE thay vì từ bản sao dữ liệu của từng nhóm.
+MEMBERSHIP_TABLE = 'group_members'
+MEMBERSHIP_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {MEMBERSHIP_TABLE} (
+    group_name TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    PRIMARY KEY (group_name, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_group_members_symbol ON {MEMBERSHIP_TABLE} (symbol);
+"""
+
+# Các bảng phụ không phải dữ liệu của một mã (kể cả bảng chỉ báo của indicator_store)
+METADATA_TABLES = (FRESHNESS_TABLE, MEMBERSHIP_TABLE, 'indicators', 'indicator_state')
+
+# ### Chuyển đổi thời gian
+def to_epoch(times):
+    # Chuyển cột time (chuỗi hoặc datetime) sang epoch giây dạng int64
+    return pd.to_datetime(times).values.astype('datetime64[s]').astype(np.int64)
+
+def from_epoch(values):
+    return pd.to_datetime(values, unit='s')
+
+# ### Kết nối
+def connect(db_path=OHLCV_DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA + FRESHNESS_SCHEMA)
+    return conn
+
+def has_store(db_path):
+    # Kiểm tra file có phải kho ohlcv (có bảng ohlcv) hay không mà không tạo file mới
+    if not os.path.exists(db_path):
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ohlcv'").fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+def has_table(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone() is not None
+
+def symbol_tables(conn):
+    # Danh sách bảng dữ liệu của DB cũ (mỗi mã một bảng), bỏ qua các bảng phụ
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                        "AND name NOT IN (SELECT value FROM json_each(?))", (json.dumps(METADATA_TABLES),))
+    return [row[0] for row in rows]
+
+def symbol_filter(symbols, column='symbol'):
+    # Điều kiện lọc theo danh sách mã dùng một tham số JSON (không bị giới hạn số biến của SQLite)
+    if symbols is None:
+        return "", []
+    return f" AND {column} IN (SELECT value FROM json_each(?))", [json.dumps(list(symbols))]
+
+# ### Ghi dữ liệu
+def write_bars(conn, symbol, df, replace=False):
+    # Ghi các phiên của một mã vào bảng ohlcv (không commit, người gọi quản lý giao dịch)
+    if replace:
+        conn.execute("DELETE FROM ohlcv WHERE symbol = ?", (symbol,))
+    if df.empty:
+        return 0
+    values = [df[col].astype('int64' if col == 'volume' else 'float64').tolist() for col in OHLCV_COLUMNS]
+    rows = zip([symbol] * len(df), to_epoch(df['time']).tolist(), *values)
+    conn.executemany(
+        "INSERT OR REPLACE INTO ohlcv (symbol, time, open, high, low, close, volume) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    return len(df)
+
+def trim_symbol(conn, symbol, retention):
+    # Chỉ giữ lại retention phiên gần nhất của một mã
+    conn.execute(
+        "DELETE FROM ohlcv WHERE symbol = ? AND time < "
+        "(SELECT time FROM ohlcv WHERE symbol = ? ORDER BY time DESC LIMIT 1 OFFSET ?)",
+        (symbol, symbol, retention - 1)
+    )
+
+def upsert_bars(conn, symbol, df, retention=None):
+    # Ghi nối các phiên mới (thay thế phiên trùng time) rồi cắt về retention phiên
+    count = write_bars(conn, symbol, df)
+    if retention:
+        trim_symbol(conn, symbol, retention)
+    update_freshness(conn, symbol)
+    return count
+
+def save_bars(db_path, symbol, df, replace=False):
+    conn = connect(db_path)
+    with conn:
+        write_bars(conn, symbol, df, replace=replace)
+        update_freshness(conn, symbol)
+    conn.close()
+
+# ### Chỉ mục độ mới
+def update_freshness(conn, symbol, table=None, fetched_at=None):
+    # Ghi lại phiên gần nhất và số phiên của một mã sau khi ghi (không commit).
+    # table=None: đọc từ bảng ohlcv; ngược lại đọc từ bảng riêng của mã trong DB cũ.
+    conn.execute(FRESHNESS_SCHEMA)
+    if table is None:
+        last_time, row_count = conn.execute(
+            "SELECT MAX(time), COUNT(*) FROM ohlcv WHERE symbol = ?", (symbol,)).fetchone()
+    else:
+        last_time, row_count = conn.execute(f'SELECT MAX(time), COUNT(*) FROM "{table}"').fetchone()
+        last_time = int(to_epoch([last_time])[0]) if last_time else None
+    # fetched_at luôn tăng sau mỗi lần ghi (kể cả hai lần ghi trong cùng một giây), để các bản sao dữ liệu
+    # nhận ra một phiên cuối bị thay thế dù phiên gần nhất và số phiên không đổi
+    conn.execute(
+        f"INSERT OR REPLACE INTO {FRESHNESS_TABLE} (symbol, last_time, row_count, fetched_at) VALUES (?, ?, ?, "
+        f"MAX(?, COALESCE((SELECT fetched_at + 1 FROM {FRESHNESS_TABLE} WHERE symbol = ?), 0)))",
+        (symbol, last_time, row_count, int(fetched_at if fetched_at is not None else time.time()), symbol)
+    )
+
+def rebuild_freshness(conn):
+    # Dựng lại chỉ mục độ mới từ dữ liệu hiện có (một lần cho DB chưa có chỉ mục; không commit)
+    conn.execute(FRESHNESS_SCHEMA)
+    conn.execute(f"DELETE FROM {FRESHNESS_TABLE}")
+    now = int(time.time())
+    if has_table(conn, 'ohlcv'):
+        conn.execute(
+            f"INSERT INTO {FRESHNESS_TABLE} (symbol, last_time, row_count, fetched_at) "
+            "SELECT symbol, MAX(time), COUNT(*), ? FROM ohlcv GROUP BY symbol", (now,))
+        return
+    for table in symbol_tables(conn):
+        try:
+            update_freshness(conn, table, table=table, fetched_at=now)
+        except Exception as e:
+            print(f"Bỏ qua bảng {table} khi dựng chỉ mục độ mới: {e}")
+
+def ensure_freshness(conn):
+    # Tạo chỉ mục độ mới nếu DB chưa có (hoặc còn trống) rồi commit
+    if has_table(conn, FRESHNESS_TABLE) and conn.execute(f"SELECT 1 FROM {FRESHNESS_TABLE} LIMIT 1").fetchone():
+        return
+    with conn:
+        rebuild_freshness(conn)
+
+def freshness_times(conn, symbols=None):
+    # Phiên gần nhất đã lưu của từng mã theo chỉ mục độ mới: {symbol: Timestamp}
+    condition, params = symbol_filter(symbols)
+    rows = conn.execute(
+        f"SELECT symbol, last_time FROM {FRESHNESS_TABLE} WHERE last_time IS NOT NULL{condition}", params).fetchall()
+    return {symbol: from_epoch(t) for symbol, t in rows}
+
+def freshness_state(conn, symbols=None):
+    # {symbol: [last_time, row_count, fetched_at]} theo chỉ mục độ mới, dùng để đối chiếu các bản sao dữ liệu (bộ đệm)
+    condition, params = symbol_filter(symbols)
+    rows = conn.execute(
+        f"SELECT symbol, last_time, row_count, fetched_at FROM {FRESHNESS_TABLE} WHERE 1 = 1{condition}", params)
+    return {symbol: [last_time, row_count, fetched_at] for symbol, last_time, row_count, fetched_at in rows}
+
+def stale_symbols(conn, symbols, max_age_days=1, now=None):
+    # Các mã cần tải lại trong một truy vấn: chưa có dữ liệu hoặc phiên gần nhất cũ hơn max_age_days ngày.
+    # Giữ nguyên thứ tự của symbols.
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    cutoff = int(to_epoch([now - pd.Timedelta(days=max_age_days)])[0])
+    rows = conn.execute(
+        f"SELECT s.value FROM json_each(?) AS s LEFT JOIN {FRESHNESS_TABLE} AS f ON f.symbol = s.value "
+        "WHERE f.last_time IS NULL OR f.last_time <= ? ORDER BY s.key",
+        (json.dumps(list(symbols)), cutoff)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+def last_update_time(conn):
+    # Phiên mới nhất trong toàn bộ DB theo chỉ mục độ mới (Timestamp) hoặc None
+    row = conn.execute(f"SELECT MAX(last_time) FROM {FRESHNESS_TABLE}").fetchone()
+    return from_epoch([row[0]])[0] if row and row[0] is not None else None
+
+# ### Đọc dữ liệu
+def read_symbol(conn, symbol, start=None, end=None, columns=OHLCV_COLUMNS):
+    # Lát cắt theo mã: toàn bộ (hoặc một khoảng thời gian) lịch sử của một mã, tăng dần theo time
+    query = f"SELECT time, {', '.join(columns)} FROM ohlcv WHERE symbol = ?"
+    params = [symbol]
+    if start is not None:
+        query += " AND time >= ?"
+        params.append(int(to_epoch([start])[0]))
+    if end is not None:
+        query += " AND time <= ?"
+        params.append(int(to_epoch([end])[0]))
+    df = pd.read_sql_query(query + " ORDER BY time ASC", conn, params=params)
+    df['time'] = from_epoch(df['time'])
+    return df
+
+def read_cross_section(conn, date, symbols=None, columns=OHLCV_COLUMNS):
+    # Lát cắt ngang: dữ liệu của mọi mã trong ngày date, dùng chỉ mục (time, symbol, ...)
+    day_start = int(to_epoch([pd.Timestamp(date).normalize()])[0])
+    condition, params = symbol_filter(symbols)
+    query = (f"SELECT symbol, {', '.join(columns)} FROM ohlcv "
+             f"WHERE time >= ? AND time < ?{condition} ORDER BY symbol")
+    df = pd.read_sql_query(query, conn, params=[day_start, day_start + 86400] + params)
+    return df.set_index('symbol')
+
+def read_panel(conn, symbols=None, columns=OHLCV_COLUMNS, since=None, last_n=None):
+    # Đọc dữ liệu của nhiều mã trong một truy vấn, trả về bảng dài sắp xếp theo (symbol, time).
+    # last_n giới hạn số phiên gần nhất của mỗi mã.
+    condition, params = symbol_filter(symbols)
+    if since is not None:
+        condition += " AND time >= ?"
+        params.append(int(to_epoch([since])[0]))
+    select = ', '.join(['symbol', 'time'] + list(columns))
+    if last_n is None:
+        query = f"SELECT {select} FROM ohlcv WHERE 1 = 1{condition} ORDER BY symbol, time"
+    else:
+        query = (f"SELECT {select} FROM ("
+                 f"SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY time DESC) AS rn "
+                 f"FROM ohlcv WHERE 1 = 1{condition}) WHERE rn <= ? ORDER BY symbol, time")
+        params.append(int(last_n))
+    df = pd.read_sql_query(query, conn, params=params)
+    df['time'] = from_epoch(df['time'])
+    return df
+
+def latest_closes(conn, symbols=None):
+    # Giá đóng cửa của phiên gần nhất cho từng mã (SQLite lấy close từ đúng dòng có MAX(time))
+    condition, params = symbol_filter(symbols)
+    rows = conn.execute(
+        f"SELECT symbol, close, MAX(time) FROM ohlcv WHERE 1 = 1{condition} GROUP BY symbol", params
+    ).fetchall()
+    return {symbol: close for symbol, close, _ in rows}
+
+def latest_times(conn, symbols=None):
+    # Thời điểm phiên gần nhất của từng mã trong một truy vấn: {symbol: Timestamp}
+    condition, params = symbol_filter(symbols)
+    rows = conn.execute(f"SELECT symbol, MAX(time) FROM ohlcv WHERE 1 = 1{condition} GROUP BY symbol", params).fetchall()
+    return {symbol: from_epoch(t) for symbol, t in rows}
+
+def latest_time(conn, symbol):
+    row = conn.execute("SELECT MAX(time) FROM ohlcv WHERE symbol = ?", (symbol,)).fetchone()
+    return from_epoch(row[0]) if row and row[0] is not None else None
+
+# ### Thành viên danh sách
+def write_group_members(conn, group_name, symbols):
+    # Thay toàn bộ thành viên của một nhóm (không commit)
+    # Tạo bảng bằng execute từng câu lệnh (executescript sẽ commit giao dịch đang mở)
+    for statement in filter(str.strip, MEMBERSHIP_SCHEMA.split(';')):
+        conn.execute(statement)
+    conn.execute(f"DELETE FROM {MEMBERSHIP_TABLE} WHERE group_name = ?", (group_name,))
+    conn.executemany(f"INSERT OR IGNORE INTO {MEMBERSHIP_TABLE} (group_name, symbol) VALUES (?, ?)",
+                     [(group_name, symbol) for symbol in symbols])
+
+def read_group_members(conn, group_name):
+    # Danh sách mã của một nhóm, hoặc None nếu DB chưa có thông tin thành viên của nhóm này
+    if not has_table(conn, MEMBERSHIP_TABLE):
+        return None
+    rows = conn.execute(f"SELECT symbol FROM {MEMBERSHIP_TABLE} WHERE group_name = ? ORDER BY symbol",
+                        (group_name,)).fetchall()
+    return [row[0] for row in rows] or None
+
+def symbol_groups(conn, symbols=None):
+    # Ánh xạ ngược: {symbol: [các nhóm chứa mã]}
+    if not has_table(conn, MEMBERSHIP_TABLE):
+        return {}
+    condition, params = symbol_filter(symbols)
+    groups = {}
+    for symbol, group_name in conn.execute(
+            f"SELECT symbol, group_name FROM {MEMBERSHIP_TABLE} WHERE 1 = 1{condition} ORDER BY symbol, group_name",
+            params):
+        groups.setdefault(symbol, []).append(group_name)
+    return groups
+
+def export_symbols(src_db_path, dst_db_path, symbols):
+    # Xuất dữ liệu của một danh sách mã sang file DB riêng (cùng cấu trúc với DB nguồn).
+    # Dữ liệu được sao chép bằng ATTACH + INSERT ... SELECT ngay trong SQLite, không đi qua pandas.
+    if has_store(src_db_path):
+        dst = connect(dst_db_path)
+    else:
+        dst = sqlite3.connect(dst_db_path)
+    dst.execute("ATTACH DATABASE ? AS src", (src_db_path,))
+    exported = 0
+    try:
+        with dst:
+            if has_table(dst, 'ohlcv'):
+                condition, params = symbol_filter(symbols)
+                dst.execute("DELETE FROM main.ohlcv")
+                exported = dst.execute(
+                    f"INSERT INTO main.ohlcv SELECT * FROM src.ohlcv WHERE 1 = 1{condition}", params).rowcount
+            else:
+                available = set(row[0] for row in dst.execute("SELECT name FROM src.sqlite_master WHERE type='table'"))
+                for symbol in symbols:
+                    if symbol not in available:
+                        print(f"Không tìm thấy dữ liệu cho {symbol} trong {src_db_path}.")
+                        continue
+                    dst.execute(f'DROP TABLE IF EXISTS main."{symbol}"')
+                    dst.execute(f'CREATE TABLE main."{symbol}" AS SELECT * FROM src."{symbol}"')
+                    exported += 1
+            rebuild_freshness(dst)
+    finally:
+        dst.execute("DETACH DATABASE src")
+        dst.close()
+    return exported
+
+# ### Chuyển đổi từ cấu trúc cũ (mỗi mã một bảng)
+def migrate_from_tables(src_db_path, dst_db_path=OHLCV_DB_PATH):
+    if not os.path.exists(src_db_path):
+        print(f"File không tồn tại: {src_db_path}")
+        return 0
+    src = sqlite3.connect(src_db_path)
+    tables = symbol_tables(src)
+    dst = connect(dst_db_path)
+    migrated = 0
+    with dst:
+        for symbol in tables:
+            try:
+                df = pd.read_sql_query(f"SELECT time, {', '.join(OHLCV_COLUMNS)} FROM {symbol}", src)
+                write_bars(dst, symbol, df, replace=True)
+                migrated += 1
+            except Exception as e:
+                print(f"Bỏ qua bảng {symbol}: {e}")
+        rebuild_freshness(dst)
+    src.close()
+    dst.close()
+    print(f"Đã chuyển {migrated}/{len(tables)} mã từ {src_db_path} sang {dst_db_path}")
+    return migrated
+
+if __name__ == "__main__":
+    # python ohlcv_store.py [DB_nguồn] [DB_đích]
+    src_path = sys.argv[1] if len(sys.argv) > 1 else LEGACY_DB_PATH
+    dst_path = sys.argv[2] if len(sys.argv) > 2 else OHLCV_DB_PATH
+    migrate_from_tables(src_path, dst_path)
@@ -0,0 +1,271 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+# Phân tích dòng tiền khớp lệnh trong phiên, không phụ thuộc thư viện vẽ (dùng được trong các tác vụ chạy nền):
+#   result = orderflow.compute(ticks, 'ACB')
+#   result.minutes['cum_net_flow'], result.summary, result.outliers, result.net_flow_matrix
+# ticks là bảng khớp lệnh (cột time, price, volume, match_type) như data_source.intraday trả về,
+# hoặc dict các mảng cùng tên cột. Vẽ biểu đồ từ kết quả: bsgit.render_order_flow(result).
+
+def format_currency(value):
+    """Định dạng số tiền với dấu chấm phân tách hàng nghìn"""
+    return "{:,.0f}".format(value).replace(",", ".")
+
+# Mã phía lệnh (int8): 0 = loại khác (ATO/ATC...), 1 = mua, 2 = bán, 3 = không có loại lệnh
+SIDE_OTHER, SIDE_BUY, SIDE_SELL, SIDE_MISSING = 0, 1, 2, 3
+
+def side_codes(match_type):
+    # Cột match_type ('Buy' / 'Sell' / ...) -> mảng mã phía lệnh
+    match_type = np.asarray(match_type, dtype=object)
+    return np.where(match_type == 'Buy', SIDE_BUY,
+                    np.where(match_type == 'Sell', SIDE_SELL,
+                             np.where(pd.isna(match_type), SIDE_MISSING, SIDE_OTHER))).astype(np.int8)
+
+def minute_sums(times, side, price, volume):
+    # Mỗi lệnh được gán một khóa (chỉ số phút, phía lệnh theo side_codes); số lệnh, khối lượng và giá trị
+    # theo từng khóa được cộng bằng np.bincount thay vì lọc mua/bán và resample nhiều lần.
+    # Trả về (phút đầu tính từ epoch, counts, volumes, values), mỗi mảng có dạng [số phút, 4 phía lệnh]
+    minutes = times.astype('datetime64[m]').astype(np.int64)
+    start = minutes.min()
+    n_minutes = int(minutes.max() - start) + 1
+    key = (minutes - start) * 4 + side
+    volume_values = np.nan_to_num(volume.astype('float64'))
+    trade_values = np.nan_to_num(price.astype('float64') * volume)
+    counts = np.bincount(key, minlength=n_minutes * 4).reshape(n_minutes, 4)
+    volumes = np.bincount(key, weights=volume_values, minlength=n_minutes * 4).reshape(n_minutes, 4)
+    values = np.bincount(key, weights=trade_values, minlength=n_minutes * 4).reshape(n_minutes, 4)
+    return start, counts, volumes, values
+
+def minute_frame(start, counts, volumes, values, volume_dtype=None):
+    # Bảng theo phút (các cột dòng tiền, số lệnh, trung bình và lũy kế) từ các tổng của minute_sums
+    n_minutes = len(counts)
+    in_flow = values[:, SIDE_BUY]
+    out_flow = values[:, SIDE_SELL]
+    net_flow = in_flow - out_flow
+    buy_count = counts[:, SIDE_BUY]
+    sell_count = counts[:, SIDE_SELL]
+    total_volume = volumes.sum(axis=1)
+    if volume_dtype is not None and np.issubdtype(volume_dtype, np.integer):
+        total_volume = total_volume.astype(volume_dtype)
+    avg_buy_volume = np.divide(volumes[:, SIDE_BUY], buy_count, out=np.zeros(n_minutes), where=buy_count != 0)
+    avg_sell_volume = np.divide(volumes[:, SIDE_SELL], sell_count, out=np.zeros(n_minutes), where=sell_count != 0)
+    # Tỷ lệ khối lượng trung bình lệnh mua/bán (inf khi phút không có lệnh bán)
+    avg_buy_sell_ratio = np.divide(avg_buy_volume, avg_sell_volume, out=np.full(n_minutes, np.inf),
+                                   where=avg_sell_volume != 0)
+
+    index = pd.date_range(np.datetime64(int(start), 'm'), periods=n_minutes, freq='min', name='time')
+    return pd.DataFrame({
+        'in_flow': in_flow,
+        'out_flow': out_flow,
+        'volume': total_volume,
+        'order_count': counts[:, :SIDE_MISSING].sum(axis=1),
+        'net_flow': net_flow,
+        'cum_net_flow': net_flow.cumsum(),
+        'buy_count': buy_count,
+        'sell_count': sell_count,
+        'cum_buy': buy_count.cumsum(),
+        'cum_sell': sell_count.cumsum(),
+        'cum_in_flow': in_flow.cumsum(),
+        'cum_out_flow': out_flow.cumsum(),
+        'avg_buy_volume': avg_buy_volume,
+        'avg_sell_volume': avg_sell_volume,
+        'avg_buy_sell_ratio': avg_buy_sell_ratio,
+    }, index=index)
+
+def minute_kernel(times, side, price, volume):
+    """Tổng hợp các lệnh khớp theo phút trong một lượt: trả về bảng theo phút (mọi phút từ lệnh đầu đến lệnh cuối)"""
+    return minute_frame(*minute_sums(times, side, price, volume), volume_dtype=volume.dtype)
+
+class OrderFlowState:
+    """Các tổng theo phút của một mã, cộng dồn từng đợt lệnh mới thay vì tổng hợp lại cả phiên"""
+
+    def __init__(self):
+        self.start = None
+        self.counts = np.zeros((0, 4), dtype=np.int64)
+        self.volumes = np.zeros((0, 4))
+        self.values = np.zeros((0, 4))
+        self.volume_dtype = None
+        self.n_ticks = 0
+
+    def _extend(self, first, last):
+        # Mở rộng các mảng để chứa các phút [first, last] (phút mới thường nằm ở cuối)
+        if self.start is None:
+            self.start = first
+        before = max(0, int(self.start - first))
+        after = max(0, int(last - self.start) + 1 - len(self.counts))
+        if before or after:
+            pad = ((before, after), (0, 0))
+            self.counts = np.pad(self.counts, pad)
+            self.volumes = np.pad(self.volumes, pad)
+            self.values = np.pad(self.values, pad)
+            self.start -= before
+
+    def update(self, times, side, price, volume):
+        # Cộng một đợt lệnh (mảng như tick_arrays): chi phí theo số lệnh mới, không theo độ dài phiên
+        if len(times) == 0:
+            return
+        first, counts, volumes, values = minute_sums(times, side, price, volume)
+        self._extend(first, first + len(counts) - 1)
+        offset = int(first - self.start)
+        rows = slice(offset, offset + len(counts))
+        self.counts[rows] += counts
+        self.volumes[rows] += volumes
+        self.values[rows] += values
+        self.volume_dtype = self.volume_dtype or volume.dtype
+        self.n_ticks += len(times)
+
+    def minutes(self):
+        # Bảng theo phút như minute_kernel của mọi lệnh đã cộng (các cột lũy kế tính lại trên vài trăm phút)
+        if self.start is None:
+            return minute_frame(0, self.counts, self.volumes, self.values).iloc[:0]
+        return minute_frame(self.start, self.counts, self.volumes, self.values, self.volume_dtype)
+
+def minute_ratios(minutes):
+    # Theo từng phút: tỷ lệ dòng tiền vào/ra (imbalance) và số lệnh / khối lượng, 0 khi mẫu số bằng 0
+    imbalance_ratio = np.divide(minutes['in_flow'].to_numpy(), minutes['out_flow'].to_numpy(),
+                                out=np.zeros(len(minutes)), where=minutes['out_flow'].to_numpy() != 0)
+    volume = minutes['volume'].to_numpy(dtype='float64')
+    order_to_volume_ratio = np.divide(minutes['order_count'].to_numpy(dtype='float64'), volume,
+                                      out=np.zeros(len(minutes)), where=volume != 0)
+    return imbalance_ratio, order_to_volume_ratio
+
+def span_mean(values, *counts):
+    # Trung bình trong khoảng từ phút đầu đến phút cuối có lệnh (giao các khoảng nếu nhiều loại lệnh),
+    # như khi resample riêng lệnh mua/bán: phút ngoài khoảng không tính, phút trống bên trong tính là 0
+    first, last = 0, len(values) - 1
+    for count in counts:
+        minutes = np.flatnonzero(count)
+        if len(minutes) == 0:
+            return np.nan
+        first, last = max(first, minutes[0]), min(last, minutes[-1])
+    if first > last:
+        return np.nan
+    return np.mean(values[first:last + 1])
+
+def utc_times(times):
+    # Cột thời gian khớp lệnh -> DatetimeIndex theo UTC không kèm múi giờ
+    times = pd.DatetimeIndex(times)
+    if times.tz is not None:
+        times = times.tz_convert('UTC').tz_localize(None)
+    return times
+
+def aggregate_intraday(data):
+    """Tổng hợp dữ liệu khớp lệnh trong phiên theo phút: trả về (df theo từng lệnh, bảng theo phút, tóm tắt)"""
+    # Xử lý dữ liệu
+    df = data.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df['time']):
+        df['time'] = pd.to_datetime(df['time'])
+    
+    # Chuyển đổi múi giờ sang UTC
+    if df['time'].dt.tz is not None:
+        df['time'] = df['time'].dt.tz_convert('UTC').dt.tz_localize(None)
+    
+    # Dòng tiền theo từng lệnh (dùng cho heatmap giá x thời gian)
+    side = side_codes(df['match_type'])
+    df['value'] = df['price'] * df['volume']
+    df['in_flow'] = np.where(side == SIDE_BUY, df['value'], 0)
+    df['out_flow'] = np.where(side == SIDE_SELL, df['value'], 0)
+    df.set_index('time', inplace=True)
+    
+    # Tổng hợp theo phút trong một lượt
+    resampled = minute_kernel(df.index.to_numpy(), side, df['price'].to_numpy(), df['volume'].to_numpy())
+
+    # Tính toán các chỉ số phân tích
+    volatility = df['price'].std()
+    imbalance_ratio, order_to_volume_ratio = minute_ratios(resampled)
+    buy_count = resampled['buy_count'].to_numpy()
+    sell_count = resampled['sell_count'].to_numpy()
+
+    # Phần tóm tắt với định dạng tiền tệ có dấu chấm
+    summary = {
+        'Tổng dòng tiền vào (VND)': format_currency(resampled['in_flow'].sum()),
+        'Tổng dòng tiền ra (VND)': format_currency(resampled['out_flow'].sum()),
+        'Dòng tiền ròng (VND)': format_currency(resampled['net_flow'].sum()),
+        'Tổng số lệnh mua': int(resampled['buy_count'].sum()),
+        'Tổng số lệnh bán': int(resampled['sell_count'].sum()),
+        'Khối lượng trung bình lệnh mua': span_mean(resampled['avg_buy_volume'].to_numpy(), buy_count),
+        'Khối lượng trung bình lệnh bán': span_mean(resampled['avg_sell_volume'].to_numpy(), sell_count),
+        'Tỷ lệ khối lượng trung bình mua/bán': span_mean(resampled['avg_buy_sell_ratio'].replace(np.inf, 0).to_numpy(),
+                                                       buy_count, sell_count),
+        'Giá cao nhất': df['price'].max(),
+        'Giá thấp nhất': df['price'].min(),
+        'Giá trung bình': df['price'].mean(),
+        'Volatility (Độ lệch chuẩn giá)': volatility,
+        'Imbalance Ratio (Trung bình)': np.mean(imbalance_ratio),
+        'Order-to-Volume Ratio (Trung bình)': np.mean(order_to_volume_ratio)
+    }
+    return df, resampled, summary
+
+def iqr_outliers(minutes, column='net_flow', k=1.5):
+    # Các phút có giá trị nằm ngoài [Q1 - k*IQR, Q3 + k*IQR]
+    q1 = minutes[column].quantile(0.25)
+    q3 = minutes[column].quantile(0.75)
+    iqr = q3 - q1
+    return minutes[(minutes[column] > q3 + k * iqr) | (minutes[column] < q1 - k * iqr)]
+
+def net_flow_matrix(df):
+    # Dòng tiền ròng theo phút x mức giá (làm tròn 2 chữ số), 0 ở các ô không có lệnh;
+    # chỉ các phút và mức giá có lệnh khớp
+    prices = np.round(df['price'].to_numpy(dtype='float64'), 2)
+    valid = ~np.isnan(prices)
+    minutes = df.index.to_numpy().astype('datetime64[m]')[valid]
+    net_flow = (df['in_flow'].to_numpy() - df['out_flow'].to_numpy())[valid]
+    minute_values, minute_codes = np.unique(minutes, return_inverse=True)
+    price_values, price_codes = np.unique(prices[valid], return_inverse=True)
+    matrix = np.bincount(minute_codes * len(price_values) + price_codes, weights=net_flow,
+                         minlength=len(minute_values) * len(price_values))
+    return pd.DataFrame(matrix.reshape(len(minute_values), len(price_values)),
+                        index=pd.DatetimeIndex(minute_values.astype('datetime64[ns]'), name='time'),
+                        columns=pd.Index(price_values, name='price'))
+
+@dataclass
+class OrderFlowResult:
+    """Kết quả phân tích dòng tiền trong phiên của một mã"""
+    symbol: str
+    ticks: pd.DataFrame            # từng lệnh khớp (chỉ mục thời gian UTC), thêm cột value, in_flow, out_flow
+    minutes: pd.DataFrame          # bảng theo phút của minute_kernel
+    summary: dict                  # các chỉ số tóm tắt của phiên
+    outliers: pd.DataFrame = None         # các phút có dòng tiền ròng đột biến (IQR)
+    net_flow_matrix: pd.DataFrame = None  # dòng tiền ròng phút x giá
+
+def compute(ticks, symbol=''):
+    """Phân tích dòng tiền từ bảng khớp lệnh: trả về OrderFlowResult"""
+    if not isinstance(ticks, pd.DataFrame):
+        ticks = pd.DataFrame(ticks)
+    if ticks.empty:
+        raise ValueError(f"Dữ liệu khớp lệnh trống cho mã {symbol}")
+    df, minutes, summary = aggregate_intraday(ticks)
+    return OrderFlowResult(symbol=symbol, ticks=df, minutes=minutes, summary=summary,
+                           outliers=iqr_outliers(minutes), net_flow_matrix=net_flow_matrix(df))
+
+def tick_arrays(ticks):
+    # Bảng khớp lệnh -> (thời gian UTC datetime64[ns], mã phía lệnh int8, giá, khối lượng): gọn để gửi sang
+    # tiến trình con hơn DataFrame có cột chuỗi
+    return (utc_times(ticks['time']).to_numpy(), side_codes(ticks['match_type']),
+            ticks['price'].to_numpy(), ticks['volume'].to_numpy())
+
+def scan_metrics(times, side, price, volume):
+    """Các chỉ số xếp hạng dòng tiền của một mã trong phiên (không dựng bảng từng lệnh và ma trận giá)"""
+    minutes = minute_kernel(times, side, price, volume)
+    imbalance_ratio, order_to_volume_ratio = minute_ratios(minutes)
+    outliers = iqr_outliers(minutes)
+    in_flow = minutes['in_flow'].sum()
+    out_flow = minutes['out_flow'].sum()
+    last = np.argmax(times)
+    return {
+        'net_flow': in_flow - out_flow,
+        'in_flow': in_flow,
+        'out_flow': out_flow,
+        # Dòng tiền ròng trên tổng giá trị mua + bán (-1..1), so sánh được giữa mã lớn và mã nhỏ
+        'net_flow_share': (in_flow - out_flow) / (in_flow + out_flow) if in_flow + out_flow else 0.0,
+        'imbalance_ratio': imbalance_ratio.mean(),
+        'order_to_volume_ratio': order_to_volume_ratio.mean(),
+        'outlier_minutes': len(outliers),
+        'last_outlier': outliers.index.max() if len(outliers) else pd.NaT,
+        'last_outlier_net_flow': outliers['net_flow'].iloc[-1] if len(outliers) else np.nan,
+        'price': price[last],
+        'volume': minutes['volume'].sum(),
+        'ticks': len(times),
+        'last_time': pd.Timestamp(times[last]),
+    }
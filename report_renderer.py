@@ -0,0 +1,84 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Đầu ra của các biểu đồ: mặc định hiển thị như trước (fig.show()/plt.show()); sau khi gọi
+# configure(output_dir) thì mọi biểu đồ được ghi ra file (HTML cho Plotly, PNG/SVG cho Matplotlib)
+# mà không cần màn hình. render_parallel chạy các hàm vẽ độc lập trong các tiến trình con.
+
+# Template Plotly dựng sẵn một lần cho mỗi tiến trình (giống template 'plotly' mặc định) và đặt làm mặc định,
+# các biểu đồ dùng chung đối tượng này thay vì nạp và kiểm tra lại template mỗi lần tạo figure
+TEMPLATE_NAME = 'vietnamintraday'
+pio.templates[TEMPLATE_NAME] = go.layout.Template(pio.templates['plotly'])
+pio.templates.default = TEMPLATE_NAME
+
+_settings = {'output_dir': None, 'image_format': 'png'}
+
+def configure(output_dir=None, image_format='png'):
+    # output_dir=None: hiển thị tương tác; ngược lại ghi biểu đồ vào output_dir
+    _settings['output_dir'] = output_dir
+    _settings['image_format'] = image_format
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        import matplotlib.pyplot as plt
+        plt.switch_backend('Agg')
+
+def is_headless():
+    return _settings['output_dir'] is not None
+
+def _file_name(name, extension):
+    # Tên file an toàn từ tên biểu đồ (giữ chữ có dấu, thay ký tự đặc biệt bằng '_')
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') + '.' + extension
+
+def emit(fig, name):
+    # Hiển thị hoặc ghi một biểu đồ Plotly (go.Figure) hay Matplotlib (matplotlib.figure.Figure).
+    # Trả về đường dẫn file đã ghi (None nếu hiển thị tương tác).
+    output_dir = _settings['output_dir']
+    if isinstance(fig, go.Figure):
+        if output_dir is None:
+            fig.show()
+            return None
+        path = os.path.join(output_dir, _file_name(name, 'html'))
+        # 'directory': mọi file HTML dùng chung một plotly.min.js trong output_dir thay vì nhúng ~3 MB vào từng file
+        fig.write_html(path, include_plotlyjs='directory')
+        return path
+
+    import matplotlib.pyplot as plt
+    if output_dir is None:
+        plt.show()
+        return None
+    path = os.path.join(output_dir, _file_name(name, _settings['image_format']))
+    fig.savefig(path, format=_settings['image_format'], bbox_inches='tight')
+    plt.close(fig)
+    return path
+
+def _render_job(settings, func, args, kwargs):
+    # Chạy trong tiến trình con: áp dụng cấu hình đầu ra của tiến trình cha rồi gọi hàm vẽ
+    configure(**settings)
+    return func(*args, **kwargs)
+
+def render_parallel(jobs, output_dir=None, image_format=None, max_workers=None):
+    # jobs: danh sách (hàm vẽ, args) hoặc (hàm vẽ, args, kwargs); mỗi hàm vẽ gọi emit() cho các biểu đồ của nó.
+    # Các job được chạy song song trong các tiến trình con và luôn ở chế độ ghi file.
+    settings = {'output_dir': output_dir or _settings['output_dir'],
+                'image_format': image_format or _settings['image_format']}
+    if settings['output_dir'] is None:
+        raise ValueError("render_parallel cần output_dir (hoặc configure(output_dir) trước)")
+    os.makedirs(settings['output_dir'], exist_ok=True)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for job in jobs:
+            func, args = job[0], job[1]
+            kwargs = job[2] if len(job) > 2 else {}
+            futures[executor.submit(_render_job, settings, func, args, kwargs)] = func.__name__
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Lỗi khi vẽ {futures[future]}: {e}")
+    print(f"Đã ghi {len(futures) - failed}/{len(futures)} nhóm biểu đồ vào {settings['output_dir']}")
+    return failed
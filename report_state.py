@@ -0,0 +1,140 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+import config
+from financial_store import FINANCIALS_DIR, flatten_columns, period_columns
+
+# Trạng thái tải của từng báo cáo (mã, bảng): kỳ gần nhất đã lưu, mã băm nội dung và thời điểm tải / thay đổi.
+# bctc.update_financials dùng để bỏ qua các báo cáo chưa thể có kỳ mới (báo cáo năm chỉ đổi mỗi năm một lần)
+# và không ghi lại các phản hồi giống hệt lần trước.
+REPORT_STATE_DB_PATH = config.get_path('paths', 'report_state_db', os.path.join(FINANCIALS_DIR, 'report_state.db'))
+# Tải lại mọi báo cáo sau max_age_days ngày (để nhận các báo cáo được điều chỉnh / kiểm toán lại);
+# không kiểm tra lại một báo cáo trong recheck_days ngày sau lần tải gần nhất; cổ tức kiểm tra mỗi dividend_days ngày
+MAX_AGE_DAYS = config.get_int('financials', 'max_age_days', 90)
+RECHECK_DAYS = config.get_int('financials', 'recheck_days', 1)
+DIVIDEND_DAYS = config.get_int('financials', 'dividend_days', 7)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_state (
+    symbol TEXT NOT NULL,
+    report TEXT NOT NULL,
+    layout TEXT NOT NULL,
+    last_year INTEGER,
+    last_quarter INTEGER,
+    content_hash TEXT,
+    fetched_at TEXT NOT NULL,
+    changed_at TEXT NOT NULL,
+    PRIMARY KEY (symbol, report)
+);
+"""
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def content_hash(df):
+    # Mã băm của tên cột và toàn bộ giá trị (không phụ thuộc index)
+    df = flatten_columns(df)
+    digest = hashlib.sha1('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    if not df.empty:
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def latest_period(df, period_type):
+    # Kỳ gần nhất (năm, quý) trong một bảng báo cáo; quý = 0 với báo cáo năm
+    df = flatten_columns(df)
+    year_col, quarter_col = period_columns(df.columns)
+    if year_col is None or df.empty:
+        return None, None
+    years = pd.to_numeric(df[year_col], errors='coerce')
+    if period_type == 'quarter' and quarter_col is not None:
+        periods = pd.DataFrame({'year': years, 'quarter': pd.to_numeric(df[quarter_col], errors='coerce')}).dropna()
+        if periods.empty:
+            return None, None
+        year, quarter = periods.sort_values(['year', 'quarter']).iloc[-1]
+        return int(year), int(quarter)
+    return (int(years.max()), 0) if years.notna().any() else (None, None)
+
+def latest_closed_period(period_type, now):
+    # Kỳ báo cáo gần nhất đã kết thúc: năm trước với báo cáo năm, quý vừa kết thúc với báo cáo quý
+    if period_type == 'year':
+        return now.year - 1, 0
+    quarter = (now.month - 1) // 3
+    return (now.year - 1, 4) if quarter == 0 else (now.year, quarter)
+
+def needs_fetch(state, report, layout, now=None):
+    # state: dòng report_state của báo cáo (None nếu chưa từng tải)
+    if state is None or state['layout'] != layout:
+        return True
+    now = now or datetime.now()
+    age = now - datetime.strptime(state['fetched_at'], TIME_FORMAT)
+    if age >= timedelta(days=MAX_AGE_DAYS):
+        return True
+    if report == 'dividends':
+        return age >= timedelta(days=DIVIDEND_DAYS)
+    if age < timedelta(days=RECHECK_DAYS):
+        return False
+    if state['last_year'] is None:
+        return True
+    period_type = report.rpartition('_')[2]
+    return (state['last_year'], state['last_quarter'] or 0) < latest_closed_period(period_type, now)
+
+class ReportState:
+    """Bảng trạng thái tải báo cáo, dùng chung được giữa luồng tải và luồng ghi"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or REPORT_STATE_DB_PATH
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def load(self):
+        # {(mã, bảng): dòng trạng thái}
+        with self.lock:
+            return {(row['symbol'], row['report']): row for row in self.conn.execute("SELECT * FROM report_state")}
+
+    def record(self, symbol, report, layout, df, digest):
+        # Báo cáo vừa được ghi (nội dung mới)
+        year, quarter = latest_period(df, 'year' if report == 'dividends' else report.rpartition('_')[2])
+        now = datetime.now().strftime(TIME_FORMAT)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO report_state
+                    (symbol, report, layout, last_year, last_quarter, content_hash, fetched_at, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (symbol, report, layout, year, quarter, digest, now, now))
+
+    def layout(self, symbol, report):
+        # Nơi lưu của lần ghi gần nhất (store / files), None nếu báo cáo chưa từng được tải
+        with self.lock:
+            row = self.conn.execute("SELECT layout FROM report_state WHERE symbol = ? AND report = ?",
+                                    (symbol, report)).fetchone()
+        return row[0] if row else None
+
+    def relabel(self, old_layout, new_layout):
+        # Dữ liệu đã được chuyển sang nơi lưu khác (ví dụ file DB của từng mã -> kho dạng dài)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE report_state SET layout = ? WHERE layout = ?", (new_layout, old_layout))
+
+    def touch(self, symbol, report):
+        # Đã tải lại nhưng nội dung không đổi: chỉ cập nhật thời điểm tải
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE report_state SET fetched_at = ? WHERE symbol = ? AND report = ?",
+                              (datetime.now().strftime(TIME_FORMAT), symbol, report))
@@ -0,0 +1,170 @@
+import io
+import math
+import numpy as np
+
+class RollingState:
+    """Trạng thái cửa sổ trượt của một mã: bộ đệm vòng cho giá đóng cửa và khối lượng cùng tổng chạy
+    cho từng chu kỳ MA / khối lượng trung bình, để thêm một phiên mới với chi phí O(1).
+
+    Tổng chạy dùng phép cộng có bù sai số (Kahan) như rolling().mean() của pandas và được tính lại từ bộ đệm
+    sau mỗi resync_every phiên. Cửa sổ gồm các giá trị bằng nhau cho trung bình đúng bằng giá trị đó (như
+    pandas), để giá đi ngang không bị coi là trên / dưới MA do sai số làm tròn.
+    Checkpoint (to_bytes/from_bytes) chỉ lưu bộ đệm và số phiên; tổng chạy được dựng lại khi nạp.
+    """
+
+    def __init__(self, ma_periods, roc_periods, volume_periods, resync_every=256):
+        self.ma_periods = list(ma_periods)
+        self.roc_periods = list(roc_periods)
+        self.volume_periods = list(volume_periods)
+        self.resync_every = resync_every
+        # ROC chu kỳ p cần giá của p phiên trước nên bộ đệm giá giữ thêm một phiên
+        self.capacity = max(max(self.ma_periods), max(self.roc_periods) + 1)
+        self.volume_capacity = max(self.volume_periods)
+        self.closes = np.full(self.capacity, np.nan)
+        self.volumes = np.full(self.volume_capacity, np.nan)
+        self.count = 0
+        self.last_time = None
+        self._resync()
+
+    # ### Bộ đệm vòng
+    def _close_ago(self, lag):
+        # Giá đóng cửa của phiên cách phiên cuối lag phiên (lag = 0 là phiên cuối)
+        return self.closes[(self.count - 1 - lag) % self.capacity]
+
+    def _volume_ago(self, lag):
+        return self.volumes[(self.count - 1 - lag) % self.volume_capacity]
+
+    def _same_run(self, buffer):
+        # Số phiên liên tiếp tính từ phiên cuối có cùng giá trị với phiên cuối (tối đa bằng độ dài bộ đệm)
+        capacity = len(buffer)
+        last = buffer[(self.count - 1) % capacity]
+        run = 0
+        while run < min(self.count, capacity) and buffer[(self.count - 1 - run) % capacity] == last:
+            run += 1
+        return run
+
+    def _resync(self):
+        # Tính lại tổng (chính xác, math.fsum) và số giá trị NaN của từng cửa sổ trực tiếp từ bộ đệm
+        self.close_sums, self.close_comps, self.close_nans = {}, {}, {}
+        for period in self.ma_periods:
+            window = np.array([self._close_ago(lag) for lag in range(min(period, self.count))])
+            self.close_sums[period] = math.fsum(window[~np.isnan(window)])
+            self.close_comps[period] = 0.0
+            self.close_nans[period] = int(np.isnan(window).sum())
+        self.volume_sums, self.volume_comps, self.volume_nans = {}, {}, {}
+        for period in self.volume_periods:
+            window = np.array([self._volume_ago(lag) for lag in range(min(period, self.count))])
+            self.volume_sums[period] = math.fsum(window[~np.isnan(window)])
+            self.volume_comps[period] = 0.0
+            self.volume_nans[period] = int(np.isnan(window).sum())
+        self.close_run = self._same_run(self.closes)
+        self.volume_run = self._same_run(self.volumes)
+        self.pushes_since_resync = 0
+
+    @staticmethod
+    def _add(sums, comps, nans, period, value, sign):
+        if np.isnan(value):
+            nans[period] += sign
+            return
+        # Cộng có bù sai số (Kahan)
+        y = sign * value - comps[period]
+        total = sums[period] + y
+        comps[period] = (total - sums[period]) - y
+        sums[period] = total
+
+    @staticmethod
+    def _mean(total, run, last, period):
+        # Cửa sổ gồm các giá trị bằng nhau: trả về đúng giá trị đó thay vì tổng / chu kỳ
+        return last if run >= period else total / period
+
+    # ### Cập nhật
+    def push(self, time, close, volume):
+        # Thêm một phiên mới và trả về các chỉ báo của phiên đó
+        close, volume = float(close), float(volume)
+        for period in self.ma_periods:
+            if self.count >= period:
+                # Phiên rời khỏi cửa sổ: phải đọc trước khi ô của nó có thể bị ghi đè
+                self._add(self.close_sums, self.close_comps, self.close_nans, period, self._close_ago(period - 1), -1)
+            self._add(self.close_sums, self.close_comps, self.close_nans, period, close, 1)
+        for period in self.volume_periods:
+            if self.count >= period:
+                self._add(self.volume_sums, self.volume_comps, self.volume_nans, period,
+                          self._volume_ago(period - 1), -1)
+            self._add(self.volume_sums, self.volume_comps, self.volume_nans, period, volume, 1)
+        self.close_run = self.close_run + 1 if self.count and close == self._close_ago(0) else 1
+        self.volume_run = self.volume_run + 1 if self.count and volume == self._volume_ago(0) else 1
+        self.closes[self.count % self.capacity] = close
+        self.volumes[self.count % self.volume_capacity] = volume
+        self.count += 1
+        self.last_time = time
+        self.pushes_since_resync += 1
+        if self.pushes_since_resync >= self.resync_every:
+            self._resync()
+        return self.indicators()
+
+    def replace_last(self, time, close, volume):
+        # Thay phiên cuối (ví dụ phiên được lưu khi chưa đóng cửa rồi tải lại) và trả về chỉ báo mới
+        if self.count == 0:
+            return self.push(time, close, volume)
+        close, volume = float(close), float(volume)
+        old_close, old_volume = self._close_ago(0), self._volume_ago(0)
+        for period in self.ma_periods:
+            self._add(self.close_sums, self.close_comps, self.close_nans, period, old_close, -1)
+            self._add(self.close_sums, self.close_comps, self.close_nans, period, close, 1)
+        for period in self.volume_periods:
+            self._add(self.volume_sums, self.volume_comps, self.volume_nans, period, old_volume, -1)
+            self._add(self.volume_sums, self.volume_comps, self.volume_nans, period, volume, 1)
+        self.closes[(self.count - 1) % self.capacity] = close
+        self.volumes[(self.count - 1) % self.volume_capacity] = volume
+        self.close_run = self._same_run(self.closes)
+        self.volume_run = self._same_run(self.volumes)
+        self.last_time = time
+        return self.indicators()
+
+    def indicators(self):
+        # Chỉ báo của phiên cuối: {'close', 'volume', 'ma<p>', 'roc<p>', 'avgvol<p>'}; thiếu dữ liệu là NaN
+        if self.count == 0:
+            return None
+        close = self._close_ago(0)
+        row = {'close': close, 'volume': self._volume_ago(0)}
+        for period in self.ma_periods:
+            full = self.count >= period and self.close_nans[period] == 0
+            row[f'ma{period}'] = self._mean(self.close_sums[period], self.close_run, close, period) if full else np.nan
+        for period in self.roc_periods:
+            past = self._close_ago(period) if self.count > period else np.nan
+            with np.errstate(divide='ignore', invalid='ignore'):
+                row[f'roc{period}'] = (close - past) / past * 100
+        for period in self.volume_periods:
+            full = self.count >= period and self.volume_nans[period] == 0
+            row[f'avgvol{period}'] = (self._mean(self.volume_sums[period], self.volume_run, row['volume'], period)
+                                      if full else np.nan)
+        return row
+
+    # ### Khởi tạo và checkpoint
+    @classmethod
+    def from_history(cls, times, closes, volumes, ma_periods, roc_periods, volume_periods):
+        # Dựng trạng thái từ lịch sử: chỉ cần đẩy phần đuôi dài bằng bộ đệm (đủ cho chu kỳ lớn nhất)
+        state = cls(ma_periods, roc_periods, volume_periods)
+        start = max(0, len(closes) - state.capacity)
+        for time, close, volume in zip(times[start:], closes[start:], volumes[start:]):
+            state.push(time, close, volume)
+        return state
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, closes=self.closes, volumes=self.volumes,
+                 count=self.count, last_time=-1 if self.last_time is None else self.last_time,
+                 ma_periods=self.ma_periods, roc_periods=self.roc_periods, volume_periods=self.volume_periods)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        arrays = np.load(io.BytesIO(data))
+        state = cls(arrays['ma_periods'].tolist(), arrays['roc_periods'].tolist(), arrays['volume_periods'].tolist())
+        state.closes = arrays['closes'].copy()
+        state.volumes = arrays['volumes'].copy()
+        state.count = int(arrays['count'])
+        last_time = int(arrays['last_time'])
+        state.last_time = None if last_time == -1 else last_time
+        state._resync()
+        return state
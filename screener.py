@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+import financial_store
+
+# Lọc cổ phiếu theo chỉ tiêu tài chính trên toàn bộ các mã HOSE + HNX, ví dụ
+# "ROE > 15% trong 4 quý gần nhất, sắp xếp theo tăng trưởng doanh thu":
+#   s = Screener()
+#   roe = s.last('ROE (%)', 'ratios', 'quarter', n=4)
+#   growth = s.growth('Doanh thu thuần', 'income_statement', 'quarter', lag=4)
+#   s.screen([(roe > 0.15).all(axis=1)], sort_by=growth.rename('Tăng trưởng doanh thu'))
+# Mỗi chỉ tiêu được đọc một lần thành bảng mã x kỳ và giữ trong bộ nhớ cho các lần lọc sau.
+# Dữ liệu lấy từ kho financial_store nếu đã có; ngược lại các bảng báo cáo trong file DB của từng mã
+# (do bctc.update_financials ghi) được nạp một lần vào một kho tạm trong bộ nhớ.
+
+OPERATORS = {
+    '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+
+def last_values(panel, n):
+    # n giá trị có dữ liệu gần nhất của mỗi mã (cũ -> mới, thiếu thì NaN): các mã công bố báo cáo
+    # vào những thời điểm khác nhau nên kỳ gần nhất được tính theo từng mã
+    values = panel.to_numpy(dtype='float64')
+    valid = ~np.isnan(values)
+    rank_from_end = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+    out = np.full((len(values), n), np.nan)
+    for k in range(1, n + 1):
+        rows, cols = np.nonzero(valid & (rank_from_end == k))
+        out[rows, n - k] = values[rows, cols]
+    return pd.DataFrame(out, index=panel.index, columns=[f"t-{n - 1 - i}" for i in range(n)])
+
+class Screener:
+    """Bộ lọc cổ phiếu theo chỉ tiêu tài chính với bộ nhớ đệm các cột đã đọc"""
+
+    def __init__(self, db_path=None, data_dir=None):
+        self.db_path = db_path or financial_store.FINANCIALS_DB_PATH
+        self.data_dir = data_dir or financial_store.LEGACY_DATA_DIR
+        self.cache = {}
+        self.memory = None
+        self.loaded_tables = set()
+        self.version = None
+
+    # ### Nguồn dữ liệu
+    def _store_version(self):
+        # Thời điểm sửa của kho (kể cả file WAL): đổi thì bỏ các cột đã đệm
+        paths = [self.db_path, self.db_path + '-wal']
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+    def _connection(self, statement, period_type):
+        if financial_store.has_store(self.db_path):
+            version = self._store_version()
+            if version != self.version:
+                self.cache.clear()
+                self.version = version
+            return sqlite3.connect(self.db_path), True
+        # Chưa có kho: nạp bảng báo cáo (statement, period_type) của mọi file vào kho trong bộ nhớ một lần
+        if self.memory is None:
+            self.memory = sqlite3.connect(':memory:')
+            self.memory.executescript(financial_store.SCHEMA)
+        statements = [statement] if statement is not None else financial_store.STATEMENTS
+        for name in statements:
+            if (name, period_type) not in self.loaded_tables:
+                self._load_files(name, period_type)
+                self.loaded_tables.add((name, period_type))
+        return self.memory, False
+
+    def _load_files(self, statement, period_type):
+        table_name = f"{statement}_{period_type}"
+        if not os.path.isdir(self.data_dir):
+            print(f"Không tìm thấy kho {self.db_path} hay thư mục {self.data_dir}")
+            return
+        with self.memory:
+            for exchange in sorted(os.listdir(self.data_dir)):
+                folder = os.path.join(self.data_dir, exchange, period_type)
+                if not os.path.isdir(folder):
+                    continue
+                for name in sorted(os.listdir(folder)):
+                    if not name.endswith('.db'):
+                        continue
+                    conn = sqlite3.connect(os.path.join(folder, name))
+                    try:
+                        df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+                        financial_store.write_report(self.memory, name[:-3], table_name, df, exchange)
+                    except Exception:
+                        # Mã chưa có bảng này (chưa tải hoặc tải lỗi)
+                        pass
+                    finally:
+                        conn.close()
+
+    # ### Đọc chỉ tiêu
+    def panel(self, item, statement=None, period_type='year'):
+        # Bảng mã x kỳ (cột (năm, quý) tăng dần) của một chỉ tiêu, đọc một lần rồi giữ trong bộ nhớ đệm
+        conn, owned = self._connection(statement, period_type)
+        key = (item, statement, period_type)
+        try:
+            panel = self.cache.get(key)
+            if panel is None:
+                df = financial_store.read_item(conn, item, statement, period_type)
+                if df.empty:
+                    print(f"Không có dữ liệu cho chỉ tiêu '{item}' ({statement or 'mọi báo cáo'}, {period_type})")
+                panel = df.pivot_table(index='symbol', columns=['year', 'quarter'], values='value', aggfunc='first')
+                self.cache[key] = panel.sort_index(axis=1)
+        finally:
+            if owned:
+                conn.close()
+        return self.cache[key]
+
+    def last(self, item, statement=None, period_type='year', n=1):
+        # n giá trị gần nhất của mỗi mã (cột t-(n-1) ... t-0)
+        return last_values(self.panel(item, statement, period_type), n)
+
+    def value(self, item, statement=None, period_type='year'):
+        # Giá trị kỳ gần nhất của mỗi mã
+        return self.last(item, statement, period_type, 1)['t-0'].rename(item)
+
+    def growth(self, item, statement=None, period_type='year', lag=1):
+        # Tăng trưởng của kỳ gần nhất so với lag kỳ trước (lag=4 với báo cáo quý: cùng kỳ năm trước);
+        # NaN khi kỳ gốc không dương
+        values = self.last(item, statement, period_type, lag + 1)
+        base = values.iloc[:, 0]
+        return (values.iloc[:, -1] / base.where(base > 0) - 1).rename(f"Tăng trưởng {item}")
+
+    def universe(self):
+        # Mọi mã có báo cáo trong các chỉ tiêu đã đọc
+        index = pd.Index([], name='symbol')
+        for panel in self.cache.values():
+            index = index.union(panel.index)
+        return index
+
+    def clear(self):
+        self.cache.clear()
+
+    # ### Lọc và xếp hạng
+    def screen(self, conditions, sort_by=None, ascending=False, columns=None, limit=None):
+        # conditions: các Series bool theo mã (kết hợp AND, mã thiếu dữ liệu bị loại);
+        # sort_by: Series để xếp hạng; columns: các Series hiển thị thêm. Trả về DataFrame theo mã.
+        universe = self.universe()
+        mask = pd.Series(True, index=universe)
+        for condition in conditions:
+            mask &= condition.reindex(universe, fill_value=False).astype(bool)
+        result = pd.DataFrame(index=universe[mask.to_numpy()])
+        for column in list(columns or []) + ([sort_by] if sort_by is not None else []):
+            result[column.name] = column.reindex(result.index)
+        if sort_by is not None:
+            result = result.sort_values(sort_by.name, ascending=ascending, na_position='last')
+        if limit is not None:
+            result = result.head(limit)
+        return result
+
+# ### Dòng lệnh
+# Điều kiện dạng "[báo_cáo:]chỉ tiêu <toán tử> số", ví dụ "ratios:ROE (%) > 0.15"
+CONDITION_PATTERN = re.compile(r'^(.*?)\s*(>=|<=|==|!=|>|<)\s*(-?[\d.]+(?:[eE][-+]?\d+)?)\s*$')
+
+def parse_item(text):
+    statement, _, item = text.partition(':')
+    if item and statement in financial_store.STATEMENTS:
+        return item.strip(), statement
+    return text.strip(), None
+
+def parse_condition(text):
+    match = CONDITION_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Điều kiện không hợp lệ: {text} (dạng '[báo_cáo:]chỉ tiêu > số')")
+    item, statement = parse_item(match.group(1))
+    return item, statement, match.group(2), float(match.group(3))
+
+def run_screen(screener, where, period_type='year', last=1, sort=None, growth_lag=None, ascending=False, limit=50):
+    # Mỗi điều kiện phải đúng với cả last kỳ gần nhất; sort: chỉ tiêu xếp hạng (theo tăng trưởng nếu có growth_lag)
+    conditions = []
+    columns = []
+    for text in where:
+        item, statement, operator, threshold = parse_condition(text)
+        values = screener.last(item, statement, period_type, last)
+        conditions.append(pd.Series(OPERATORS[operator](values.to_numpy(), threshold).all(axis=1), index=values.index))
+        columns.append(values.iloc[:, -1].rename(item))
+    sort_by = None
+    if sort:
+        item, statement = parse_item(sort)
+        if growth_lag:
+            sort_by = screener.growth(item, statement, period_type, growth_lag)
+        else:
+            sort_by = screener.value(item, statement, period_type)
+            columns = [column for column in columns if column.name != sort_by.name]
+    return screener.screen(conditions, sort_by=sort_by, ascending=ascending, columns=columns, limit=limit)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Lọc cổ phiếu HOSE + HNX theo chỉ tiêu báo cáo tài chính")
+    parser.add_argument('--where', action='append', default=[],
+                        help="Điều kiện '[báo_cáo:]chỉ tiêu > số' (lặp lại để thêm điều kiện)")
+    parser.add_argument('--period', choices=financial_store.PERIOD_TYPES, default='year')
+    parser.add_argument('--last', type=int, default=1, help="Điều kiện phải đúng với bao nhiêu kỳ gần nhất")
+    parser.add_argument('--sort', help="Chỉ tiêu xếp hạng")
+    parser.add_argument('--growth', type=int, metavar='LAG', help="Xếp hạng theo tăng trưởng so với LAG kỳ trước")
+    parser.add_argument('--ascending', action='store_true')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--items', metavar='BÁO_CÁO', nargs='?', const='', help="Liệt kê các chỉ tiêu (của một báo cáo)")
+    parser.add_argument('--output', help="Ghi kết quả ra file CSV")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    screener = Screener()
+    if args.items is not None:
+        conn, owned = screener._connection(args.items or None, args.period)
+        print(financial_store.list_items(conn, args.items or None).to_string(index=False))
+        if owned:
+            conn.close()
+        return 0
+    try:
+        result = run_screen(screener, args.where, args.period, args.last, args.sort, args.growth,
+                            args.ascending, args.limit)
+    except ValueError as e:
+        print(e)
+        return 2
+    print(f"{len(result)} mã thỏa điều kiện (hiển thị tối đa {args.limit} mã)")
+    print(result.to_string())
+    if args.output:
+        result.to_csv(args.output, encoding='utf-8-sig')
+        print(f"Đã lưu kết quả vào {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
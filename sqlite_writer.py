@@ -0,0 +1,158 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from pandas.io.sql import get_schema
+
+_STOP = object()
+
+# Hàm ghi DataFrame vào một bảng bằng executemany (tương đương df.to_sql(..., index=False))
+def write_table(conn, table_name, df, replace=True):
+    if isinstance(df, pd.Series):
+        # Danh sách mã (symbols_by_group) là Series: ghi thành một cột mang tên Series như to_sql
+        df = df.to_frame()
+    if replace:
+        conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    schema = get_schema(df, table_name)
+    conn.execute(schema.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+    if df.empty:
+        return 0
+    placeholders = ', '.join(['?'] * len(df.columns))
+    conn.executemany(f'INSERT INTO "{table_name}" VALUES ({placeholders})', dataframe_rows(df))
+    return len(df)
+
+def dataframe_rows(df):
+    # Chuyển DataFrame thành các tuple kiểu Python mà sqlite3 bind được (thời gian dạng 'YYYY-MM-DD HH:MM:SS')
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+class SQLiteWriter:
+    """Luồng ghi SQLite duy nhất cho quá trình tải dữ liệu.
+
+    Các luồng tải đẩy công việc ghi vào hàng đợi có giới hạn (bị chặn khi đầy để giữ bộ nhớ ổn định);
+    luồng ghi giữ một kết nối WAL cho mỗi file DB và commit cả lô công việc trong một giao dịch.
+    Số kết nối mở đồng thời được giới hạn bởi max_connections (đóng kết nối ít dùng nhất).
+    callback(lỗi) của một công việc được gọi trong luồng ghi sau khi giao dịch chứa nó đã commit (lỗi=None)
+    hoặc khi công việc thất bại.
+    """
+
+    def __init__(self, max_pending=64, batch_size=64, flush_interval=0.5, max_connections=32):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_connections = max_connections
+        self.connections = OrderedDict()
+        self.errors = []
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, db_path, func, *args, callback=None):
+        # func(conn, *args) sẽ được chạy trong luồng ghi
+        self.queue.put((db_path, func, args, callback))
+
+    def replace_table(self, db_path, table_name, df, callback=None):
+        self.submit(db_path, write_table, table_name, df, True, callback=callback)
+
+    def close(self):
+        # Ghi nốt các công việc còn trong hàng đợi rồi đóng mọi kết nối
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _connection(self, db_path):
+        conn = self.connections.get(db_path)
+        if conn is not None:
+            self.connections.move_to_end(db_path)
+            return conn
+        if len(self.connections) >= self.max_connections:
+            _, oldest = self.connections.popitem(last=False)
+            oldest.close()
+        # isolation_level=None: tự quản lý BEGIN/COMMIT để gom nhiều công việc vào một giao dịch
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self.connections[db_path] = conn
+        return conn
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+        for conn in self.connections.values():
+            conn.close()
+        self.connections.clear()
+
+    def _write_batch(self, batch):
+        jobs_by_db = {}
+        for db_path, func, args, callback in batch:
+            jobs_by_db.setdefault(db_path, []).append((func, args, callback))
+        for db_path, jobs in jobs_by_db.items():
+            try:
+                conn = self._connection(db_path)
+                conn.execute("BEGIN")
+            except Exception as e:
+                print(f"Lỗi khi mở {db_path} để ghi: {e}")
+                self._fail(db_path, jobs, e)
+                continue
+            results = []
+            for func, args, callback in jobs:
+                # Mỗi công việc nằm trong một savepoint để lỗi của một mã không làm mất cả lô
+                conn.execute("SAVEPOINT job")
+                try:
+                    func(conn, *args)
+                    conn.execute("RELEASE job")
+                    self.written += 1
+                    results.append((callback, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    print(f"Lỗi khi ghi vào {db_path}: {e}")
+                    self.errors.append((db_path, args[0] if args else None, e))
+                    results.append((callback, e))
+            try:
+                conn.execute("COMMIT")
+            except Exception as e:
+                print(f"Lỗi khi commit vào {db_path}: {e}")
+                conn.execute("ROLLBACK")
+                self._fail(db_path, jobs, e)
+                continue
+            for callback, error in results:
+                self._notify(callback, error)
+
+    def _fail(self, db_path, jobs, error):
+        self.errors.extend((db_path, args[0] if args else None, error) for _, args, _ in jobs)
+        for _, _, callback in jobs:
+            self._notify(callback, error)
+
+    def _notify(self, callback, error):
+        if callback is None:
+            return
+        try:
+            callback(error)
+        except Exception as e:
+            print(f"Lỗi trong callback sau khi ghi: {e}")
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_source import RecordingSource, ReplaySource, merge_session
+
+def make_ticks(day, ids, with_id=True):
+    df = pd.DataFrame({
+        'time': pd.to_datetime([f"{day} 09:{15 + i:02d}:00" for i in range(len(ids))]),
+        'price': [10.0 + i for i in range(len(ids))],
+        'volume': [100] * len(ids),
+        'match_type': ['Buy'] * len(ids),
+    })
+    if with_id:
+        df['id'] = ids
+    return df
+
+class SessionSource:
+    """Nguồn giả trả về các lệnh của phiên đang có, trang 0 là các lệnh mới nhất"""
+
+    def __init__(self, ticks):
+        self.ticks = ticks
+
+    def intraday(self, symbol, page_size=10_000, source='TCBS', page=0):
+        end = max(0, len(self.ticks) - page * page_size)
+        return self.ticks.iloc[max(0, end - page_size):end].reset_index(drop=True)
+
+@pytest.mark.parametrize('with_id', [True, False])
+def test_merge_session_drops_previous_day(with_id):
+    previous = make_ticks('2024-06-27', [1, 2, 3], with_id)
+    latest = make_ticks('2024-06-28', [4, 5], with_id)
+    merged = merge_session(previous, latest)
+    assert len(merged) == 2
+    assert (pd.to_datetime(merged['time']).dt.date.astype(str) == '2024-06-28').all()
+
+@pytest.mark.parametrize('with_id', [True, False])
+def test_recording_across_day_boundary(tmp_path, with_id):
+    inner = SessionSource(make_ticks('2024-06-27', [1, 2, 3], with_id))
+    recorder = RecordingSource(inner, str(tmp_path))
+    recorder.intraday('AAA')
+    # Ngày hôm sau: phiên mới, id tiếp tục tăng
+    inner.ticks = make_ticks('2024-06-28', [4, 5, 6, 7], with_id)
+    recorder.intraday('AAA', page_size=2)
+    recorder.intraday('AAA', page_size=2, page=1)
+    replayed = ReplaySource(str(tmp_path)).intraday('AAA')
+    pd.testing.assert_frame_equal(replayed, inner.ticks)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_journal import JobJournal
+
+KEYS = [('AAA', 'history'), ('BBB', 'history')]
+
+def make_journal(tmp_path):
+    return JobJournal(str(tmp_path / 'journal.db'))
+
+def test_resume_same_day_returns_only_pending(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.start('eod', KEYS)
+        journal.record('eod', KEYS[0])
+        assert journal.start('eod', KEYS) == [('BBB', 'history')]
+
+def test_resume_run_from_earlier_day_starts_over(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.start('eod', KEYS)
+        journal.record('eod', KEYS[0])
+        journal.skip('eod', [KEYS[1]])
+        # Lần chạy bị gián đoạn từ hôm trước: việc đã xong khi đó phải được làm lại
+        with journal.conn:
+            journal.conn.execute("UPDATE job_runs SET started_at = '2000-01-01 09:00:00' WHERE task = 'eod'")
+        assert journal.start('eod', KEYS) == KEYS
+        assert journal.counts('eod') == {'pending': 2}
+        assert journal.run_info('eod')[0][:10] != '2000-01-01'
+
+def test_retry_failed_returns_failed_jobs(tmp_path):
+    with make_journal(tmp_path) as journal:
+        journal.start('eod', KEYS)
+        journal.record('eod', KEYS[0])
+        journal.record('eod', KEYS[1], 'lỗi')
+        journal.finish('eod')
+        assert [tuple(row) for row in journal.start('eod', KEYS, 'retry_failed')] == [('BBB', 'history')]
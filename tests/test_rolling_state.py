@@ -0,0 +1,71 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indicator_store
+from rolling_state import RollingState
+
+COLUMNS = ['close', 'volume'] + indicator_store.INDICATOR_COLUMNS
+
+def make_bars(close, volume=None):
+    close = np.asarray(close, dtype='float64')
+    volume = np.full(len(close), 1000.0) if volume is None else np.asarray(volume, dtype='float64')
+    return pd.DataFrame({'time': pd.date_range('2020-01-01', periods=len(close)), 'close': close, 'volume': volume})
+
+def incremental(df, split):
+    # Dựng trạng thái từ split phiên đầu, lưu / nạp checkpoint rồi đưa từng phiên còn lại vào
+    state = indicator_store.new_state(df.iloc[:split])
+    state = RollingState.from_bytes(state.to_bytes())
+    return indicator_store.advance_state(state, df.iloc[split:]).reset_index(drop=True)
+
+def assert_matches(df, split):
+    expected = indicator_store.compute_indicators(df).iloc[split:].reset_index(drop=True)
+    actual = incremental(df, split)
+    for column in COLUMNS:
+        np.testing.assert_allclose(actual[column], expected[column], rtol=1e-12, equal_nan=True, err_msg=column)
+    return expected, actual
+
+def test_flat_series_matches_close_exactly():
+    df = make_bars(np.full(400, 23.45))
+    expected, actual = assert_matches(df, 300)
+    for period in indicator_store.MA_PERIODS:
+        # Giá đi ngang không được nằm trên / dưới MA vì sai số làm tròn
+        assert (actual[f'ma{period}'] == actual['close']).all()
+        assert (actual[f'ma{period}'] == expected[f'ma{period}']).all()
+
+def test_flat_after_trend():
+    close = np.concatenate([np.linspace(10, 30, 300) + 0.05, np.full(250, 23.45)])
+    df = make_bars(close)
+    _, actual = assert_matches(df, 290)
+    flat = actual.tail(10)
+    for period in indicator_store.MA_PERIODS:
+        assert (flat[f'ma{period}'] == flat['close']).all()
+
+def test_nan_bars():
+    rng = np.random.default_rng(0)
+    close = np.round(20 + np.cumsum(rng.normal(0, 0.2, 600)), 2)
+    close[[100, 350, 352, 500]] = np.nan
+    volume = rng.integers(1, 1000, 600) * 100.0
+    volume[[360, 510]] = np.nan
+    assert_matches(make_bars(close, volume), 340)
+
+def test_random_walk_on_price_grid():
+    rng = np.random.default_rng(1)
+    close = np.round(np.maximum(25 + np.cumsum(rng.normal(0, 0.3, 2000)), 1) / 0.05) * 0.05
+    assert_matches(make_bars(close, rng.integers(1, 1000, 2000) * 100.0), 250)
+
+def test_replace_last_bar():
+    close = np.full(300, 12.0)
+    df = make_bars(close)
+    state = indicator_store.new_state(df)
+    corrected = df.tail(1).assign(close=12.5, volume=3000.0)
+    row = indicator_store.advance_state(state, corrected).iloc[-1]
+    expected = indicator_store.compute_indicators(pd.concat([df.iloc[:-1], corrected])).iloc[-1]
+    for column in COLUMNS:
+        np.testing.assert_allclose(row[column], expected[column], rtol=1e-12, equal_nan=True, err_msg=column)
+    # Trở lại giá cũ: cửa sổ lại gồm các giá trị bằng nhau
+    row = indicator_store.advance_state(state, df.tail(1)).iloc[-1]
+    assert row['ma200'] == row['close'] == 12.0
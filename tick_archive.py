@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+import config
+import orderflow
+
+# Lưu trữ lâu dài dữ liệu khớp lệnh trong phiên: mỗi mã mỗi ngày một file <thư mục>/<YYYY-MM-DD>/<mã>.ticks
+# gồm 16 byte đầu (HEADER_DTYPE) và các bản ghi 13 byte (TICK_DTYPE) nối tiếp nhau:
+#   ms      int32  mili giây tính từ 0 giờ (UTC) của ngày
+#   price   int32  giá theo số bước giá (giá = price * price_tick, price_tick ghi ở phần đầu file)
+#   volume  int32  khối lượng
+#   side    int8   mã phía lệnh của orderflow.side_codes
+# Một phiên ~30.000 lệnh chiếm ~400 KB. File chỉ được ghi nối (append) hoặc ghi đè cả ngày (save); khi đọc,
+# file được memory-map và các cột được chuyển thẳng thành mảng như orderflow.tick_arrays, dùng được ngay cho
+# orderflow.minute_kernel / OrderFlowState / scan_metrics, hoặc thành bảng khớp lệnh cho orderflow.compute.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = config.get_path('paths', 'tick_archive', os.path.join(SCRIPT_DIR, 'tick_archive'))
+
+MAGIC = b'TICK'
+VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u2'), ('reserved', '<u2'), ('price_tick', '<f8')])
+TICK_DTYPE = np.dtype([('ms', '<i4'), ('price', '<i4'), ('volume', '<i4'), ('side', 'i1')])
+# Tên loại lệnh khi dựng lại bảng khớp lệnh từ mã phía lệnh (loại khác như ATO/ATC không được giữ nguyên tên)
+MATCH_TYPES = np.array(['Other', 'Buy', 'Sell', None], dtype=object)
+DAY_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def day_path(symbol, day, archive_dir=None):
+    return os.path.join(archive_dir or ARCHIVE_DIR, str(np.datetime64(day, 'D')), f"{symbol}.ticks")
+
+def price_tick_for(price):
+    # Bước giá 10 đồng; nguồn trả giá theo nghìn đồng (ví dụ 25.05) thì 0.01
+    return 10.0 if np.nanmedian(price) >= 1000 else 0.01
+
+def encode(times, side, price, volume, price_tick):
+    # Mảng của orderflow.tick_arrays -> (ngày của từng lệnh, bản ghi TICK_DTYPE)
+    dates = times.astype('datetime64[D]')
+    if len(volume) and np.nanmax(volume) > np.iinfo(np.int32).max:
+        raise ValueError("Khối lượng vượt quá giới hạn int32 của file lưu trữ")
+    records = np.empty(len(times), dtype=TICK_DTYPE)
+    records['ms'] = (times - dates).astype('timedelta64[ms]').astype(np.int64)
+    records['price'] = np.rint(np.nan_to_num(price.astype('float64')) / price_tick)
+    records['volume'] = np.nan_to_num(volume)
+    records['side'] = side
+    return dates, records
+
+def decode(records, day, price_tick):
+    # Bản ghi của một ngày -> (thời gian UTC datetime64[ns], mã phía lệnh, giá, khối lượng)
+    times = (np.datetime64(day, 'D') + records['ms'].astype('timedelta64[ms]')).astype('datetime64[ns]')
+    return (times, records['side'].astype(np.int8), records['price'] * price_tick,
+            records['volume'].astype(np.int64))
+
+def _header(price_tick):
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['price_tick'] = price_tick
+    return header.tobytes()
+
+def read_file(path, mmap=True):
+    # (bản ghi, price_tick) của một file; bản ghi dở dang ở cuối file (ghi bị ngắt) được bỏ qua
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header['magic'][0] != MAGIC:
+        raise ValueError(f"File không đúng định dạng lưu trữ khớp lệnh: {path}")
+    n_records = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // TICK_DTYPE.itemsize
+    if n_records <= 0:
+        records = np.empty(0, dtype=TICK_DTYPE)
+    elif mmap:
+        records = np.memmap(path, dtype=TICK_DTYPE, mode='r', offset=HEADER_DTYPE.itemsize, shape=(n_records,))
+    else:
+        records = np.fromfile(path, dtype=TICK_DTYPE, count=n_records, offset=HEADER_DTYPE.itemsize)
+    return records, float(header['price_tick'][0])
+
+def _write_days(symbol, ticks, archive_dir, mode):
+    if ticks is None or ticks.empty:
+        return 0
+    times, side, price, volume = orderflow.tick_arrays(ticks)
+    dates = times.astype('datetime64[D]')
+    written = 0
+    for day in np.unique(dates):
+        mask = dates == day
+        path = day_path(symbol, day, archive_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if mode == 'append' and os.path.exists(path):
+            _, price_tick = read_file(path, mmap=False)
+            _, records = encode(times[mask], side[mask], price[mask], volume[mask], price_tick)
+            # Cắt bản ghi dở dang (nếu có) trước khi nối tiếp
+            n_records = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // TICK_DTYPE.itemsize
+            size = HEADER_DTYPE.itemsize + n_records * TICK_DTYPE.itemsize
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+                f.seek(size)
+                f.write(records.tobytes())
+        else:
+            price_tick = price_tick_for(price[mask])
+            _, records = encode(times[mask], side[mask], price[mask], volume[mask], price_tick)
+            order = np.argsort(records['ms'], kind='stable')
+            with open(path + '.tmp', 'wb') as f:
+                f.write(_header(price_tick))
+                f.write(records[order].tobytes())
+            os.replace(path + '.tmp', path)
+        written += len(records)
+    return written
+
+def save(symbol, ticks, archive_dir=None):
+    """Ghi đè các ngày có trong ticks (bảng khớp lệnh đủ cả phiên); trả về số lệnh đã ghi"""
+    return _write_days(symbol, ticks, archive_dir, 'save')
+
+def append(symbol, ticks, archive_dir=None):
+    """Nối các lệnh mới (chưa có trong file, ví dụ từ IntradayPoller) vào file của ngày tương ứng"""
+    return _write_days(symbol, ticks, archive_dir, 'append')
+
+def days(symbol=None, start=None, end=None, archive_dir=None):
+    # Các ngày đã lưu (của một mã nếu có symbol), trong khoảng [start, end]
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not os.path.isdir(archive_dir):
+        return []
+    result = []
+    for name in sorted(os.listdir(archive_dir)):
+        if not DAY_PATTERN.match(name):
+            continue
+        day = np.datetime64(name, 'D')
+        if (start is not None and day < np.datetime64(start, 'D')) or (end is not None and day > np.datetime64(end, 'D')):
+            continue
+        if symbol is None or os.path.exists(day_path(symbol, day, archive_dir)):
+            result.append(day)
+    return result
+
+def symbols(day, archive_dir=None):
+    folder = os.path.dirname(day_path('_', day, archive_dir))
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[:-6] for name in os.listdir(folder) if name.endswith('.ticks'))
+
+def iter_days(symbol, start=None, end=None, archive_dir=None):
+    # (ngày, mảng như orderflow.tick_arrays) của từng ngày đã lưu
+    for day in days(symbol, start, end, archive_dir):
+        records, price_tick = read_file(day_path(symbol, day, archive_dir))
+        yield day, decode(records, day, price_tick)
+
+def load(symbol, start=None, end=None, archive_dir=None):
+    """Mọi lệnh của mã trong [start, end] dạng (thời gian, mã phía lệnh, giá, khối lượng) như orderflow.tick_arrays"""
+    parts = [arrays for _, arrays in iter_days(symbol, start, end, archive_dir)]
+    if not parts:
+        return (np.empty(0, dtype='datetime64[ns]'), np.empty(0, dtype=np.int8), np.empty(0), np.empty(0, dtype=np.int64))
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+def load_frame(symbol, start=None, end=None, archive_dir=None):
+    """Bảng khớp lệnh (time, price, volume, match_type) dùng được cho orderflow.compute / bsgit.analyze_stock"""
+    times, side, price, volume = load(symbol, start, end, archive_dir)
+    return pd.DataFrame({'time': times, 'price': price, 'volume': volume, 'match_type': MATCH_TYPES[side]})
+
+def archive_group(group='HOSE', symbol_list=None, archive_dir=None):
+    # Tải cả phiên của mọi mã trong danh sách (đồng thời, theo hạn mức của nguồn) và ghi vào kho lưu trữ
+    import flow_scanner
+    from fetch_scheduler import AsyncFetchScheduler
+    symbol_list = symbol_list or flow_scanner.group_symbols(group)
+    saved, total, errors = 0, 0, {}
+    for symbol, ticks, error in AsyncFetchScheduler().map(flow_scanner.fetch_ticks, symbol_list, source='TCBS'):
+        if error is not None:
+            errors[symbol] = error
+            continue
+        count = save(symbol, ticks, archive_dir)
+        saved += count > 0
+        total += count
+    print(f"Đã lưu {total:,} lệnh khớp của {saved}/{len(symbol_list)} mã vào {archive_dir or ARCHIVE_DIR}")
+    if errors:
+        print(f"{len(errors)} mã lỗi: " + ", ".join(f"{symbol} ({error})" for symbol, error in list(errors.items())[:10]))
+    return saved
+
+def describe(archive_dir=None):
+    # Số mã, số lệnh và dung lượng của từng ngày đã lưu
+    archive_dir = archive_dir or ARCHIVE_DIR
+    for day in days(archive_dir=archive_dir):
+        folder = os.path.dirname(day_path('_', day, archive_dir))
+        files = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.ticks')]
+        size = sum(os.path.getsize(path) for path in files)
+        n_ticks = (size - len(files) * HEADER_DTYPE.itemsize) // TICK_DTYPE.itemsize
+        print(f"{day}: {len(files)} mã, {n_ticks:,} lệnh, {size / 2**20:.1f} MB")
+
+if __name__ == "__main__":
+    describe(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -2,63 +2,53 @@ import sqlite3
 import os
 import time
 import subprocess
+import config
+import ohlcv_store
+
+# Thư mục DB dữ liệu EOD (mục [paths] data_dir trong config.ini)
+eod_dir = config.get_path('paths', 'data_dir', "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD")
 
 # Định nghĩa các đường dẫn đến DB stock data
 db_paths = {
-    "HOSE": "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD/stock_data_HOSE.db",
-    "VN30": "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD/stock_data_VN30.db",
-    "VN100": "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD/stock_data_VN100.db",
-    "VNAllShare": "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD/stock_data_VNAllShare.db",
-    "VNMidCap": "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD/stock_data_VNMidCap.db",
-    "VNSmallCap": "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD/stock_data_VNSmallCap.db"
+    "HOSE": os.path.join(eod_dir, "stock_data_HOSE.db"),
+    "VN30": os.path.join(eod_dir, "stock_data_VN30.db"),
+    "VN100": os.path.join(eod_dir, "stock_data_VN100.db"),
+    "VNAllShare": os.path.join(eod_dir, "stock_data_VNAllShare.db"),
+    "VNMidCap": os.path.join(eod_dir, "stock_data_VNMidCap.db"),
+    "VNSmallCap": os.path.join(eod_dir, "stock_data_VNSmallCap.db")
 }
+# Kho ohlcv của HOSE (nếu đã chuyển đổi); các nhóm được lọc từ DB HOSE theo bảng thành viên
+ohlcv_db_path = os.path.join(eod_dir, "ohlcv_HOSE.db")
 
 # Đường dẫn đến DB số cổ phiếu lưu hành (sử dụng chuỗi thô)
-outstanding_db_path = r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\Vốn điều lệ\outstanding_share.db"
-eod_script_path = "E:/Python/realtime Stock Information/Tải danh sách cổ phiếu/EOD/EOD100.py"
+outstanding_db_path = config.get_path('paths', 'outstanding_db',
+                                      r"E:\Python\realtime Stock Information\Tải danh sách cổ phiếu\Vốn điều lệ\outstanding_share.db")
+eod_script_path = config.get_path('paths', 'eod_script', os.path.join(eod_dir, "EOD100.py"))
 
-# Lấy thư mục hiện tại của mã nguồn để lưu DB mới
-current_dir = os.path.dirname(os.path.abspath(__file__))
+# Lấy thư mục hiện tại của mã nguồn để lưu DB mới (mục [paths] market_cap_dir trong config.ini)
+current_dir = config.get_path('paths', 'market_cap_dir', os.path.dirname(os.path.abspath(__file__)))
 
 # Hàm kiểm tra thời gian cập nhật cuối cùng
 def check_last_update(db_path):
+    # Đọc từ chỉ mục độ mới (một truy vấn); DB chưa có chỉ mục sẽ được dựng chỉ mục một lần
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Lấy danh sách tất cả các bảng
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor.fetchall()
-    
-    if not tables:
-        print(f"Database {db_path} không có bảng nào.")
+    try:
+        ohlcv_store.ensure_freshness(conn)
+        last_update = ohlcv_store.last_update_time(conn)
+    finally:
         conn.close()
-        return None
     
-    # Tìm MAX(time) từ tất cả các bảng
-    max_times = []
-    for table in tables:
-        symbol = table[0]
-        cursor.execute(f"SELECT MAX(time) FROM {symbol}")
-        max_time = cursor.fetchone()[0]
-        if max_time:
-            max_times.append(max_time)
-    
-    if not max_times:
+    if last_update is None:
         print(f"Không có dữ liệu time trong database {db_path}.")
-        conn.close()
         return None
-    
-    # Tìm giá trị lớn nhất trong các max_times
-    last_update = max(max_times)
-    conn.close()
-    return last_update
+    return last_update.strftime('%Y-%m-%d %H:%M:%S')
 
 # Hàm cập nhật dữ liệu bằng cách chạy EOD100.py
 def update_data():
     subprocess.run(["python", eod_script_path])
 
 # Hàm tính vốn hóa thực tế (đã sửa tên bảng)
-def calculate_market_cap(db_path, outstanding_db_path):
+def calculate_market_cap(db_path, outstanding_db_path, symbols=None):
     # Kiểm tra sự tồn tại của file
     if not os.path.exists(outstanding_db_path):
         print(f"Lỗi: File không tồn tại tại {outstanding_db_path}")
@@ -83,26 +73,34 @@ def calculate_market_cap(db_path, outstanding_db_path):
         conn_outstanding.close()
         return {}
     
-    # Lấy danh sách các bảng (mỗi bảng là một mã cổ phiếu)
-    cursor_stock.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor_stock.fetchall()
+    # Đọc toàn bộ số cổ phiếu lưu hành trong một truy vấn
+    cursor_outstanding.execute("SELECT symbol, outstanding_share FROM outstanding_shares")
+    outstanding_shares = dict(cursor_outstanding.fetchall())
+    
+    if ohlcv_store.has_store(db_path):
+        # Kho ohlcv: giá đóng cửa mới nhất của mọi mã trong một truy vấn
+        latest_closes = ohlcv_store.latest_closes(conn_stock, symbols)
+    else:
+        # Lấy danh sách các bảng (mỗi bảng là một mã cổ phiếu), chỉ giữ các mã thuộc symbols nếu có
+        tables = ohlcv_store.symbol_tables(conn_stock)
+        if symbols is not None:
+            wanted = set(symbols)
+            tables = [symbol for symbol in tables if symbol in wanted]
+        latest_closes = {}
+        for symbol in tables:
+            # Lấy giá đóng cửa mới nhất, sắp xếp theo 'time'
+            cursor_stock.execute(f"SELECT close FROM {symbol} ORDER BY time DESC LIMIT 1")
+            result = cursor_stock.fetchone()
+            latest_closes[symbol] = result[0] if result else None
     
     market_caps = {}
     
-    for table in tables:
-        symbol = table[0]
-        # Lấy giá đóng cửa mới nhất, sắp xếp theo 'time'
-        cursor_stock.execute(f"SELECT close FROM {symbol} ORDER BY time DESC LIMIT 1")
-        result = cursor_stock.fetchone()
-        if result:
-            close_price = result[0]
-        else:
+    for symbol, close_price in latest_closes.items():
+        if close_price is None:
             close_price = 0  # Gán 0 nếu không có dữ liệu
         
         # Lấy số cổ phiếu lưu hành từ bảng outstanding_shares
-        cursor_outstanding.execute("SELECT outstanding_share FROM outstanding_shares WHERE symbol=?", (symbol,))
-        result = cursor_outstanding.fetchone()
-        outstanding_share = result[0] if result else 0
+        outstanding_share = outstanding_shares.get(symbol, 0)
         
         # Tính vốn hóa thực tế
         market_cap = close_price * outstanding_share
@@ -144,27 +142,46 @@ def create_readme():
         f.write("Cột 0: symbol (TEXT) - Mã cổ phiếu\n")
         f.write("Cột 1: market_cap (REAL) - Vốn hóa thực tế\n")
 
+# Hàm xác định nguồn dữ liệu của một nhóm: (DB, danh sách mã hoặc None nếu lấy toàn bộ DB)
+def resolve_group_source(group, hose_db_path):
+    if group == "HOSE":
+        return hose_db_path, None
+    conn = sqlite3.connect(hose_db_path)
+    members = ohlcv_store.read_group_members(conn, group)
+    conn.close()
+    if members is not None:
+        return hose_db_path, members
+    # DB HOSE chưa có bảng thành viên: dùng file dữ liệu riêng của nhóm (cách lưu cũ)
+    return db_paths[group], None
+
 # Hàm chính
-if __name__ == "__main__":
-    # Kiểm tra và cập nhật dữ liệu nếu cần
-    for group, db_path in db_paths.items():
-        last_update = check_last_update(db_path)
-        if last_update:
-            # Giả sử last_update có dạng 'YYYY-MM-DD HH:MM:SS'
-            last_update_time = time.mktime(time.strptime(last_update, "%Y-%m-%d %H:%M:%S"))
-            current_time = time.time()
-            if current_time - last_update_time > 24 * 3600:  # Kiểm tra nếu quá 24 giờ
-                choice = input(f"Dữ liệu của {group} đã cũ quá 24 giờ. Bạn có muốn cập nhật không? (Y/N): ")
-                if choice.lower() == 'y':
-                    update_data()
-                break  # Chỉ cần hỏi một lần và cập nhật toàn bộ nếu chọn Y
+# update=None: hỏi người dùng khi dữ liệu HOSE cũ quá 24 giờ; True/False: tự cập nhật hoặc bỏ qua không hỏi
+def main(update=None):
+    hose_db_path = ohlcv_db_path if ohlcv_store.has_store(ohlcv_db_path) else db_paths["HOSE"]
+    
+    # Kiểm tra và cập nhật dữ liệu nếu cần (mọi nhóm đọc từ cùng DB HOSE)
+    last_update = check_last_update(hose_db_path)
+    if last_update:
+        # Giả sử last_update có dạng 'YYYY-MM-DD HH:MM:SS'
+        last_update_time = time.mktime(time.strptime(last_update, "%Y-%m-%d %H:%M:%S"))
+        current_time = time.time()
+        if current_time - last_update_time > 24 * 3600:  # Kiểm tra nếu quá 24 giờ
+            if update is None:
+                choice = input("Dữ liệu HOSE đã cũ quá 24 giờ. Bạn có muốn cập nhật không? (Y/N): ")
+                update = choice.lower() == 'y'
+            if update:
+                update_data()
     
     # Tính vốn hóa và lưu trữ kết quả
-    for group, db_path in db_paths.items():
-        market_caps = calculate_market_cap(db_path, outstanding_db_path)
+    for group in db_paths:
+        db_path, symbols = resolve_group_source(group, hose_db_path)
+        market_caps = calculate_market_cap(db_path, outstanding_db_path, symbols)
         save_market_cap_to_db(market_caps, group)
     
     # Tạo file README
     create_readme()
 
-    print("Hoàn tất tính toán và lưu trữ vốn hóa thực tế!")
\ No newline at end of file
+    print("Hoàn tất tính toán và lưu trữ vốn hóa thực tế!")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file